@@ -0,0 +1,321 @@
+# Offline stand-in for the Xiaohongshu web app: home/explore page with the search box, an
+# infinitely scrolling search result feed, note detail pages and media files. The markup and the
+# window.__INITIAL_STATE__ blob follow the selectors and state paths in extraction.py, so the real
+# BrowserHandler code runs against it unchanged once REDNOTE_BASE_URL points here.
+#
+# Run standalone to look at it in a browser:  python benchmarks/fixture_site.py --port 8765
+import argparse
+import io
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import wave
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+FEED_PAGE_SIZE = 20
+SEARCH_API = "/api/sns/web/v1/search/notes"
+
+_HOME_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>小红书 - fixture</title></head>
+<body>
+<div class="side-bar"><span class="channel">发现</span><span class="channel">我</span></div>
+<input id="search-input" type="text">
+<div class="search-icon">搜索</div>
+<script>
+document.querySelector('div.search-icon').addEventListener('click', () => {
+    const keyword = document.querySelector('#search-input').value;
+    location.href = '/search_result?keyword=' + encodeURIComponent(keyword) + '&source=web_explore_feed';
+});
+</script>
+</body></html>
+"""
+
+_SEARCH_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>__KEYWORD__ - 小红书搜索</title>
+<style>section.note-item { height: 320px; }</style></head>
+<body>
+<div class="channel-list"><div id="all" class="channel">全部</div><div id="image" class="channel">图文</div><div id="video" class="channel">视频</div></div>
+<div class="feeds-container"></div>
+<script>
+window.__INITIAL_STATE__ = {search: {feeds: {_rawValue: []}}};
+const keyword = __KEYWORD_JSON__;
+let channel = 'all';
+let page = 0;
+let loading = false;
+let done = false;
+
+async function loadPage() {
+    if (loading || done) return;
+    loading = true;
+    const resp = await fetch('__SEARCH_API__?keyword=' + encodeURIComponent(keyword) + '&channel=' + channel + '&page=' + page);
+    const body = await resp.json();
+    const container = document.querySelector('.feeds-container');
+    for (const item of body.items) {
+        const section = document.createElement('section');
+        section.className = 'note-item';
+        section.innerHTML = '<a class="cover mask ld" href="/search_result/' + item.id + '?xsec_token=' + item.xsecToken +
+            '&xsec_source="><img src="' + item.cover + '"></a><div class="footer"><span class="title">' + item.title + '</span></div>';
+        container.appendChild(section);
+        window.__INITIAL_STATE__.search.feeds._rawValue.push({id: item.id, xsecToken: item.xsecToken, modelType: 'note',
+                                                             noteCard: {displayTitle: item.title}});
+    }
+    done = !body.has_more;
+    page += 1;
+    loading = false;
+}
+
+document.querySelector('#image').addEventListener('click', () => {
+    channel = 'image';
+    page = 0;
+    done = false;
+    document.querySelector('.feeds-container').innerHTML = '';
+    window.__INITIAL_STATE__.search.feeds._rawValue = [];
+    loadPage();
+});
+window.addEventListener('scroll', () => {
+    if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 400) loadPage();
+});
+loadPage();
+</script>
+</body></html>
+"""
+
+_NOTE_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>__TITLE__ - 小红书</title>
+__VIDEO_META__
+</head>
+<body>
+<div class="note-container">
+  __MEDIA__
+  <div class="note-content">
+    <div id="detail-title" class="title">__TITLE__</div>
+    <div id="detail-desc" class="desc"><span>__DESC__</span></div>
+  </div>
+  <div class="comments-el">__COMMENTS__</div>
+</div>
+<script>window.__INITIAL_STATE__ = __STATE__;</script>
+</body></html>
+"""
+
+
+def sample_image_bytes(text: str = "fixture 2025 OCR benchmark") -> bytes:
+    # A white card with a line of dark text, close to the text-on-image notes OCR is used for.
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        # 1x1 white PNG when Pillow is unavailable; still exercises download + decode.
+        return bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de"
+                             "0000000c4944415408d763f8ffff3f0005fe02fea7d6a5ee0000000049454e44ae426082")
+    image = Image.new("RGB", (360, 60), "white")
+    ImageDraw.Draw(image).text((10, 20), text, fill="black")
+    image = image.resize((1080, 180))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def sample_audio_bytes(seconds: float = 10.0, sample_rate: int = 16000) -> bytes:
+    # Mono 16 kHz WAV: a few seconds of tones and noise. Whisper decodes it through ffmpeg like any video track.
+    rng = random.Random(0)
+    frames = bytearray()
+    for i in range(int(seconds * sample_rate)):
+        t = i / sample_rate
+        value = 0.3 * math.sin(2 * math.pi * (220 + 110 * (int(t) % 4)) * t) + 0.05 * (rng.random() - 0.5)
+        frames += struct.pack("<h", int(max(-1.0, min(1.0, value)) * 32767))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+class FixtureSite:
+    """Deterministic synthetic notes served from a background ThreadingHTTPServer.
+
+    `latency_ms` is added to every page and API response to mimic a network round trip. Pages in
+    `recorded_dir` (search.html, notes/<note_id>.html) are served as is instead of synthetic ones.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, total_notes: int = 200, video_every: int = 5,
+                 images_per_note: int = 3, comments_per_note: int = 10, latency_ms: float = 0.0,
+                 image_bytes: Optional[bytes] = None, video_bytes: Optional[bytes] = None,
+                 recorded_dir: Optional[Path] = None):
+        self.host = host
+        self.port = port
+        self.total_notes = total_notes
+        self.video_every = video_every
+        self.images_per_note = images_per_note
+        self.comments_per_note = comments_per_note
+        self.latency_ms = latency_ms
+        self.image_bytes = image_bytes if image_bytes is not None else sample_image_bytes()
+        self.video_bytes = video_bytes if video_bytes is not None else sample_audio_bytes()
+        self.recorded_dir = Path(recorded_dir) if recorded_dir else None
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def note_id(self, index: int) -> str:
+        return f"{index + 0x650000000000000000000000:024x}"
+
+    def note_index(self, note_id: str) -> Optional[int]:
+        try:
+            index = int(note_id, 16) - 0x650000000000000000000000
+        except ValueError:
+            return None
+        return index if 0 <= index < self.total_notes else None
+
+    def is_video(self, index: int) -> bool:
+        return self.video_every > 0 and index % self.video_every == self.video_every - 1
+
+    def note_state(self, index: int) -> Dict:
+        note_id = self.note_id(index)
+        note = {
+            "noteId": note_id,
+            "type": "video" if self.is_video(index) else "normal",
+            "title": f"测试笔记 {index}",
+            "desc": f"这是第 {index} 篇离线测试笔记，用于衡量抓取吞吐量。" * 3,
+            "user": {"nickname": f"fixture_user_{index % 17}"},
+            "interactInfo": {"likedCount": str(index * 7), "collectedCount": str(index * 3),
+                             "commentCount": str(self.comments_per_note), "shareCount": str(index)},
+            "imageList": [],
+        }
+        if self.is_video(index):
+            note["video"] = {"media": {"stream": {"h264": [{"masterUrl": f"{self.base_url}/media/video_{index}.mp4"}]}}}
+        else:
+            for n in range(self.images_per_note):
+                url = f"{self.base_url}/media/image_{index}_{n}.png"
+                note["imageList"].append({"urlDefault": url, "infoList": [{"imageScene": "WB_DFT", "url": url}]})
+        comments = [{"content": f"评论 {c}：写得很好 #{index}"} for c in range(self.comments_per_note)]
+        return {"note": {"noteDetailMap": {note_id: {"note": note, "comments": {"list": comments}}}}}
+
+    def search_items(self, channel: str, page: int) -> Tuple[list, bool]:
+        indexes = [i for i in range(self.total_notes) if channel != "image" or not self.is_video(i)]
+        chunk = indexes[page * FEED_PAGE_SIZE:(page + 1) * FEED_PAGE_SIZE]
+        items = [{"id": self.note_id(i), "xsecToken": f"token{i}", "title": f"测试笔记 {i}",
+                  "cover": f"{self.base_url}/media/cover_{i}.png"} for i in chunk]
+        return items, (page + 1) * FEED_PAGE_SIZE < len(indexes)
+
+    def render_note(self, index: int) -> str:
+        state = self.note_state(index)
+        entry = state["note"]["noteDetailMap"][self.note_id(index)]
+        note = entry["note"]
+        if self.is_video(index):
+            video_url = note["video"]["media"]["stream"]["h264"][0]["masterUrl"]
+            video_meta = f'<meta name="og:video" content="{escape(video_url)}">'
+            media = ('<div class="media-container video-player-media"><video src="' + escape(video_url) + '"></video>'
+                     '<xg-start class="xgplayer-start"><div class="xgplayer-icon-play"></div></xg-start></div>')
+        else:
+            video_meta = ""
+            media = '<div class="slide-container">' + "".join(
+                f'<img class="poster-image" src="{escape(image["urlDefault"])}">' for image in note["imageList"]) + "</div>"
+        comments = "".join(f'<div class="comment-item"><span class="note-text"><span>{escape(c["content"])}</span></span></div>'
+                           for c in entry["comments"]["list"])
+        return (_NOTE_PAGE.replace("__VIDEO_META__", video_meta).replace("__MEDIA__", media)
+                .replace("__TITLE__", escape(note["title"])).replace("__DESC__", escape(note["desc"]))
+                .replace("__COMMENTS__", comments)
+                .replace("__STATE__", json.dumps(state, ensure_ascii=False).replace("</", "<\\/")))
+
+    def render_search(self, keyword: str) -> str:
+        return (_SEARCH_PAGE.replace("__KEYWORD_JSON__", json.dumps(keyword, ensure_ascii=False))
+                .replace("__KEYWORD__", escape(keyword)).replace("__SEARCH_API__", SEARCH_API))
+
+    def _recorded(self, name: str) -> Optional[str]:
+        if not self.recorded_dir:
+            return None
+        path = self.recorded_dir / name
+        return path.read_text(encoding="utf-8") if path.is_file() else None
+
+    def route(self, path: str, query: Dict[str, list]) -> Tuple[int, str, bytes]:
+        if path in ("/", "/explore"):
+            return 200, "text/html; charset=utf-8", _HOME_PAGE.encode("utf-8")
+        if path == "/search_result":
+            keyword = (query.get("keyword") or [""])[0]
+            html = self._recorded("search.html") or self.render_search(keyword)
+            return 200, "text/html; charset=utf-8", html.encode("utf-8")
+        if path == SEARCH_API:
+            items, has_more = self.search_items((query.get("channel") or ["all"])[0], int((query.get("page") or ["0"])[0]))
+            body = json.dumps({"items": items, "has_more": has_more}, ensure_ascii=False)
+            return 200, "application/json", body.encode("utf-8")
+        match = re.fullmatch(r"/(?:search_result|explore)/([0-9a-f]+)", path)
+        if match:
+            recorded = self._recorded(f"notes/{match.group(1)}.html")
+            if recorded:
+                return 200, "text/html; charset=utf-8", recorded.encode("utf-8")
+            index = self.note_index(match.group(1))
+            if index is not None:
+                return 200, "text/html; charset=utf-8", self.render_note(index).encode("utf-8")
+        if path.startswith("/media/"):
+            if path.endswith(".mp4"):
+                return 200, "video/mp4", self.video_bytes
+            return 200, "image/png", self.image_bytes
+        return 404, "text/plain", b"not found"
+
+    def start(self) -> "FixtureSite":
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, content_type, body = site.route(parts.path, parse_qs(parts.query))
+                kind = parts.path.split("/")[1] or "home"
+                with site._lock:
+                    site.requests[kind] = site.requests.get(kind, 0) + 1
+                if site.latency_ms and not parts.path.startswith("/media/"):
+                    time.sleep(site.latency_ms / 1000)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the offline Xiaohongshu fixture site.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--recorded-dir", type=Path, default=None)
+    args = parser.parse_args()
+    site = FixtureSite(port=args.port, total_notes=args.notes, latency_ms=args.latency_ms, recorded_dir=args.recorded_dir).start()
+    print(f"fixture site: {site.base_url}  (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Offline throughput benchmark for BrowserHandler.search_notes_stream against benchmarks/fixture_site.py.
+#
+#   python benchmarks/run_benchmark.py --notes 40 --concurrency 1,2,4,8 --latency-ms 50 --json before.json
+#   python benchmarks/run_benchmark.py ... --json after.json --compare before.json
+#
+# Needs Playwright's bundled Chromium (`playwright install chromium`); no network access is used.
+# Caches are disabled so every round does the full navigate/extract work.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+SERVER_DIR = BENCH_DIR.parent / "src" / "rednote_mcp_server"
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(SERVER_DIR))
+
+from fixture_site import FixtureSite, sample_image_bytes, sample_audio_bytes
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), 4) if values else None,
+        "p50": round(percentile(values, 0.5), 4) if values else None,
+        "p95": round(percentile(values, 0.95), 4) if values else None,
+        "max": round(max(values), 4) if values else None,
+    }
+
+
+async def run_search_round(handler, metrics, keyword: str, limit: int, concurrency: int,
+                           image_ocr: bool, video_asr: bool) -> Dict[str, Any]:
+    metrics.reset(recent_spans=limit * 20) # keep every span of the round for exact per-note latencies
+    started = time.perf_counter()
+    first_note = None
+    ok = errors = 0
+    async for event in handler.search_notes_stream(keyword, limit=limit, headless=True, image_ocr=image_ocr,
+                                                   video_asr=video_asr, concurrency=concurrency, scroll_budget=60.0):
+        if event["note"] is not None:
+            ok += 1
+            if first_note is None:
+                first_note = time.perf_counter() - started
+        else:
+            errors += 1
+            print(f"  note {event['index']} failed: {event['error']}")
+    wall = time.perf_counter() - started
+    snapshot = metrics.snapshot(recent=10000)
+    note_latencies = [span["seconds"] for span in snapshot["recent_spans"] if span["stage"] == "note" and span["outcome"] == "ok"]
+    return {
+        "concurrency": concurrency,
+        "notes_ok": ok,
+        "notes_failed": errors,
+        "wall_seconds": round(wall, 3),
+        "notes_per_second": round(ok / wall, 3) if wall > 0 else None,
+        "time_to_first_note": round(first_note, 3) if first_note is not None else None,
+        "note_latency": summarize(note_latencies),
+        "stages": {stage: {"count": s["count"], "mean_seconds": s["mean_seconds"], "p95_seconds": s["p95_seconds"]}
+                   for stage, s in snapshot["stages"].items()},
+    }
+
+
+async def run_media_cost(handler, image_bytes: bytes, audio_bytes: bytes, ocr_samples: int, asr_samples: int,
+                         asr_model: Optional[str]) -> Dict[str, Any]:
+    import media_worker
+
+    result: Dict[str, Any] = {}
+    if ocr_samples > 0:
+        durations = []
+        text = ""
+        try:
+            for _ in range(ocr_samples):
+                start = time.perf_counter()
+                text = await handler.media.run_cpu(media_worker.ocr_image_bytes, image_bytes, lang="chi_sim+eng")
+                durations.append(time.perf_counter() - start)
+            result["ocr"] = {"seconds": summarize(durations), "image_bytes": len(image_bytes), "chars": len(text.strip()),
+                             "first_call_seconds": round(durations[0], 4)}
+        except Exception as e:
+            result["ocr"] = {"skipped": f"{type(e).__name__}: {e}"}
+    if asr_samples > 0:
+        fd, path = tempfile.mkstemp(prefix="rednote_bench_", suffix=".mp4")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio_bytes)
+        durations = []
+        jobs = []
+        try:
+            for _ in range(asr_samples):
+                start = time.perf_counter()
+                jobs.append(await handler.media.run_cpu(media_worker.transcribe_file, path, asr_model, language="zh",
+                                                        backend=handler.asr_backend))
+                durations.append(time.perf_counter() - start)
+            # The first call includes loading the model into the worker process.
+            steady, steady_jobs = (durations[1:], jobs[1:]) if len(durations) > 1 else (durations, jobs)
+            result["asr"] = {"model": asr_model or "default", "backend": handler.asr_backend or "default",
+                             "seconds": summarize(steady), "first_call_seconds": round(durations[0], 4),
+                             "audio_seconds": jobs[0]["audio_seconds"],
+                             "rtf": round(statistics.mean(job["rtf"] for job in steady_jobs if job["rtf"]), 4)
+                             if any(job["rtf"] for job in steady_jobs) else None}
+        except Exception as e:
+            result["asr"] = {"skipped": f"{type(e).__name__}: {e}"}
+        finally:
+            os.remove(path)
+    return result
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    base_rounds = {r["concurrency"]: r for r in (baseline or {}).get("rounds", [])}
+    print()
+    print(f"{'conc':>4} {'ok':>4} {'fail':>4} {'wall s':>8} {'notes/s':>8} {'first s':>8} {'p50 s':>7} {'p95 s':>7}  vs baseline")
+    for r in report["rounds"]:
+        latency = r["note_latency"]
+        delta = ""
+        base = base_rounds.get(r["concurrency"])
+        if base and base.get("notes_per_second") and r["notes_per_second"]:
+            delta = f"{(r['notes_per_second'] / base['notes_per_second'] - 1) * 100:+.1f}% notes/s"
+        print(f"{r['concurrency']:>4} {r['notes_ok']:>4} {r['notes_failed']:>4} {r['wall_seconds']:>8.2f} "
+              f"{r['notes_per_second'] or 0:>8.2f} {r['time_to_first_note'] or 0:>8.2f} "
+              f"{latency['p50'] or 0:>7.3f} {latency['p95'] or 0:>7.3f}  {delta}")
+    for kind, cost in report.get("media", {}).items():
+        if "skipped" in cost:
+            print(f"{kind}: skipped ({cost['skipped']})")
+        elif kind == "ocr":
+            print(f"ocr: mean {cost['seconds']['mean']}s p95 {cost['seconds']['p95']}s per image ({cost['chars']} chars)")
+        else:
+            print(f"asr ({cost['backend']} {cost['model']}): mean {cost['seconds']['mean']}s for {cost['audio_seconds']}s audio, "
+                  f"rtf {cost['rtf']}, first call {cost['first_call_seconds']}s")
+
+
+async def main_async(args) -> Dict[str, Any]:
+    image_bytes = Path(args.sample_image).read_bytes() if args.sample_image else sample_image_bytes()
+    audio_bytes = Path(args.sample_video).read_bytes() if args.sample_video else sample_audio_bytes(args.audio_seconds)
+    site = FixtureSite(total_notes=args.notes * 2, latency_ms=args.latency_ms, image_bytes=image_bytes,
+                       video_bytes=audio_bytes, recorded_dir=args.recorded_dir).start()
+    # extraction.BASE_URL is read at import time, so the handler must be imported after this.
+    os.environ["REDNOTE_BASE_URL"] = site.base_url
+    from browser_handler import BrowserHandler
+    from metrics import metrics
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    user_data_dir = tempfile.mkdtemp(prefix="rednote_bench_profile_")
+    handler = BrowserHandler(user_data_dir=user_data_dir, max_pages=max(levels) + 1, note_cache_ttl=0,
+                             search_cache_size=0, search_cache_ttl=0, extraction_mode=args.extraction_mode,
+                             block_resources=not args.no_blocking, media_workers=args.media_workers or None,
+                             browser_channel=args.channel or None)
+    # Keep the throwaway session next to the throwaway profile, never over the real playwright_state.json.
+    handler.storage_state_file_path = Path(user_data_dir) / "playwright_state.json"
+    handler.session.storage_state_file = handler.storage_state_file_path # the login probe runs once, in the warm-up
+    report: Dict[str, Any] = {
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "rounds": [],
+    }
+    try:
+        print(f"fixture site {site.base_url}, {args.notes} notes per round, latency {args.latency_ms} ms")
+        # Warm-up: browser launch and first page loads are not part of any round.
+        await run_search_round(handler, metrics, "warmup", min(4, args.notes), max(levels), False, False)
+        for level in levels:
+            for repeat in range(args.repeats):
+                print(f"concurrency {level} (run {repeat + 1}/{args.repeats}) ...")
+                report["rounds"].append(await run_search_round(handler, metrics, f"bench {level} {repeat}", args.notes, level,
+                                                               args.with_media, args.with_media))
+        report["media"] = await run_media_cost(handler, image_bytes, audio_bytes, args.ocr_samples, args.asr_samples, args.asr_model)
+        report["fixture_requests"] = dict(site.requests)
+        report["request_blocking"] = handler.request_blocker.stats()
+    finally:
+        await handler.close()
+        site.stop()
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline search_notes throughput benchmark.")
+    parser.add_argument("--notes", type=int, default=40, help="notes fetched per round")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma separated concurrency levels")
+    parser.add_argument("--repeats", type=int, default=1, help="rounds per concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="added to every fixture page/API response")
+    parser.add_argument("--extraction-mode", default="state", choices=["state", "dom"])
+    parser.add_argument("--no-blocking", action="store_true", help="disable request blocking")
+    parser.add_argument("--with-media", action="store_true", help="run OCR/ASR inside the search rounds too")
+    parser.add_argument("--ocr-samples", type=int, default=5, help="OCR calls on the sample image (0 to skip)")
+    parser.add_argument("--asr-samples", type=int, default=2, help="ASR calls on the sample audio (0 to skip)")
+    parser.add_argument("--asr-model", default=None)
+    parser.add_argument("--audio-seconds", type=float, default=10.0, help="length of the synthetic audio sample")
+    parser.add_argument("--sample-image", type=Path, default=None, help="image served for every note instead of the synthetic one")
+    parser.add_argument("--sample-video", type=Path, default=None, help="video/audio served for every video note")
+    parser.add_argument("--recorded-dir", type=Path, default=None, help="recorded pages: search.html, notes/<note_id>.html")
+    parser.add_argument("--media-workers", type=int, default=0)
+    parser.add_argument("--channel", default="", help="browser channel, empty for Playwright's bundled Chromium")
+    parser.add_argument("--json", type=Path, default=None, help="write the report here")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier report to compare notes/s against")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_report(report, baseline)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
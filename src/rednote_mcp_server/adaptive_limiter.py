@@ -0,0 +1,210 @@
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from metrics import metrics
+
+# How much of the concurrency limit is kept, and how much the pacing interval grows, per kind of failure.
+DECREASE = {"blocked": 0.5, "error": 0.75, "timeout": 0.75, "slow": 0.9}
+INTERVAL_GROWTH = {"blocked": (2.0, 1.0), "error": (1.5, 0.25), "timeout": (1.5, 0.25), "slow": (1.2, 0.1)} # (factor, floor)
+
+
+class PageBlockedError(RuntimeError):
+    """A navigation ended on a login wall ("login") or a verification page ("captcha")."""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def classify(error: BaseException) -> str:
+    if isinstance(error, PageBlockedError):
+        return "blocked"
+    # Playwright's TimeoutError is its own class, not the builtin one.
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or type(error).__name__ == "TimeoutError":
+        return "timeout"
+    return "error"
+
+
+class Navigation:
+    """Handed out by AdaptiveLimiter.slot(); callers may set the latency to judge instead of the slot's duration."""
+
+    def __init__(self, limiter: "AdaptiveLimiter"):
+        self.outcome: Optional[str] = None
+        self.latency: Optional[float] = None
+        self._start = time.perf_counter()
+        self._limiter = limiter
+        self._released = False
+
+    async def release(self) -> None:
+        """Ends the navigation before the slot's block does, e.g. when the page stays open for scrolling:
+        frees the slot and records it as successful. Later errors in the block no longer count."""
+        self.outcome = self.outcome or "ok"
+        await self._limiter._release(self)
+
+
+class AdaptiveLimiter:
+    """AIMD control of page navigations: how many tabs may navigate at once and how far apart they start.
+
+    Every `limit` successful navigations within `target_latency` raise the limit by one and shorten the
+    interval between navigation starts. A block page halves the limit and doubles the interval; errors,
+    timeouts and slow navigations (latency EWMA above `target_latency`) cut them less. Decreases other than
+    blocks happen at most once per `decrease_cooldown` seconds, so one burst of failures counts once.
+    With enabled=False the limit stays at `max_limit` and the interval at `min_interval`.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 min_interval: float = 0.0, max_interval: float = 10.0, target_latency: float = 10.0,
+                 decrease_cooldown: float = 5.0, window: int = 50, enabled: bool = True):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.enabled = enabled
+        initial = self.max_limit if initial_limit is None or not enabled else initial_limit
+        self.limit = float(max(self.min_limit, min(self.max_limit, initial)))
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+        self.target_latency = target_latency
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self._outcomes = deque(maxlen=window)
+        self._successes = 0 # successes since the limit last changed
+        self._last_decrease = 0.0
+        self._next_start = 0.0
+        self.last_change: Optional[Dict[str, Any]] = None
+        self._cond = asyncio.Condition()
+        self._pace_lock = asyncio.Lock()
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        metrics.set_gauge("nav_in_flight", self.in_flight)
+        navigation = Navigation(self)
+        try:
+            await self._pace()
+            navigation._start = time.perf_counter()
+            yield navigation
+            navigation.outcome = navigation.outcome or "ok"
+        except Exception as e:
+            if navigation.outcome is None:
+                navigation.outcome = classify(e)
+            raise
+        finally:
+            await self._release(navigation)
+
+    async def _release(self, navigation: Navigation) -> None:
+        # Cancelled or abandoned navigations (no outcome) say nothing about the site and are not recorded.
+        if navigation._released:
+            return
+        navigation._released = True
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+        metrics.set_gauge("nav_in_flight", self.in_flight)
+        if navigation.outcome is not None:
+            latency = navigation.latency if navigation.latency is not None else time.perf_counter() - navigation._start
+            self.record(navigation.outcome, latency)
+
+    async def _pace(self) -> None:
+        # Navigation starts are spaced `interval` apart (+-20% jitter so parallel tabs do not fire in lockstep).
+        if self.interval <= 0:
+            return
+        async with self._pace_lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            if delay > 0:
+                metrics.record("nav_pacing_wait", delay)
+                await asyncio.sleep(delay)
+                now = time.monotonic()
+            self._next_start = now + self.interval * random.uniform(0.8, 1.2)
+
+    def record(self, outcome: str, latency: float) -> None:
+        self._outcomes.append(outcome)
+        metrics.inc("nav_outcomes_total", outcome=outcome)
+        if outcome == "ok":
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            metrics.record("nav_latency", latency)
+            if self.latency_ewma > self.target_latency:
+                self._decrease("slow")
+            else:
+                self._increase()
+        else:
+            self._decrease(outcome)
+        self._publish()
+
+    def _increase(self) -> None:
+        self._successes += 1
+        if not self.enabled or self._successes < int(self.limit):
+            return
+        self._successes = 0
+        limit = min(self.max_limit, self.limit + 1)
+        interval = self.interval * 0.7
+        interval = self.min_interval if interval < max(self.min_interval, 0.05) else interval
+        self._change(limit, interval, "success")
+
+    def _decrease(self, reason: str) -> None:
+        self._successes = 0
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if reason != "blocked" and now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        factor, floor = INTERVAL_GROWTH.get(reason, INTERVAL_GROWTH["error"])
+        limit = max(self.min_limit, self.limit * DECREASE.get(reason, DECREASE["error"]))
+        interval = min(self.max_interval, max(self.interval * factor, floor, self.min_interval))
+        self._change(limit, interval, reason)
+
+    def _change(self, limit: float, interval: float, reason: str) -> None:
+        if int(limit) == int(self.limit) and abs(interval - self.interval) < 0.01:
+            self.limit, self.interval = limit, interval
+            return
+        direction = "up" if limit > self.limit or interval < self.interval else "down"
+        print(f"自适应并发调整 ({reason}): 并发上限 {int(self.limit)} -> {int(limit)}, "
+              f"导航间隔 {self.interval:.2f} -> {interval:.2f} 秒, 近期成功率 {self.success_rate():.0%}")
+        metrics.inc("nav_limit_changes_total", direction=direction, reason=reason)
+        self.last_change = {"reason": reason, "direction": direction, "at": time.time()}
+        self.limit, self.interval = limit, interval
+
+    def backoff(self, attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+        """Full-jitter exponential backoff for retry number `attempt` (0-based), stretched by the pacing interval."""
+        return random.uniform(0, min(cap, base * 2 ** attempt + self.interval))
+
+    def success_rate(self) -> float:
+        if not self._outcomes:
+            return 1.0
+        return sum(1 for outcome in self._outcomes if outcome == "ok") / len(self._outcomes)
+
+    def timeout(self, ceiling: float, floor: float = 15.0) -> float:
+        """Navigation timeout in seconds: a few times the typical latency, between `floor` and `ceiling`."""
+        if not self.enabled or self.latency_ewma is None:
+            return ceiling
+        return max(min(floor, ceiling), min(ceiling, self.latency_ewma * 4))
+
+    def _publish(self) -> None:
+        metrics.set_gauge("nav_concurrency_limit", int(self.limit))
+        metrics.set_gauge("nav_interval_seconds", round(self.interval, 3))
+        metrics.set_gauge("nav_success_rate", round(self.success_rate(), 3))
+        if self.latency_ewma is not None:
+            metrics.set_gauge("nav_latency_ewma_seconds", round(self.latency_ewma, 3))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "concurrency_limit": int(self.limit),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "interval_seconds": round(self.interval, 3),
+            "latency_ewma_seconds": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "success_rate": round(self.success_rate(), 3),
+            "recent_outcomes": dict(Counter(self._outcomes)),
+            "last_change": self.last_change,
+        }
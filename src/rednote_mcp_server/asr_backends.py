@@ -0,0 +1,142 @@
+# ASR engines behind one interface, used inside the media worker processes.
+#   whisper         openai-whisper (PyTorch, fp32 on CPU) - the default, models come from asr_models;
+#                   the only engine with true batched decoding (see ASRBatcher)
+#   faster-whisper  CTranslate2 with int8 weights, usually several times faster on CPU; optional dependency
+# REDNOTE_ASR_BACKEND picks the engine, REDNOTE_ASR_THREADS the intra-op threads of each worker process and
+# REDNOTE_ASR_COMPUTE_TYPE the faster-whisper precision (int8, int8_float32, float32, ...).
+# Engines import their libraries on first use, so importing this module stays cheap.
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+import asr_models
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_ASR_BACKEND = os.getenv("REDNOTE_ASR_BACKEND", "whisper")
+ASR_THREADS = int(os.getenv("REDNOTE_ASR_THREADS", "0")) # 0: engine default
+FASTER_WHISPER_COMPUTE_TYPE = os.getenv("REDNOTE_ASR_COMPUTE_TYPE", "int8")
+
+
+class ASRBackend:
+    name = ""
+
+    def load(self, model_name: Optional[str] = None) -> Any:
+        raise NotImplementedError
+
+    def transcribe(self, audio: np.ndarray, model_name: Optional[str] = None, language: str = "zh",
+                   initial_prompt: Optional[str] = None) -> str:
+        """Transcribes float32 mono 16 kHz audio of any length."""
+        raise NotImplementedError
+
+    def transcribe_batch(self, segments: List[np.ndarray], model_name: Optional[str] = None, language: str = "zh") -> List[str]:
+        """Transcribes independent segments of up to 30 s; engines that can, run them as one batch."""
+        return [self.transcribe(segment, model_name, language) for segment in segments]
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class WhisperBackend(ASRBackend):
+    name = "whisper"
+
+    def __init__(self):
+        if ASR_THREADS:
+            import torch
+            torch.set_num_threads(ASR_THREADS)
+
+    def load(self, model_name: Optional[str] = None) -> Any:
+        return asr_models.get_model(model_name)
+
+    def transcribe(self, audio: np.ndarray, model_name: Optional[str] = None, language: str = "zh",
+                   initial_prompt: Optional[str] = None) -> str:
+        model = self.load(model_name)
+        return model.transcribe(audio, language=language, initial_prompt=initial_prompt,
+                                fp16=model.device.type == "cuda")["text"].strip()
+
+    def transcribe_batch(self, segments: List[np.ndarray], model_name: Optional[str] = None, language: str = "zh") -> List[str]:
+        # One encoder/decoder pass for all segments: mel spectrograms of 30 s windows stacked into a batch.
+        import torch
+        import whisper
+
+        model = self.load(model_name)
+        mels = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(segment)), model.dims.n_mels)
+                            for segment in segments]).to(model.device)
+        options = whisper.DecodingOptions(language=language, fp16=model.device.type == "cuda", without_timestamps=True)
+        with torch.inference_mode():
+            results = whisper.decode(model, mels, options)
+        return [result.text.strip() for result in results]
+
+    def stats(self) -> Dict[str, Any]:
+        return asr_models.model_stats()
+
+
+class FasterWhisperBackend(ASRBackend):
+    name = "faster-whisper"
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._info: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, model_name: Optional[str] = None) -> Any:
+        name = model_name or asr_models.DEFAULT_ASR_MODEL
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise RuntimeError("REDNOTE_ASR_BACKEND=faster-whisper 需要先安装 faster-whisper (可选依赖: rednote-mcp-server[faster-whisper])") from e
+                load_start = time.perf_counter()
+                self._models[name] = WhisperModel(name, device="cpu", compute_type=FASTER_WHISPER_COMPUTE_TYPE,
+                                                  cpu_threads=ASR_THREADS)
+                load_seconds = time.perf_counter() - load_start
+                self._info[name] = {"model": name, "compute_type": FASTER_WHISPER_COMPUTE_TYPE,
+                                    "load_seconds": round(load_seconds, 3), "loaded_at": time.time()}
+                print(f"faster-whisper 模型 {name} ({FASTER_WHISPER_COMPUTE_TYPE}) 加载完成: 耗时 {load_seconds:.2f} 秒")
+            return self._models[name]
+
+    def transcribe(self, audio: np.ndarray, model_name: Optional[str] = None, language: str = "zh",
+                   initial_prompt: Optional[str] = None) -> str:
+        model = self.load(model_name)
+        segments, _ = model.transcribe(audio, language=language, initial_prompt=initial_prompt)
+        return "".join(segment.text for segment in segments).strip()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"default_model": asr_models.DEFAULT_ASR_MODEL, "loaded": list(self._info.values()),
+                "rss_mb": asr_models._current_rss_mb()}
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+_instances: Dict[str, ASRBackend] = {}
+
+
+def get_backend(name: Optional[str] = None) -> ASRBackend:
+    name = name or DEFAULT_ASR_BACKEND
+    backend = _instances.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"未知的 ASR 引擎: {name}，可选: {', '.join(BACKENDS)}")
+        backend = _instances[name] = BACKENDS[name]()
+    return backend
+
+
+def preload_models(names: Iterable[str], backend: Optional[str] = None) -> None:
+    for name in names:
+        try:
+            get_backend(backend).load(name)
+        except Exception as e:
+            print(f"预加载 ASR 模型 {name} 失败: {e}")
+
+
+def backend_stats() -> Dict[str, Any]:
+    get_backend() # the default engine is always listed, loaded or not
+    return {"backend": DEFAULT_ASR_BACKEND, "threads": ASR_THREADS or None,
+            **{name: backend.stats() for name, backend in _instances.items()}}
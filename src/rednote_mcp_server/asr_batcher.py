@@ -0,0 +1,83 @@
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+import media_worker
+from media_executor import MediaExecutor
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class ASRBatcher:
+    """Collects 30 s audio segments from concurrently transcribed videos and decodes them together.
+
+    A batch is sent to a media worker once `batch_size` segments are waiting or `max_wait` seconds
+    after the first one arrived, whichever comes first. Segments only share a batch when they use
+    the same backend, model and language.
+    """
+
+    def __init__(self, media: MediaExecutor, batch_size: int = 8, max_wait: float = 0.5):
+        self.media = media
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self._pending: Dict[Tuple, List[Tuple["np.ndarray", asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.segments = 0
+
+    async def transcribe(self, segment: "np.ndarray", model_name: Optional[str] = None, language: str = "zh",
+                         backend: Optional[str] = None) -> str:
+        loop = asyncio.get_running_loop()
+        key = (model_name, language, backend)
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((segment, future))
+        if len(pending) >= self.batch_size:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: Tuple) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = [(segment, future) for segment, future in self._pending.pop(key, []) if not future.done()]
+        if batch:
+            task = asyncio.create_task(self._run(key, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, key: Tuple, batch: List[Tuple["np.ndarray", asyncio.Future]]) -> None:
+        model_name, language, backend = key
+        try:
+            with metrics.span("asr_batch", size=len(batch)):
+                texts = await self.media.run_cpu(media_worker.transcribe_segments, [segment for segment, _ in batch],
+                                                 model_name, language=language, backend=backend)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.segments += len(batch)
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
+
+    def stats(self) -> Dict[str, object]:
+        return {"batch_size": self.batch_size, "batches": self.batches, "segments": self.segments,
+                "mean_batch": round(self.segments / self.batches, 2) if self.batches else None}
+
+    async def close(self) -> None:
+        for key in list(self._pending):
+            for _, future in self._pending.pop(key):
+                future.cancel()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
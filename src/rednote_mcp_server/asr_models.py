@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# whisper (and torch behind it) is imported on first use: the server process never needs it and
+# worker processes only when a video is actually transcribed.
+
+# Model used when a caller does not ask for a specific size ("tiny", "base", "small", "medium", "large", ...)
+DEFAULT_ASR_MODEL = os.getenv("REDNOTE_ASR_MODEL", "tiny")
+
+_models: Dict[str, Any] = {}
+_model_info: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def _current_rss_mb() -> Optional[float]:
+    # Resident memory of this process; /proc is only there on Linux, other platforms report None.
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def available_models() -> list:
+    import whisper
+    return whisper.available_models()
+
+
+def get_model(name: Optional[str] = None):
+    """Returns the resident Whisper model for `name`, loading it on first use only."""
+    name = name or DEFAULT_ASR_MODEL
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(name)
+        if model is not None:
+            return model
+        import whisper
+        if name not in whisper.available_models():
+            raise ValueError(f"未知的 Whisper 模型: {name}，可选: {', '.join(whisper.available_models())}")
+
+        rss_before = _current_rss_mb()
+        load_start = time.perf_counter()
+        model = whisper.load_model(name)
+        load_seconds = time.perf_counter() - load_start
+        rss_after = _current_rss_mb()
+
+        param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        _model_info[name] = {
+            "model": name,
+            "device": str(model.device),
+            "load_seconds": round(load_seconds, 3),
+            "param_mb": round(param_bytes / (1024 * 1024), 1),
+            "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+            "loaded_at": time.time(),
+        }
+        _models[name] = model
+        print(f"Whisper 模型 {name} 加载完成: 耗时 {load_seconds:.2f} 秒, 参数占用 {_model_info[name]['param_mb']} MB")
+        return model
+
+
+def model_stats() -> Dict[str, Any]:
+    return {
+        "default_model": DEFAULT_ASR_MODEL,
+        "loaded": list(_model_info.values()),
+        "rss_mb": _current_rss_mb(),
+    }
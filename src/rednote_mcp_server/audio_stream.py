@@ -0,0 +1,105 @@
+# Audio-only decoding of a remote video for ASR: ffmpeg reads the URL itself, drops the video
+# stream without decoding it and writes 16 kHz mono PCM to a pipe, which is consumed in fixed-size
+# chunks. Nothing is written to disk and at most a few chunks of audio are held in memory.
+import queue
+import shutil
+import subprocess
+import threading
+from typing import TYPE_CHECKING, Dict, Iterator, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+SAMPLE_RATE = 16000 # what Whisper expects
+CHUNK_SECONDS = 30.0 # one Whisper window
+_BYTES_PER_SAMPLE = 2 # s16le
+
+
+def ffmpeg_binary() -> Optional[str]:
+    # moviepy ships imageio-ffmpeg's static build; a system ffmpeg works as well.
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg")
+
+
+def _ffmpeg_command(binary: str, url: str, headers: Dict[str, str], max_seconds: Optional[float]) -> list:
+    command = [binary, "-nostdin", "-loglevel", "error"]
+    if url.startswith("http") and headers:
+        command += ["-headers", "".join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    command += ["-i", url, "-vn", "-sn", "-dn", "-ac", "1", "-ar", str(SAMPLE_RATE)]
+    if max_seconds:
+        command += ["-t", str(max_seconds)]
+    command += ["-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"]
+    return command
+
+
+def stream_pcm_chunks(url: str, headers: Optional[Dict[str, str]] = None, max_seconds: Optional[float] = None,
+                      chunk_seconds: float = CHUNK_SECONDS, prefetch_chunks: int = 2,
+                      stop: Optional[threading.Event] = None) -> Iterator["np.ndarray"]:
+    """Yields float32 mono 16 kHz chunks of `chunk_seconds` (the last one shorter) from a local path or URL.
+
+    Setting `stop` (from any thread) ends the stream within a fraction of a second and kills ffmpeg, even
+    while another thread is blocked in next() on it.
+    """
+    import numpy as np
+
+    binary = ffmpeg_binary()
+    if not binary:
+        raise RuntimeError("未找到 ffmpeg (imageio-ffmpeg 或系统 ffmpeg)")
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * _BYTES_PER_SAMPLE
+    process = subprocess.Popen(_ffmpeg_command(binary, url, headers or {}, max_seconds),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # A reader thread keeps ffmpeg downloading/decoding the next chunks while the current one is transcribed.
+    chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max(1, prefetch_chunks))
+    stderr_tail = []
+
+    def read_stdout():
+        try:
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                chunks.put(data)
+        finally:
+            chunks.put(None)
+
+    def read_stderr():
+        for line in process.stderr:
+            stderr_tail.append(line.decode("utf-8", "replace").strip())
+            del stderr_tail[:-5]
+
+    readers = [threading.Thread(target=read_stdout, daemon=True), threading.Thread(target=read_stderr, daemon=True)]
+    for reader in readers:
+        reader.start()
+    produced = 0
+    try:
+        while True:
+            try:
+                data = chunks.get(timeout=0.2 if stop is not None else None)
+            except queue.Empty:
+                data = b""
+            if stop is not None and stop.is_set():
+                return
+            if data == b"":
+                continue
+            if data is None:
+                break
+            data = data[:len(data) - len(data) % _BYTES_PER_SAMPLE]
+            produced += len(data)
+            yield np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+        returncode = process.wait()
+        if returncode != 0 and produced == 0:
+            readers[1].join(timeout=1)
+            raise RuntimeError(f"ffmpeg 提取音频失败 (exit {returncode}): {' | '.join(stderr_tail)}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        # Unblock the reader if the consumer stopped early, then reap the process.
+        while readers[0].is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        process.wait()
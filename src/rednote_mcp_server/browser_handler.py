@@ -1,18 +1,34 @@
 import asyncio # Added for asynchronous operations
+import itertools
 import os
+import threading
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Tuple, Union
 from datetime import datetime
-import pytesseract
-from PIL import Image
-import requests
 import time
 
 
-from playwright.async_api import async_playwright, BrowserContext, Page, Playwright # Changed to async_api
-
-import whisper
+from playwright.async_api import BrowserContext, Page, Playwright # Changed to async_api
+
+import audio_stream
+import media_worker
+from adaptive_limiter import AdaptiveLimiter, PageBlockedError, classify
+from asr_batcher import ASRBatcher
+from browser_pool import BrowserPool
+from metrics import metrics
+from extraction import BASE_URL, SELECTORS, extract_note, extract_note_links, extract_note_from_state, extract_note_links_from_state
+from media_downloader import DEFAULT_HEADERS, MediaDownloader
+from media_executor import MediaExecutor
+from note_cache import NoteCache, default_cache_path, note_id_from_url
+from ocr_engine import OCREngine
+from page_waits import PageWaiter, SEARCH_API
+from profile_pool import EVICTED, Profile, ProfilePool, ProfilesExhaustedError
+from request_blocking import BlockingPolicy, RequestBlocker
+from rate_limiter import RateLimiter
+from search_cache import SearchCache, unique_keywords
+from session_manager import SessionManager, blocked_reason, is_login_url
 
 # Global definitions for persistent context
 STORAGE_STATE_FILE = "playwright_state.json"
@@ -21,13 +37,86 @@ STORAGE_STATE_FILE = "playwright_state.json"
 # USER_DATA_DIR = r'C:\Users\myles\AppData\Local\Google\Chrome\User Data'
 
 class BrowserHandler:
-    def __init__(self, user_data_dir, enable_logging: bool = False):
-        self.user_data_dir = user_data_dir
-        self.storage_state_file_path = Path(STORAGE_STATE_FILE).resolve()
+    def __init__(self, user_data_dir, enable_logging: bool = False, max_pages: int = 5, idle_timeout: float = 600.0,
+                 media_workers: Optional[int] = None, io_workers: int = 8, preload_asr_models: Optional[List[str]] = None,
+                 note_cache_ttl: float = 24 * 3600, note_cache_max_mb: float = 100, note_cache_file: Optional[Path] = None,
+                 search_cache_size: int = 256, search_cache_ttl: float = 300, search_cache_stale: float = 1800,
+                 search_cache_file: Optional[Path] = None, extraction_mode: str = "state", block_resources: bool = True,
+                 wait_deadlines: Optional[Dict[str, float]] = None, browser_channel: Optional[str] = "chrome",
+                 navigation_rate: float = 0.0, navigation_burst: int = 1,
+                 asr_streaming: bool = True, asr_max_seconds: Optional[float] = None, asr_backend: Optional[str] = None,
+                 asr_language: str = "zh", asr_batch_size: int = 1, asr_batch_wait: float = 0.5,
+                 ocr_max_side: int = 1600, ocr_binarize: bool = True, ocr_hash_distance: int = 4, ocr_cache_size: int = 4096,
+                 session_recheck_interval: float = 12 * 3600, session_invalid_ttl: float = 1800, profiles: Optional[List[Dict[str, Any]]] = None,
+                 profile_rate: float = 0.0, profile_burst: int = 1, profile_budget: int = 0, profile_budget_window: float = 3600.0,
+                 profile_cooldown: float = 60.0, profile_evict_seconds: float = 1800.0,
+                 adaptive_concurrency: bool = True, adaptive_max_concurrency: Optional[int] = None, adaptive_initial: int = 2,
+                 adaptive_max_interval: float = 10.0, adaptive_target_latency: float = 10.0,
+                 nav_retries: int = 2, retry_backoff: float = 1.0):
+        # One account per entry of `profiles` (see profile_pool.parse_profiles); without it, the single
+        # user_data_dir + ./playwright_state.json account as before. The first account is the primary one:
+        # manual login and the single-page helpers (initialize_and_get_page, search_notes_bak) use it.
+        profiles = profiles or [{"name": "default", "user_data_dir": user_data_dir, "storage_state": STORAGE_STATE_FILE}]
+        self.user_data_dir = profiles[0]["user_data_dir"]
+        self.storage_state_file_path = Path(profiles[0]["storage_state"]).resolve()
         self.playwright: Optional[Playwright] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.logged_in_successfully = False
+        self.extraction_mode = extraction_mode # "state": parse the embedded page state, DOM as fallback; "dom": DOM only
+        self.max_scrolls = 20 # result-feed scrolls per search
+        self.max_idle_scrolls = 3 # consecutive scrolls without new notes before the feed counts as exhausted
+        # Page waits resolve on selectors/URL/API responses with per-wait deadlines instead of fixed sleeps.
+        self.waits = PageWaiter(wait_deadlines)
+        # Global cap on page navigations per second (search list and note pages alike); 0 = unlimited.
+        self.nav_limiter = RateLimiter(navigation_rate, burst=navigation_burst)
+
+        # Per account: warm Chrome context + tabs shared by every call, instead of a cold launch per search, and
+        # login validity from the saved web_session cookie and recent requests (the explore-page probe only
+        # runs when it is unknown). Navigations are spread over the accounts within their budgets.
+        # browser_channel=None uses Playwright's bundled Chromium instead of the installed Chrome.
+        self.profiles = ProfilePool([
+            Profile(entry["name"], entry["user_data_dir"], Path(entry["storage_state"]).resolve(),
+                    BrowserPool(entry["user_data_dir"], max_pages=max_pages, idle_timeout=idle_timeout, channel=browser_channel),
+                    SessionManager(Path(entry["storage_state"]).resolve(), recheck_interval=session_recheck_interval,
+                                   invalid_ttl=session_invalid_ttl),
+                    rate=float(entry.get("rate", profile_rate)), burst=int(entry.get("burst", profile_burst)),
+                    budget=int(entry.get("budget", profile_budget)), budget_window=profile_budget_window)
+            for entry in profiles
+        ], cooldown_seconds=profile_cooldown, evict_seconds=profile_evict_seconds)
+        self.pool = self.profiles.primary.pool
+        self.session = self.profiles.primary.session
+        # Tabs navigating at once and the spacing of their starts follow the site's answers (AIMD): grown while
+        # navigations succeed quickly, cut on errors, timeouts and block pages. Failed navigations are retried
+        # up to `nav_retries` times with jittered exponential backoff.
+        self.adaptive = AdaptiveLimiter(adaptive_max_concurrency or max_pages * len(profiles), initial_limit=adaptive_initial,
+                                        max_interval=adaptive_max_interval, target_latency=adaptive_target_latency,
+                                        enabled=adaptive_concurrency)
+        self.nav_retries = nav_retries
+        self.retry_backoff = retry_backoff
+        # Aborts images/media/fonts/trackers a call does not need (see BlockingPolicy.for_features).
+        self.request_blocker = RequestBlocker(enabled=block_resources)
+        # OCR/ASR run in worker processes and downloads in threads, never on the event loop.
+        self.media = MediaExecutor(cpu_workers=media_workers, io_workers=io_workers, preload_models=preload_asr_models or [],
+                                   asr_backend=asr_backend)
+        self.downloader = MediaDownloader()
+        # Preprocessed, parallel tesseract with near-duplicate images (dHash) recognized only once.
+        self.ocr = OCREngine(self.media, lang="chi_sim+eng", max_side=ocr_max_side, binarize=ocr_binarize,
+                             hash_distance=ocr_hash_distance, cache_size=ocr_cache_size)
+        # Video ASR pulls only the audio track through ffmpeg; the whole-file download stays as the fallback.
+        self.asr_streaming = asr_streaming
+        self.asr_max_seconds = asr_max_seconds # transcribe at most this much audio per video; None = all of it
+        self.asr_backend = asr_backend # None: REDNOTE_ASR_BACKEND of the worker processes, "whisper" by default
+        self.asr_language = asr_language
+        # batch_size > 1: 30 s segments of concurrently transcribed videos share one decode call.
+        self.asr_batcher = ASRBatcher(self.media, batch_size=asr_batch_size, max_wait=asr_batch_wait) if asr_batch_size > 1 else None
+        # Extracted notes + OCR/ASR results, so repeat searches skip detail pages they have already read.
+        self.search_cache = SearchCache(max_entries=search_cache_size, ttl_seconds=search_cache_ttl,
+                                        stale_seconds=search_cache_stale, disk_path=search_cache_file)
+        self.note_cache = NoteCache(Path(note_cache_file or default_cache_path()),
+                                    ttl_seconds=note_cache_ttl, max_bytes=int(note_cache_max_mb * 1024 * 1024))
+        # Note fetches in progress, shared by concurrent tool calls that ask for the same note.
+        self._note_fetches: Dict[Tuple[str, bool, bool, Optional[str]], List[Any]] = {}
 
         self.logging_enabled = enable_logging
         self.log_file_path: Optional[Path] = None
@@ -80,88 +169,55 @@ class BrowserHandler:
         # The case where self.context exists but is closed will be handled by the exception above.
 
     async def _get_or_create_persistent_context(self, headless: bool = True) -> BrowserContext: # Added async, headless param
-        if self.context: # Check if context object exists
-            try:
-                # Attempt a benign operation to check if context is alive and has a usable page
-                if self.context.pages and not self.context.pages[0].is_closed(): # Page's is_closed is fine
-                    await self.context.pages[0].title() # Check responsiveness
-                    print("复用现有的持久化浏览器上下文。")
-                    return self.context
-                else: # No pages or first page is closed
-                    print("现有上下文的页面已关闭/不存在，将关闭此上下文并创建新的。")
-                    await self.context.close() # Attempt to close the existing context
-                    self.context = None
-                    self.page = None # Also clear associated page
-            except Exception as e: # Catches errors from .title() or .close() if context was already dead/unresponsive
-                print(f"现有上下文无法使用 ({e})，将关闭并创建新的持久化上下文。")
-                if self.context: # Ensure context is not None before trying to close again
-                    try: await self.context.close()
-                    except Exception: pass # Ignore errors during this cleanup close
-                self.context = None
-                self.page = None
-
-        if not self.playwright:
-            self.playwright = await async_playwright().start() # Added await, changed to async_playwright
-
+        # Health checks, relaunching and idle shutdown live in BrowserPool now.
+        previous_context = self.context
+        context = await self.pool.get_context(headless=headless)
+        self.playwright = self.pool.playwright
+        if context is previous_context:
+            print("复用现有的持久化浏览器上下文。")
+            return context
+
+        self.context = context
+        self.page = None
+        self.logged_in_successfully = False # Reset, will be verified
         await self._setup_logging() # Added await
 
-        print(f"检查用户数据目录: {self.user_data_dir}")
-        if not os.path.exists(self.user_data_dir):
-            print(f"警告：Chrome 用户数据目录 {self.user_data_dir} 可能不存在或无法访问。Playwright 可能会尝试创建它，但这通常用于新配置文件。")
-
-        effective_storage_state = str(self.storage_state_file_path) if self.storage_state_file_path.exists() else None
-        if effective_storage_state:
+        if self.storage_state_file_path.exists():
             print(f"尝试从 {self.storage_state_file_path} 加载会话...")
         else:
             print(f"未找到会话文件 {self.storage_state_file_path}，将启动全新会话。")
-
-        try:
-            self.context = await self.playwright.chromium.launch_persistent_context( # Added await
-                self.user_data_dir,
-                headless=headless, # Use passed headless argument
-                # headless=False,
-                channel="chrome"
-                # slow_mo=500,
-                # accept_downloads=True,
-                # args=["--disable-blink-features=AutomationControlled"]
-            )
-            print("持久化浏览器上下文启动成功。")
-            self.logged_in_successfully = False # Reset, will be verified
-            return self.context
-        except Exception as e_launch:
-            print(f"启动持久化浏览器上下文失败: {e_launch}")
-            if self.context: # If launch partially succeeded then failed, self.context might exist
-                try: await self.context.close()
-                except Exception: pass # Ignore errors during cleanup
-            self.context = None
-            raise
+        return context
 
     async def initialize_and_get_page(self, headless: bool = True) -> Page: # Added async, headless param
         self.context = await self._get_or_create_persistent_context(headless=headless) # Added await, pass headless
+        login_check_start = time.perf_counter()
 
-        if self.context.pages:
-            self.page = self.context.pages[0]
+        if self.page and not self.page.is_closed():
             try:
                 await self.page.title() # Added await, check responsiveness
-                print(f"复用来自持久化上下文的现有页面: {self.page.url}")
+                print(f"复用现有页面: {self.page.url}")
             except Exception:
-                print("现有页面无响应或已关闭，创建新页面。")
-                self.page = await self.context.new_page() # Added await
+                print("现有页面无响应或已关闭，从浏览器池获取新页面。")
+                await self.pool.release_page(self.page)
+                self.page = await self.pool.acquire_page(headless=headless)
         else:
-            print("持久化上下文中没有现有页面，创建新页面。")
-            self.page = await self.context.new_page() # Added await
+            print("从浏览器池获取页面。")
+            self.page = await self.pool.acquire_page(headless=headless)
+        # The login page needs everything (QR code images included), whatever the tab was used for before.
+        await self.request_blocker.apply(self.page, BlockingPolicy(block_images=False, block_media=False, block_fonts=False, block_analytics=False))
         
         print(f"正在验证会话 (来自 {self.storage_state_file_path if self.storage_state_file_path.exists() else '新会话'})...")
         try:
-            await self.page.goto("https://www.xiaohongshu.com/explore", timeout=30000, wait_until="domcontentloaded") # Added await
+            await self.page.goto(f"{BASE_URL}/explore", timeout=30000, wait_until="domcontentloaded") # Added await
         except Exception as e_goto:
             print(f"导航到 explore 页面失败: {e_goto}. 可能需要手动干预或检查网络。")
 
-        await asyncio.sleep(3) # Wait for page to settle
+        # Settled as soon as either the profile entry or the login prompt is rendered.
+        await self.waits.wait_for_any(self.page, "login_state", selectors=[SELECTORS["profile_entry"], SELECTORS["login_prompt"]])
         current_url = self.page.url # Get current URL for logging
 
         # Primary check: Look for the "我" profile element indicating successful login
-        my_profile_element = await self.page.query_selector("span.channel:has-text('我')")
+        my_profile_element = await self.page.query_selector(SELECTORS["profile_entry"])
 
         if my_profile_element:
             print(f"检测到 '我' 元素，表明已通过持久化会话自动登录或之前已登录。当前 URL: {current_url}")
@@ -169,7 +225,7 @@ class BrowserHandler:
         else:
             # "我" element not found, now check for login prompt
             print(f"未检测到 '我' 元素。当前 URL: {current_url}。检查是否存在登录提示...")
-            login_reason_element = await self.page.query_selector(".login-reason")
+            login_reason_element = await self.page.query_selector(SELECTORS["login_prompt"])
             if login_reason_element:
                 print(f"检测到登录提示元素 (class='login-reason')，表明需要登录。当前 URL: {current_url}")
                 self.logged_in_successfully = False
@@ -181,41 +237,42 @@ class BrowserHandler:
                     except OSError as e_remove:
                         print(f"删除无效会话文件 {self.storage_state_file_path} 失败: {e_remove}")
                 
-                print("请在浏览器窗口中完成小红书的登录操作。脚本将等待最多40秒。")
-                
-                login_check_attempts = 0
-                max_login_wait_seconds = 60
-                login_successful_within_timeout = False
-                while login_check_attempts < max_login_wait_seconds:
-                    current_url_after_manual_login = self.page.url # Re-check URL each iteration
-                    my_profile_element_after_manual_login = await self.page.query_selector("span.channel:has-text('我')")
-                    if my_profile_element_after_manual_login:
-                        print(f"在尝试 {login_check_attempts + 1} 秒后检测到 '我' 元素。当前 URL: {current_url_after_manual_login}。假定登录成功。")
+                if headless:
+                    # Nobody can scan the QR code in a headless browser; waiting would only delay the failure.
+                    print("无头模式下无法手动登录，请以 headless=False 运行一次以完成登录。")
+                else:
+                    max_login_wait_seconds = self.waits.deadline("manual_login")
+                    print(f"请在浏览器窗口中完成小红书的登录操作。脚本将等待最多{max_login_wait_seconds:.0f}秒。")
+
+                    # Resolves the moment the profile entry attaches, instead of polling once per second.
+                    manual_login_start = time.perf_counter()
+                    login_successful_within_timeout = await self.waits.wait_for_any(
+                        self.page, "manual_login", selectors=[SELECTORS["profile_entry"]]) is not None
+                    if login_successful_within_timeout:
+                        print(f"在 {time.perf_counter() - manual_login_start:.1f} 秒后检测到 '我' 元素。当前 URL: {self.page.url}。假定登录成功。")
                         self.logged_in_successfully = True
-                        login_successful_within_timeout = True
-                        break
                     else:
-                        print(f"等待手动登录... ({login_check_attempts + 1}/{max_login_wait_seconds} 秒) URL: {current_url_after_manual_login}")
-                        await asyncio.sleep(1) # Wait 1 second before next check
-                    login_check_attempts += 1
-                
-                if not login_successful_within_timeout:
-                    current_url_after_timeout = self.page.url # Get final URL after timeout
-                    # Check if still on login page as a fallback
-                    if "login" in current_url_after_timeout.lower() or "passport" in current_url_after_timeout.lower():
-                        print(f"警告：{max_login_wait_seconds}秒超时后仍未检测到 '我' 元素，且 URL ({current_url_after_timeout}) 暗示仍在登录页。登录失败。")
-                        self.logged_in_successfully = False
-                    else:
-                        print(f"警告：{max_login_wait_seconds}秒超时后仍未检测到 '我' 元素，但 URL ({current_url_after_timeout}) 不是标准登录页。状态不明确，假定登录失败以策安全。")
-                        self.logged_in_successfully = False # Safer to assume false
+                        current_url_after_timeout = self.page.url # Get final URL after timeout
+                        # Check if still on login page as a fallback
+                        if is_login_url(current_url_after_timeout):
+                            print(f"警告：{max_login_wait_seconds}秒超时后仍未检测到 '我' 元素，且 URL ({current_url_after_timeout}) 暗示仍在登录页。登录失败。")
+                            self.logged_in_successfully = False
+                        else:
+                            print(f"警告：{max_login_wait_seconds}秒超时后仍未检测到 '我' 元素，但 URL ({current_url_after_timeout}) 不是标准登录页。状态不明确，假定登录失败以策安全。")
+                            self.logged_in_successfully = False # Safer to assume false
             else:
                 # No "我" element AND no "login-reason" element.
                 # This could mean the page is loaded but not fully, or an unexpected state.
                 print(f"未检测到 '我' 元素，也未检测到明确的登录提示。当前 URL: {current_url}。假定未登录或会话无效。")
                 self.logged_in_successfully = False # Default to false if neither specific condition is met
 
+        metrics.record("login_check", time.perf_counter() - login_check_start,
+                       outcome="ok" if self.logged_in_successfully else "logged_out")
         if self.logged_in_successfully:
             await self._save_session_state() # Added await
+            self.session.mark_valid("probe")
+        else:
+            self.session.mark_invalid("probe")
         
         return self.page
 
@@ -233,13 +290,14 @@ class BrowserHandler:
     async def _ensure_logged_in_page(self, headless: bool = True) -> Page: # Added async, headless param
         # Check if current page and context seem valid and logged in
         if self.page and not self.page.is_closed() and \
-           self.context and self.logged_in_successfully: # Removed 'not self.context.is_closed()'
+           self.context and self.session.validity(): # Removed 'not self.context.is_closed()'
             try:
                 # Verify page is responsive and not on a login screen
                 current_url = self.page.url # This might fail if page is detached
-                if "login" in current_url.lower() or "passport" in current_url.lower():
+                if is_login_url(current_url):
                     print("会话似乎已失效（重定向到登录页），将重新初始化...")
                     self.logged_in_successfully = False # Mark as not logged in
+                    self.session.mark_invalid("redirect")
                     # Don't return, fall through to re-initialize
                 else:
                     print(f"当前会话有效，页面 URL: {current_url}")
@@ -247,10 +305,10 @@ class BrowserHandler:
             except Exception as e:
                 print(f"检查现有页面/会话时出错 ({e})，将重新初始化会话...")
                 # Aggressively clean up to force re-initialization
+                if self.page:
+                    await self.pool.release_page(self.page)
                 self.page = None
-                if self.context:
-                    try: await self.context.close()
-                    except Exception: pass # Ignore errors on close
+                await self.pool.reset()
                 self.context = None
                 self.logged_in_successfully = False
         
@@ -258,210 +316,551 @@ class BrowserHandler:
         print("页面/会话无效或未初始化，或登录状态失效。调用 initialize_and_get_page() 进行刷新。")
         return await self.initialize_and_get_page(headless=headless) # Added await, pass headless
 
-    async def search_notes(self, keywords: str, limit: int = 10, headless: bool = False, image_ocr: bool = False, video_asr: bool = False) -> List[Dict[str, Any]]: # Added async, headless param
-        # 方法一：使用 time.time()
-        start_time_tt = time.time()
-        async with async_playwright() as p:
-            context = await p.chromium.launch_persistent_context(
-                                self.user_data_dir,
-                                headless=headless,
-                                channel="chrome"
-                            )
-
-            # page = await context.new_page()
-            # page = await context.new_page()
-            page = context.pages[0]
-
-            await page.goto("https://www.xiaohongshu.com") # Added await
-            await asyncio.sleep(0.5) # Wait for page to settle
-
-             # input and search.
-            await page.wait_for_selector("input#search-input", timeout=30000) # Added await
-            await page.fill("input#search-input", keywords) # Added await
-            await page.wait_for_selector("div.search-icon", timeout=60000) # Added await for possibly login.
-            await page.click("div.search-icon", timeout=30000) # Added await
-            await asyncio.sleep(0.5) # Wait for page to settle
-            
-            if video_asr == False: # if disable video asr, only image + text selected.
+    async def ensure_login(self, headless: bool = True, profile: Optional[Profile] = None) -> bool:
+        # Hot path: answered from the session state without touching a page. The explore-page probe runs
+        # only when validity is unknown, and hands its tab back to the pool afterwards. A known logged-out
+        # primary account is probed again only with a visible browser, where the probe waits for a manual login.
+        profile = profile or self.profiles.primary
+        if profile is self.profiles.primary:
+            async def probe() -> bool:
                 try:
-                    await page.click("div#image.channel", timeout=10000) #图文filter, Added await
-                    print(f"本次搜索仅图文")
-                except Exception as e_filter_click:
-                    print(f"无法点击 '图文' 筛选器 (可能不存在或页面结构已更改): {e_filter_click}")
-                    if self.logging_enabled and self.log_file_handler:
-                        self.log_file_handler.write(f"[{datetime.now()}] Warning: Could not click '图文' filter: {e_filter_click}\n")
+                    await self.initialize_and_get_page(headless=headless)
+                    return self.logged_in_successfully
+                finally:
+                    if self.page:
+                        await self.pool.release_page(self.page)
+                        self.page = None
+        else:
+            async def probe() -> bool:
+                return await self._probe_profile(profile, headless)
+
+        logged_in = await profile.session.ensure(probe, retry_invalid=not headless and profile is self.profiles.primary)
+        if profile is self.profiles.primary:
+            self.logged_in_successfully = logged_in
+        return logged_in
+
+    async def _probe_profile(self, profile: Profile, headless: bool) -> bool:
+        # Login check of an additional account. There is no manual-login wait: extra accounts are expected to be
+        # logged in already (e.g. by running the server once with that profile first in REDNOTE_PROFILES).
+        login_check_start = time.perf_counter()
+        async with profile.pool.page(headless=headless) as page:
+            await self.request_blocker.apply(page, BlockingPolicy())
+            await page.goto(f"{BASE_URL}/explore", timeout=30000, wait_until="domcontentloaded")
+            await self.waits.wait_for_any(page, "login_state", selectors=[SELECTORS["profile_entry"], SELECTORS["login_prompt"]])
+            logged_in = await page.query_selector(SELECTORS["profile_entry"]) is not None
+            if logged_in:
+                await page.context.storage_state(path=str(profile.storage_state_file))
+        metrics.record("login_check", time.perf_counter() - login_check_start, outcome="ok" if logged_in else "logged_out",
+                       profile=profile.name)
+        print(f"账号 {profile.name} 登录检查: {'已登录' if logged_in else '未登录'}")
+        return logged_in
+
+    @asynccontextmanager
+    async def _profile_page(self, headless: bool):
+        # Yields (profile, page, navigation): a pooled tab of the account picked for this navigation, with its login
+        # known good, the per-account and global pacing applied and a slot of the
+        # adaptive controller held, which learns from how the navigation ends (see AdaptiveLimiter.slot).
+        while True:
+            profile = await self.profiles.acquire()
+            try:
+                logged_in = await self.ensure_login(headless, profile)
+            except BaseException:
+                self.profiles.release(profile)
+                raise
+            if logged_in:
+                break
+            self.profiles.release(profile)
+            if not self.profiles.others_in_rotation(profile):
+                # Logged-out pages show no search results; fail now rather than on every navigation.
+                raise PageBlockedError(f"未登录小红书 (账号 {profile.name})，请以 headless=False 运行一次以完成登录。", "login")
+            self.profiles.report_block(profile, "login")
+        try:
+            async with self.adaptive.slot() as navigation:
+                await self.nav_limiter.wait()
+                async with profile.pool.page(headless=headless) as page:
+                    yield profile, page, navigation
+        finally:
+            self.profiles.release(profile)
+
+    async def _backoff_or_raise(self, attempt: int, error: Exception, profile: Optional[Profile], what: str) -> None:
+        # Sleeps before retry number `attempt` of a failed navigation, or re-raises `error` when it is not worth
+        # retrying: out of attempts, the caller's overall timeout expired, no account is free, or a block page
+        # with no other account left to take over.
+        if (attempt >= self.nav_retries or isinstance(error, (asyncio.TimeoutError, ProfilesExhaustedError))
+                or (isinstance(error, PageBlockedError) and (profile is None or profile.state != EVICTED))):
+            raise error
+        delay = self.adaptive.backoff(attempt, base=self.retry_backoff)
+        metrics.inc("nav_retries_total", reason=classify(error))
+        print(f"{what} 第 {attempt + 1} 次尝试失败 ({error})，{delay:.1f} 秒后重试")
+        await asyncio.sleep(delay)
+
+    def _check_blocked(self, page: Page, profile: Optional[Profile] = None) -> None:
+        # A login wall or captcha takes the account out of rotation (see ProfilePool.report_block).
+        reason = blocked_reason(page.url)
+        if reason is None:
+            return
+        profile = profile or self.profiles.primary
+        if profile is self.profiles.primary:
+            self.logged_in_successfully = False
+        self.profiles.report_block(profile, reason)
+        raise PageBlockedError(f"账号 {profile.name} 的页面被重定向到{'验证码' if reason == 'captcha' else '登录'}页: {page.url}", reason)
+
+    async def _extract_note_detail(self, page: Page, note_url: str, profile: Optional[Profile] = None) -> Dict[str, Any]:
+        # Browser-side work for one note: navigate and read text + media links in one evaluate call.
+        # No OCR/ASR here, so the tab goes back to the pool as soon as the page has been read.
+        with metrics.span("note_goto"):
+            await page.goto(note_url, wait_until="domcontentloaded", timeout=self.adaptive.timeout(self.waits.deadline("note_goto")) * 1000)
+        self._check_blocked(page, profile)
+        if self.extraction_mode == "state":
+            # The note ships as window.__INITIAL_STATE__, readable as soon as the HTML is parsed.
+            with metrics.span("note_extract", source="state") as span:
+                detail = await extract_note_from_state(page, note_url)
+                if not detail:
+                    span.outcome = "fallback"
+            if detail:
+                return detail
+            print(f"页面状态不可用，回退到 DOM 提取: {note_url}")
+        with metrics.span("note_wait"):
+            await page.wait_for_selector(SELECTORS["note_ready"], timeout=self.waits.deadline("note_ready") * 1000)
+        with metrics.span("note_extract", source="dom"):
+            return await extract_note(page, note_url)
+
+    async def _process_note_media(self, detail: Dict[str, Any], image_ocr: bool, video_asr: bool, asr_model: Optional[str] = None,
+                                  derivatives: Optional[Dict[str, Any]] = None) -> List[str]:
+        # Turns the media links of a note into the "images" field: raw links, OCR text or ASR text.
+        # OCR/ASR results already in `derivatives` (from the note cache) are reused; new ones are added to it.
+        derivatives = derivatives if derivatives is not None else {}
+        images = []
+        if image_ocr and derivatives.get("ocr") is not None:
+            images.extend(derivatives["ocr"])
+        elif image_ocr: # ocr
+            async def download_and_recognize(src: str) -> Optional[str]:
+                try:
+                    with metrics.span("image_download") as span:
+                        image_bytes = await self.downloader.fetch_bytes(src, timeout=10)
+                        span.add_bytes(len(image_bytes))
+                except Exception as e:
+                    print(f"下载图片失败: {src}, 错误: {e}")
+                    return None
+                return await self.ocr.recognize(image_bytes, source=src)
+
+            # All images of the note at once; the OCR engine spreads them over the worker pool.
+            texts = await asyncio.gather(*(download_and_recognize(src) for src in detail["image_urls"]))
+            images.extend(text for text in texts if text) # failed downloads/OCR and blank images yield nothing
+            derivatives["ocr"] = list(images)
+        else:
+            images.extend(detail["image_urls"])
+
+        video_link = detail["video_url"]
+        asr_key = asr_model or "default"
+        if self.asr_backend and self.asr_backend != "whisper":
+            asr_key = f"{self.asr_backend}/{asr_key}"
+        if self.asr_language != "zh":
+            asr_key += f"@{self.asr_language}"
+        if self.asr_max_seconds:
+            asr_key += f":{self.asr_max_seconds:g}s" # a capped transcript must not answer an uncapped request
+        if video_link:
+            if video_asr and asr_key in derivatives.get("asr", {}):
+                images.append(derivatives["asr"][asr_key])
+            elif video_asr: # asr enable.
+                text = await self._transcribe_video(video_link, asr_model, asr_key)
+                print(text)
+
+                derivatives.setdefault("asr", {})[asr_key] = text
+                images.append(text)
             else:
-                # await page.click("div#video.channel", timeout=10000) #图文filter, Added await
-                print(f"本次搜索视频+图文")
-
-            await page.wait_for_selector("section.note-item", timeout=30000) # Added await
-
-            # 如果成功点击“图文”，则登录成功。
-            self.logged_in_successfully = True 
-
-            # Fetch note URLs
-            note_elements = await page.query_selector_all("section.note-item") # Added await
-            note_urls_to_visit = []
-            for i, note_element in enumerate(note_elements):
-                if i >= limit: # Fetch more initial URLs in case some fail
+                images.append(video_link)
+        return images
+
+    def _record_asr_job(self, result: Dict[str, Any], asr_key: str, mode: str) -> str:
+        # Real-time factor = processing seconds / audio seconds; below 1 means faster than playback.
+        metrics.record("asr_job", result["seconds"], model=asr_key, mode=mode, audio_seconds=result["audio_seconds"], rtf=result["rtf"])
+        metrics.inc("asr_audio_seconds_total", result["audio_seconds"], mode=mode)
+        print(f"ASR ({mode}) 完成: {result['audio_seconds']} 秒音频, {result['chunks']} 段, 耗时 {result['seconds']} 秒, RTF {result['rtf']}")
+        return result["text"]
+
+    async def _transcribe_stream_batched(self, video_link: str, asr_model: Optional[str]) -> Dict[str, Any]:
+        # ffmpeg runs here (I/O threads) and each 30 s segment joins the shared ASRBatcher, so segments of
+        # several videos transcribed at the same time are decoded in one batch.
+        started = time.perf_counter()
+        stop = threading.Event()
+        chunks = audio_stream.stream_pcm_chunks(video_link, headers=DEFAULT_HEADERS, max_seconds=self.asr_max_seconds, stop=stop)
+        segments = []
+        audio_seconds = 0.0
+        pending = None # next(chunks) running in an I/O thread; shielded so cancelling this call does not orphan it
+        try:
+            while True:
+                pending = asyncio.ensure_future(self.media.run_io(next, chunks, None))
+                chunk = await asyncio.shield(pending)
+                pending = None
+                if chunk is None:
                     break
-                url = None
+                audio_seconds += len(chunk) / audio_stream.SAMPLE_RATE
+                segments.append(asyncio.ensure_future(
+                    self.asr_batcher.transcribe(chunk, asr_model, language=self.asr_language, backend=self.asr_backend)))
+            texts = await asyncio.gather(*segments)
+        except BaseException:
+            for segment in segments:
+                segment.cancel()
+            raise
+        finally:
+            # A thread may still be inside next(chunks): closing the generator under it would raise
+            # "generator already executing" (masking the original error) and leave ffmpeg running. `stop`
+            # makes it return and kill ffmpeg first.
+            stop.set()
+            if pending is not None:
+                await asyncio.wait({pending})
+            await self.media.run_io(chunks.close)
+        seconds = time.perf_counter() - started
+        return {"text": "".join(texts), "audio_seconds": round(audio_seconds, 2), "seconds": round(seconds, 3),
+                "chunks": len(texts), "rtf": round(seconds / audio_seconds, 3) if audio_seconds else None}
+
+    async def _transcribe_video(self, video_link: str, asr_model: Optional[str], asr_key: str) -> str:
+        # 模型常驻在工作进程中，只在首次使用时加载 (例如 "tiny", "base", "small", "medium", "large")
+        if self.asr_streaming:
+            try:
+                # Only the audio track: ffmpeg streams it from the CDN as 16 kHz mono PCM, no video file on disk.
+                with metrics.span("asr_stream", model=asr_key) as span:
+                    if self.asr_batcher is not None:
+                        result = await self._transcribe_stream_batched(video_link, asr_model)
+                    else:
+                        result = await self.media.run_cpu(media_worker.transcribe_url, video_link, asr_model,
+                                                          language=self.asr_language, max_seconds=self.asr_max_seconds,
+                                                          headers=DEFAULT_HEADERS, backend=self.asr_backend)
+                    span.add_bytes(int(result["audio_seconds"] * audio_stream.SAMPLE_RATE * 2))
+                return self._record_asr_job(result, asr_key, "batched" if self.asr_batcher is not None else "stream")
+            except Exception as e_stream:
+                print(f"音频流转写失败，改为下载完整视频: {e_stream}")
+
+        # 下载视频到唯一的临时文件，并发调用互不覆盖
+        with metrics.span("video_download") as span:
+            video_path = await self.downloader.stream_to_tempfile(video_link, suffix=".mp4", timeout=60)
+            span.add_bytes(os.path.getsize(video_path))
+        print(f"视频已下载到 {video_path}")
+        try:
+            # video_2_text.
+            with metrics.span("asr", model=asr_key):
+                result = await self.media.run_cpu(media_worker.transcribe_file, video_path, asr_model, language=self.asr_language,
+                                                  max_seconds=self.asr_max_seconds, backend=self.asr_backend)
+            return self._record_asr_job(result, asr_key, "file")
+        finally:
+            try:
+                os.remove(video_path)
+            except OSError:
+                pass
+
+    async def _fetch_note(self, note_url: str, headless: bool, image_ocr: bool, video_asr: bool,
+                          note_timeout: float = 90.0, asr_model: Optional[str] = None) -> Dict[str, Any]:
+        # One note end to end: note cache first, otherwise a pooled tab for the DOM, then OCR/ASR.
+        with metrics.span("note") as span:
+            cached = await self.note_cache.get(note_url)
+            if cached:
+                print(f"笔记缓存命中: {note_url}")
+                span.attrs["cached"] = True
+                detail, derivatives = cached["detail"], cached["derivatives"]
+            else:
+                for attempt in itertools.count():
+                    profile = None
+                    try:
+                        async with self._profile_page(headless) as (profile, page, _):
+                            await self.request_blocker.apply(page, BlockingPolicy.for_features(image_ocr=image_ocr, video_asr=video_asr))
+                            detail = await asyncio.wait_for(self._extract_note_detail(page, note_url, profile), timeout=note_timeout)
+                        break
+                    except Exception as e_fetch:
+                        await self._backoff_or_raise(attempt, e_fetch, profile, f"笔记 {note_url}")
+                derivatives = {}
+            known_derivatives = json.dumps(derivatives, sort_keys=True)
+            images = await self._process_note_media(detail, image_ocr=image_ocr, video_asr=video_asr, asr_model=asr_model, derivatives=derivatives)
+            if not cached or json.dumps(derivatives, sort_keys=True) != known_derivatives:
+                await self.note_cache.put(note_url, detail, derivatives)
+            note = {"url": note_url, "title": detail["title"], "content": detail["content"], "images": images, "comments": detail["comments"]}
+            if detail.get("counts"):
+                note["counts"] = detail["counts"]
+            return note
+
+    async def _fetch_note_shared(self, note_url: str, headless: bool, image_ocr: bool, video_asr: bool,
+                                 note_timeout: float = 90.0, asr_model: Optional[str] = None) -> Dict[str, Any]:
+        # With many clients on one server, overlapping searches ask for the same notes at the same time;
+        # they await one fetch instead of each opening a tab. The fetch is cancelled only when no caller is left.
+        key = (note_id_from_url(note_url), image_ocr, video_asr, asr_model)
+        entry = self._note_fetches.get(key)
+        if entry is None:
+            task = asyncio.create_task(self._fetch_note(note_url, headless=headless, image_ocr=image_ocr, video_asr=video_asr,
+                                                        note_timeout=note_timeout, asr_model=asr_model))
+            entry = self._note_fetches[key] = [task, 0]
+
+            def forget(_):
+                if self._note_fetches.get(key) is entry:
+                    del self._note_fetches[key]
+            task.add_done_callback(forget)
+        else:
+            metrics.inc("note_fetches_shared_total")
+            print(f"笔记正由其他请求获取，等待共享结果: {note_url}")
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+
+    async def _iter_note_details(self, note_urls: Union[List[str], AsyncIterator[str]], headless: bool, image_ocr: bool, video_asr: bool,
+                                 concurrency: int = 4, note_timeout: float = 90.0,
+                                 asr_model: Optional[str] = None) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str], Optional[int]]]:
+        # Spread detail pages over up to `concurrency` pooled tabs and yield (index, note, error, total) as each
+        # note finishes. `note_urls` may be a live harvester, in which case detail fetching starts while the
+        # result list is still being scrolled; `total` stays None until the harvester is exhausted.
+        # A failing or slow note only produces an error entry for itself.
+        queue: asyncio.Queue = asyncio.Queue()
+        done: asyncio.Queue = asyncio.Queue()
+        harvest = {"discovered": 0, "finished": False}
+        worker_count = max(1, min(concurrency, len(note_urls))) if isinstance(note_urls, list) else max(1, concurrency)
+
+        async def feeder():
+            try:
+                if isinstance(note_urls, list):
+                    for note_url in note_urls:
+                        queue.put_nowait((harvest["discovered"], note_url))
+                        harvest["discovered"] += 1
+                else:
+                    async for note_url in note_urls:
+                        queue.put_nowait((harvest["discovered"], note_url))
+                        harvest["discovered"] += 1
+            finally:
+                harvest["finished"] = True
+                for _ in range(worker_count):
+                    queue.put_nowait(None)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, note_url = item
+                note, error = None, None
                 try:
-                    link_element = await note_element.query_selector("a[href^='/search_result/']") # Added await
-                    if not link_element:
-                        link_element = await note_element.query_selector("a.cover.mask.ld") # Fallback, Added await
-                    if link_element:
-                        href = await link_element.get_attribute("href") # Added await
-                        if href and not href.startswith("http"):
-                            url = f"https://www.xiaohongshu.com{href}"
-                        elif href:
-                            url = href
-                    if url:
-                        note_urls_to_visit.append(url)
-                except Exception as e_url_extract:
-                    print(f"提取笔记URL时出错: {e_url_extract}")
-
-                    # Fetch note details
-            # visit URLs.
-            results_data = []
-            # page_note = self.context.pages[1]
-            for i, note_url in enumerate(note_urls_to_visit):
-                if len(results_data) >= limit:
+                    print(f"正在访问笔记 {index+1}: {note_url}")
+                    note = await self._fetch_note_shared(note_url, headless=headless, image_ocr=image_ocr, video_asr=video_asr,
+                                                         note_timeout=note_timeout, asr_model=asr_model)
+                except asyncio.TimeoutError:
+                    error = f"timeout after {note_timeout} seconds"
+                    print(f"处理笔记详情页 {note_url} 超时 ({note_timeout} 秒)，已跳过。")
+                except Exception as e_detail:
+                    error = str(e_detail)
+                    print(f"处理笔记详情页 {note_url} 时出错: {e_detail}")
+                    if self.logging_enabled and self.log_file_handler:
+                        self.log_file_handler.write(f"[{datetime.now()}] Error processing note detail {note_url}: {e_detail}\n")
+                done.put_nowait((index, note, error))
+
+        async def run_pipeline():
+            try:
+                outcomes = await asyncio.gather(feeder(), *(worker() for _ in range(worker_count)), return_exceptions=True)
+            finally:
+                done.put_nowait(None)
+            harvest_error = outcomes[0]
+            if isinstance(harvest_error, BaseException):
+                if harvest["discovered"] == 0:
+                    raise harvest_error
+                print(f"滚动加载搜索结果中断，已使用已获取的 {harvest['discovered']} 条: {harvest_error}")
+
+        pipeline = asyncio.create_task(run_pipeline())
+        try:
+            while True:
+                item = await done.get()
+                if item is None:
                     break
-                try:
-                    print(f"正在访问笔记 {i+1}/{len(note_urls_to_visit)}: {note_url}")
-                    await page.goto(note_url, wait_until="domcontentloaded", timeout=60000) # Added await
-                    await page.wait_for_selector("div.note-content", timeout=15000) # Added await
-
-                    # get title.
-                    title_element = await page.query_selector("div#detail-title.title") # Added await
-                    title = (await title_element.inner_text()).strip() if title_element else (await page.title()).replace(" - 小红书", "").strip() # Added await
-                    title_element = await page.query_selector("div#detail-title.title") # Added await
-                    title = (await title_element.inner_text()).strip() if title_element else (await page.title()).replace(" - 小红书", "").strip() # Added await
-                    
-                    # get content.
-                    content = "N/A"
-                    try:
-                        desc_element = await page.query_selector("div#detail-desc span") # Added await
-                        if desc_element:
-                            content = (await desc_element.inner_text()).strip() # Added await
-                    except Exception as e_content:
-                        print(f"提取内容时出错 {note_url}: {e_content}")
-
-                    # get images and video.
-                    # if image_ocr:
-                    #     # delete all images in the folder
-                    #     image_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../image'))
-                    #     for f in os.listdir(image_folder):
-                    #         file_path = os.path.join(image_folder, f)
-                    #         if os.path.isfile(file_path):
-                    #             os.remove(file_path)
-
-
-                    images = []
-
-                    selector = "div.media-container.video-player-media" # Using the div and both classes
-                    element_count = await page.locator(selector).count()
-
-                    if element_count == 0: # image only
-                        print(f"该笔记：image + text only.")
-                        img_elements = await page.query_selector_all("div.slide-container img.poster-image, div.swiper-slide img") # Added await
-                        for img_el in img_elements:
-                            src = await img_el.get_attribute("src") # Added await
-                            if src and src.startswith("http"):
-                                # images.append(src)
-                                if image_ocr: # ocr
-                                    image_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../image'))
-                                    if not os.path.exists(image_folder):
-                                        os.makedirs(image_folder)
-                                    try:
-                                        # img_name = os.path.basename(src) + '.jpg'
-                                        img_name = 'download_image.jpg'
-                                        img_path = os.path.join(image_folder, img_name)
-                                        response = requests.get(src, timeout=10)
-                                        if response.status_code == 200:
-                                            with open(img_path, 'wb') as f:
-                                                f.write(response.content)
-                                    except Exception as e:
-                                        print(f"下载图片失败: {src}, 错误: {e}")
-                                    text = pytesseract.image_to_string(Image.open(image_folder+'\\'+img_name), lang='chi_sim+eng')
-                                    # print(f'ocr结果：{text}')
-                                    images.append(text)
-                                else:
-                                    images.append(src)
-                    else: # video only
-                        print(f"该笔记：video + text only.")
-                        # click start button.
-                        await page.locator('xg-start.xgplayer-start div.xgplayer-icon-play').click(timeout=5000)
-
-                        # get video link.
-                        # 尝试定位 <meta name="og:video" content="...">
-                        meta_tag_selector_name = 'meta[name="og:video"]'
-                        meta_element_name = await page.query_selector(meta_tag_selector_name)
-
-                        if meta_element_name:
-                            video_link = await meta_element_name.get_attribute('content')
-                        else:
-                            # 如果上面没找到，尝试 <meta property="og:video" content="..."> (更标准的 OG 标签)
-                            meta_tag_selector_property = 'meta[property="og:video"]'
-                            meta_element_property = await page.query_selector(meta_tag_selector_property)
-                            if meta_element_property:
-                                video_link = await meta_element_property.get_attribute('content')
-
-                        # download video.
-                        if video_link:
-                            # HTML中 &amp; 需要替换回 &
-                            video_link_out = video_link.replace('&amp;', '&')
-                            print(f"link:{video_link_out}")      
-                            if video_asr: # asr enable.
-                                # 下载视频
-                                response = requests.get(video_link_out, stream=True)
-                                with open("video//downloaded_video.mp4", "wb") as f:
-                                    for chunk in response.iter_content(chunk_size=8192):
-                                        if chunk:
-                                            f.write(chunk)
-                                print("视频已下载到 downloaded_video.mp4")
-
-                                # video_2_text.
-                                # 加载模型 (例如 "tiny", "base", "small", "medium", "large")
-                                model = whisper.load_model("tiny")
-                                video_path = "video//downloaded_video.mp4"
-                                result = model.transcribe(video_path, language="zh")
-                                print(result["text"])
-
-                                images.append(result["text"])
-                            else:
-                                images.append(video_link_out)              
-                        else:
-                            print("未能通过 meta 标签找到视频链接。")
+                total = harvest["discovered"] if harvest["finished"] else None
+                yield item + (total,)
+            await pipeline # surfaces a harvest that failed before finding anything
+        finally:
+            # Also reached when the consumer stops early: don't leave tabs busy for nobody.
+            if not pipeline.done():
+                pipeline.cancel()
+                await asyncio.gather(pipeline, return_exceptions=True)
+
+    async def _open_search_results(self, page: Page, keywords: str, video_asr: bool, profile: Optional[Profile] = None) -> None:
+        # List-page work: run the search and apply the filter.
+        with metrics.span("search_navigation"):
+            await page.goto(BASE_URL) # Added await
+            self._check_blocked(page, profile)
 
-                    # get comments.
-                    comments = []
+             # input and search.
+            await page.wait_for_selector(SELECTORS["search_input"], timeout=self.waits.deadline("search_input") * 1000) # Added await
+            await page.fill(SELECTORS["search_input"], keywords) # Added await
+            await page.wait_for_selector(SELECTORS["search_button"], timeout=60000) # Added await for possibly login.
+            # The result page is up once its URL commits or the search API has answered.
+            search_submitted = asyncio.create_task(
+                self.waits.wait_for_any(page, "search_submit", url_changed_from=page.url, response=SEARCH_API))
+            try:
+                await page.click(SELECTORS["search_button"], timeout=30000) # Added await
+            except Exception:
+                search_submitted.cancel()
+                raise
+            await search_submitted
+            # Verification pages also show up in answer to a search; only the path is checked, never the keyword.
+            self._check_blocked(page, profile)
+        
+        if video_asr == False: # if disable video asr, only image + text selected.
+            try:
+                with metrics.span("filter_click"):
+                    # The filtered list is fetched again; wait for that answer so the old list is not read.
+                    filter_applied = asyncio.create_task(self.waits.wait_for_any(page, "filter_apply", response=SEARCH_API))
                     try:
-                        comments_el = await page.query_selector("div.comments-el")
-                        if comments_el:
-                            comment_text_elements = await comments_el.query_selector_all("span.note-text span") # Select the inner span for text
-                            for comment_el in comment_text_elements:
-                                comment_text = await comment_el.inner_text()
-                                if comment_text:
-                                    comments.append(comment_text.strip())
-                    except Exception as e_comment:
-                        print(f"提取评论时出错 {note_url}: {e_comment}")
-                    
-                    # results_data.append({"url": note_url, "title": title, "content": content, "images": images})
-                    # note_url =[]
-                    # title=[]
-                    # content=[]
-                    # images=[]
-                    # comments=[]
-                    results_data.append({"url": note_url, "title": title, "content": content, "images": images, "comments": comments})
-                
+                        await page.click(SELECTORS["image_filter"], timeout=10000) #图文filter, Added await
+                    except Exception:
+                        filter_applied.cancel()
+                        raise
+                    await filter_applied
+                print(f"本次搜索仅图文")
+            except Exception as e_filter_click:
+                print(f"无法点击 '图文' 筛选器 (可能不存在或页面结构已更改): {e_filter_click}")
+                if self.logging_enabled and self.log_file_handler:
+                    self.log_file_handler.write(f"[{datetime.now()}] Warning: Could not click '图文' filter: {e_filter_click}\n")
+        else:
+            # await page.click("div#video.channel", timeout=10000) #图文filter, Added await
+            print(f"本次搜索视频+图文")
+
+        with metrics.span("result_list_wait"):
+            await page.wait_for_selector(SELECTORS["note_item"], timeout=self.waits.deadline("result_list") * 1000) # Added await
+
+        # 如果成功点击“图文”，则登录成功。
+        self.logged_in_successfully = True
+        (profile or self.profiles.primary).session.mark_valid("search")
+
+    async def _harvest_note_urls(self, keywords: str, limit: int, headless: bool, video_asr: bool,
+                                 scroll_budget: float = 30.0, feed: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        # Yields note URLs as they appear, scrolling the lazy-loading result feed until exactly `limit`
+        # distinct notes were found, the feed stops growing, or the scroll budget/time runs out.
+        # feed["exhausted"] is set when it stopped because the feed had nothing more to show.
+        # A failed search is retried (with backoff) only while no URL has been handed out yet.
+        if limit <= 0:
+            return
+        found = 0
+        for attempt in itertools.count():
+            profile = None
+            try:
+                async with self._profile_page(headless) as (profile, page, navigation):
+                    if profile is self.profiles.primary: # these describe the primary account (session saving on close)
+                        self.context = self.pool.context
+                        self.playwright = self.pool.playwright
+                    # The result list only needs hrefs, never the cover images.
+                    await self.request_blocker.apply(page, BlockingPolicy())
+                    opened = time.perf_counter()
+                    await self._open_search_results(page, keywords, video_asr, profile)
+                    navigation.latency = time.perf_counter() - opened # the controller judges the search itself, not the scrolling
+                    # Scrolling keeps the tab but not the navigation slot, so detail pages can start meanwhile.
+                    await navigation.release()
+
+                    seen_note_ids = set()
+                    scrolls = 0
+                    idle_rounds = 0
+                    deadline = time.monotonic() + scroll_budget
+                    while True:
+                        # Fetch note URLs, from the search state when possible, else all hrefs in one DOM round trip.
+                        with metrics.span("list_parse"):
+                            urls = await extract_note_links_from_state(page) if self.extraction_mode == "state" else []
+                            if not urls:
+                                urls = await extract_note_links(page)
+                        new_count = 0
+                        for url in urls:
+                            note_id = note_id_from_url(url)
+                            if note_id in seen_note_ids:
+                                continue
+                            seen_note_ids.add(note_id)
+                            new_count += 1
+                            found += 1
+                            yield url
+                            if found >= limit:
+                                return
+
+                        idle_rounds = idle_rounds + 1 if new_count == 0 else 0
+                        if idle_rounds >= self.max_idle_scrolls or scrolls >= self.max_scrolls or time.monotonic() >= deadline:
+                            if feed is not None:
+                                feed["exhausted"] = idle_rounds >= self.max_idle_scrolls
+                            print(f"搜索结果已滚动 {scrolls} 次，共获取 {found}/{limit} 条笔记。")
+                            return
+
+                        last_href = urls[-1] if urls else None
+                        count_before = await page.evaluate("(sel) => document.querySelectorAll(sel).length", SELECTORS["note_item"])
+                        await page.evaluate("() => window.scrollBy(0, window.innerHeight * 2)")
+                        scrolls += 1
+                        try:
+                            # The feed is virtualized, so "more items" or "a different last item" both mean new content.
+                            await page.wait_for_function(
+                                """([sel, linkSel, n, lastHref]) => {
+                                    const items = document.querySelectorAll(sel);
+                                    if (items.length > n) return true;
+                                    const last = items[items.length - 1];
+                                    const link = last ? last.querySelector(linkSel) : null;
+                                    return !!link && !!lastHref && !lastHref.endsWith(link.getAttribute('href'));
+                                }""",
+                                arg=[SELECTORS["note_item"], SELECTORS["note_link"][0], count_before, last_href],
+                                timeout=max(0.1, min(3.0, deadline - time.monotonic())) * 1000,
+                            )
+                            metrics.inc("feed_scrolls_total", result="loaded")
+                        except Exception:
+                            metrics.inc("feed_scrolls_total", result="nothing_new") # counted as an idle round if the next read finds nothing too
+            except Exception as e_search:
+                if found:
+                    raise
+                await self._backoff_or_raise(attempt, e_search, profile, f"搜索 '{keywords}'")
+
+    async def _search_note_urls(self, keywords: str, limit: int, headless: bool, video_asr: bool,
+                                scroll_budget: float = 30.0) -> Tuple[List[str], bool]:
+        # (urls, whether the feed ran out before `limit`), the refresh contract of SearchCache.lookup.
+        feed = {}
+        urls = [url async for url in self._harvest_note_urls(keywords, limit, headless=headless, video_asr=video_asr,
+                                                             scroll_budget=scroll_budget, feed=feed)]
+        return urls, feed.get("exhausted", False)
+
+    async def _harvest_and_cache(self, keywords: str, channel: str, limit: int, headless: bool, video_asr: bool,
+                                 scroll_budget: float) -> AsyncIterator[str]:
+        urls = []
+        feed = {}
+        async for url in self._harvest_note_urls(keywords, limit, headless=headless, video_asr=video_asr,
+                                                 scroll_budget=scroll_budget, feed=feed):
+            urls.append(url)
+            yield url
+        self.search_cache.store(keywords, channel, urls, limit, complete=feed.get("exhausted", False))
+
+    async def search_notes_stream(self, keywords: str, limit: int = 10, headless: bool = False, image_ocr: bool = False, video_asr: bool = False,
+                                  concurrency: int = 4, note_timeout: float = 90.0, asr_model: Optional[str] = None,
+                                  scroll_budget: float = 30.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yields {"index", "total", "note", "error"} for every note as soon as it is finished, in completion order.
+
+        "total" is None while the result feed is still being scrolled.
+        """
+        # Result lists barely change within minutes, so identical searches are answered from the search cache.
+        # On a miss, note details are fetched while the harvester is still scrolling the result feed.
+        channel = "all" if video_asr else "image"
+        note_urls_to_visit = self.search_cache.lookup(
+            keywords, channel, limit,
+            lambda fetch_limit: self._search_note_urls(keywords, fetch_limit, headless=headless, video_asr=video_asr,
+                                                       scroll_budget=scroll_budget))
+        if note_urls_to_visit is None:
+            note_urls_to_visit = self._harvest_and_cache(keywords, channel, limit, headless=headless, video_asr=video_asr,
+                                                         scroll_budget=scroll_budget)
+
+        # visit URLs, several tabs at a time.
+        async for index, note, error, total in self._iter_note_details(note_urls_to_visit, headless=headless, image_ocr=image_ocr, video_asr=video_asr,
+                                                                       concurrency=concurrency, note_timeout=note_timeout, asr_model=asr_model):
+            yield {"index": index, "total": total, "note": note, "error": error}
+
+    async def search_notes(self, keywords: str, limit: int = 10, headless: bool = False, image_ocr: bool = False, video_asr: bool = False,
+                           concurrency: int = 4, note_timeout: float = 90.0, asr_model: Optional[str] = None,
+                           scroll_budget: float = 30.0) -> List[Dict[str, Any]]: # Added async, headless param
+        # 方法一：使用 time.time()
+        start_time_tt = time.time()
+
+        # Blocking variant of search_notes_stream: waits for every note and returns them in result-list order.
+        finished = []
+        async for event in self.search_notes_stream(keywords, limit=limit, headless=headless, image_ocr=image_ocr, video_asr=video_asr,
+                                                    concurrency=concurrency, note_timeout=note_timeout, asr_model=asr_model,
+                                                    scroll_budget=scroll_budget):
+            if event["note"] is not None:
+                finished.append((event["index"], event["note"]))
+        results_data = [note for _, note in sorted(finished, key=lambda item: item[0])]
 
-                except Exception as e_detail:
-                    print(f"处理笔记详情页 {note_url} 时出错: {e_detail}")
-                    # if self.logging_enabled and self.log_file_handler:
-                    #     self.log_file_handler.write(f"[{datetime.now()}] Error processing note detail {note_url}: {e_detail}\n")
-        
         # await self._save_session_state() # Added await, Save session after successful search operation
         # await self.close()
         # results_data = []
@@ -470,13 +869,114 @@ class BrowserHandler:
         end_time_tt = time.time()
         elapsed_time_tt = end_time_tt - start_time_tt
         print(f"使用 time.time() 計時: {elapsed_time_tt:.6f} 秒")
-
-        await page.close() # 修改
-        # await context.close()
+        if self.request_blocker.enabled:
+            blocked = self.request_blocker.stats()
+            print(f"累计拦截请求 {blocked['blocked_total']} 个，页面实际传输 {blocked['transferred_bytes'] / (1024 * 1024):.1f} MB，"
+                  f"缓存命中 {blocked['cache_hits']} 次")
 
         return results_data
 
+    async def search_notes_batch_stream(self, keywords_list: List[str], limit: int = 10, headless: bool = False,
+                                        image_ocr: bool = False, video_asr: bool = False, concurrency: int = 4,
+                                        keyword_concurrency: int = 2, note_timeout: float = 90.0,
+                                        asr_model: Optional[str] = None, scroll_budget: float = 30.0) -> AsyncIterator[Dict[str, Any]]:
+        """Yields {"keywords", "notes", "errors", "shared"} per keyword as soon as all of its notes are finished.
+
+        Every note is fetched (and OCR'd/transcribed) once per batch even when several keywords list it;
+        "shared" counts the notes of a keyword that were already scheduled by another keyword.
+        """
+        # One pool of note fetches for the whole batch: `concurrency` detail pages at a time across all keywords,
+        # at most `keyword_concurrency` result lists scrolled at once, navigations paced by nav_limiter.
+        channel = "all" if video_asr else "image"
+        note_slots = asyncio.Semaphore(max(1, concurrency))
+        keyword_slots = asyncio.Semaphore(max(1, keyword_concurrency))
+        note_tasks: Dict[str, asyncio.Task] = {}
+
+        async def fetch(note_url: str) -> Dict[str, Any]:
+            async with note_slots:
+                print(f"正在访问笔记: {note_url}")
+                return await self._fetch_note_shared(note_url, headless=headless, image_ocr=image_ocr, video_asr=video_asr,
+                                                     note_timeout=note_timeout, asr_model=asr_model)
+
+        def schedule(note_url: str) -> Tuple[asyncio.Task, bool]:
+            note_id = note_id_from_url(note_url)
+            task = note_tasks.get(note_id)
+            if task is not None:
+                return task, True
+            task = note_tasks[note_id] = asyncio.create_task(fetch(note_url))
+            return task, False
+
+        async def run_keyword(keywords: str) -> Dict[str, Any]:
+            scheduled = []
+            errors = []
+            async with keyword_slots:
+                try:
+                    note_urls = self.search_cache.lookup(
+                        keywords, channel, limit,
+                        lambda fetch_limit: self._search_note_urls(keywords, fetch_limit, headless=headless, video_asr=video_asr,
+                                                                   scroll_budget=scroll_budget))
+                    if note_urls is not None:
+                        scheduled = [(url,) + schedule(url) for url in note_urls]
+                    else:
+                        async for url in self._harvest_and_cache(keywords, channel, limit, headless=headless,
+                                                                 video_asr=video_asr, scroll_budget=scroll_budget):
+                            scheduled.append((url,) + schedule(url))
+                except Exception as e_search:
+                    print(f"关键词 '{keywords}' 搜索失败: {e_search}")
+                    errors.append({"url": None, "error": str(e_search)})
+            notes = []
+            for url, task, _ in scheduled:
+                try:
+                    notes.append(await asyncio.shield(task))
+                except asyncio.TimeoutError:
+                    errors.append({"url": url, "error": f"timeout after {note_timeout} seconds"})
+                except Exception as e_detail:
+                    errors.append({"url": url, "error": str(e_detail)})
+            return {"keywords": keywords, "notes": notes, "errors": errors, "shared": sum(1 for *_, shared in scheduled if shared)}
+
+        keyword_tasks = [asyncio.create_task(run_keyword(k)) for k in unique_keywords(keywords_list)]
+        try:
+            for finished in asyncio.as_completed(keyword_tasks):
+                yield await finished
+        finally:
+            for task in keyword_tasks + list(note_tasks.values()):
+                task.cancel()
+            await asyncio.gather(*keyword_tasks, *note_tasks.values(), return_exceptions=True)
+
+    async def search_notes_batch(self, keywords_list: List[str], limit: int = 10, headless: bool = False,
+                                 image_ocr: bool = False, video_asr: bool = False, concurrency: int = 4,
+                                 keyword_concurrency: int = 2, note_timeout: float = 90.0,
+                                 asr_model: Optional[str] = None, scroll_budget: float = 30.0,
+                                 on_keyword: Optional[Callable[[Dict[str, Any], int, int], Awaitable[None]]] = None) -> Dict[str, Any]:
+        # Blocking variant of search_notes_batch_stream, grouped per keyword in the order they were asked for.
+        # on_keyword(result, finished, total) is awaited as each keyword completes, e.g. for progress reports.
+        start_time = time.perf_counter()
+        keywords_order = unique_keywords(keywords_list)
+        grouped = {}
+        async for result in self.search_notes_batch_stream(keywords_list, limit=limit, headless=headless, image_ocr=image_ocr,
+                                                           video_asr=video_asr, concurrency=concurrency,
+                                                           keyword_concurrency=keyword_concurrency, note_timeout=note_timeout,
+                                                           asr_model=asr_model, scroll_budget=scroll_budget):
+            grouped[result["keywords"]] = result
+            if on_keyword is not None:
+                await on_keyword(result, len(grouped), len(keywords_order))
+        ordered = [grouped[k] for k in keywords_order if k in grouped]
+        unique_notes = {note_id_from_url(note["url"]) for result in ordered for note in result["notes"]}
+        shared = sum(result["shared"] for result in ordered)
+        print(f"批量搜索 {len(ordered)} 个关键词，共 {len(unique_notes)} 篇不同笔记，跨关键词复用 {shared} 篇，"
+              f"耗时 {time.perf_counter() - start_time:.2f} 秒")
+        return {
+            "results": {result["keywords"]: result["notes"] for result in ordered},
+            "errors": {result["keywords"]: result["errors"] for result in ordered if result["errors"]},
+            "stats": {"keywords": len(ordered), "unique_notes": len(unique_notes), "shared_notes": shared},
+        }
+
     async def search_notes_bak(self, keywords: str, limit: int = 10, headless: bool = False, image_ocr: bool = False, video_asr: bool = False) -> List[Dict[str, Any]]: # Added async, headless param
+        # Old sequential implementation; its OCR dependencies are only imported if it is ever called.
+        import pytesseract
+        import requests
+        from PIL import Image
+
         # page = await self._ensure_logged_in_page(headless=headless) # Added await, pass headless
         self.context = await self._get_or_create_persistent_context(headless=headless)
         page = self.context.pages[0]
@@ -634,29 +1134,24 @@ class BrowserHandler:
             # _save_session_state will internally handle if context is usable
             await self._save_session_state()
         
-        if self.page and not self.page.is_closed(): # Page's is_closed is fine
-            try:
-                await self.page.close()
-                print("页面已关闭。")
-            except Exception as e:
-                print(f"关闭页面时出错: {e}")
+        if self.page: # Hand the login page back before the pool shuts the context down
+            await self.pool.release_page(self.page)
             self.page = None
 
-        if self.context: # Check if context exists
-            try:
-                await self.context.close()
-                print("浏览器上下文已关闭。")
-            except Exception as e: # Catch error if closing a problematic context
-                print(f"关闭浏览器上下文时出错: {e}")
-            self.context = None
-
-        if self.playwright:
-            try:
-                await self.playwright.stop() # Added await
-                print("Playwright已停止。")
-            except Exception as e:
-                print(f"停止Playwright时出错: {e}")
-            self.playwright = None
+        fetches = [task for task, _ in self._note_fetches.values()]
+        for task in fetches:
+            task.cancel()
+        await asyncio.gather(*fetches, return_exceptions=True)
+        await self.profiles.close()
+        print("浏览器上下文已关闭。")
+        if self.asr_batcher is not None:
+            await self.asr_batcher.close()
+        self.media.shutdown()
+        await self.downloader.close()
+        self.note_cache.close()
+        await self.search_cache.close()
+        self.context = None
+        self.playwright = None
         
         if self.logging_enabled and self.log_file_handler:
             try:
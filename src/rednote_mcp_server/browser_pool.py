@@ -0,0 +1,238 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright, BrowserContext, Page, Playwright
+
+from metrics import metrics
+
+
+class BrowserPool:
+    """Keeps one persistent Chrome context and a set of warm tabs alive across tool calls.
+
+    The persistent profile can only be opened by one Chrome at a time, so every caller
+    (search, login, batch jobs) goes through this pool instead of launching its own context.
+    """
+
+    def __init__(self, user_data_dir, max_pages: int = 4, idle_timeout: float = 600.0,
+                 page_idle_timeout: float = 120.0, channel: Optional[str] = "chrome", health_check_interval: float = 30.0):
+        self.user_data_dir = user_data_dir
+        self.max_pages = max(1, max_pages)
+        self.idle_timeout = idle_timeout # close the whole browser after this many idle seconds
+        self.page_idle_timeout = page_idle_timeout # close surplus idle tabs after this many seconds
+        self.channel = channel
+        self.health_check_interval = health_check_interval # seconds between tab probes on the lease path
+
+        self.playwright: Optional[Playwright] = None
+        self.context: Optional[BrowserContext] = None
+        self.headless: Optional[bool] = None
+
+        self._idle_pages: List[Tuple[Page, float]] = [] # (page, released_at)
+        self._busy_pages: set = set()
+        self._slots = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self._last_used = time.monotonic()
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._recycle_pending = False # health check failed or reset() was called while pages were leased; recycle once they are back
+        self._checked_at = 0.0 # monotonic time of the last passed health check
+
+    async def _is_context_alive(self) -> bool:
+        if not self.context:
+            return False
+        # Every lease passes through here under the lock, so the CDP round trip runs only once per interval;
+        # in between, a context that still has open tabs counts as alive (a crashed browser closes them all).
+        recently_checked = time.monotonic() - self._checked_at < self.health_check_interval
+        if recently_checked and any(not p.is_closed() for p in self.context.pages):
+            return True
+        try:
+            # Same health check as BrowserHandler used to do: a live context has a responsive page. Only idle
+            # tabs are probed; a leased one may be mid-navigation and slow to answer without anything being wrong.
+            pages = [p for p in self.context.pages if not p.is_closed()]
+            if not pages:
+                return False
+            idle = [p for p in pages if p not in self._busy_pages]
+            if not idle:
+                return True # every tab is in use; their holders see it soon enough if the browser is gone
+            await asyncio.wait_for(idle[0].title(), timeout=5)
+            self._checked_at = time.monotonic()
+            return True
+        except Exception as e:
+            print(f"浏览器上下文健康检查失败: {e}")
+            return False
+
+    async def _launch(self, headless: bool) -> BrowserContext:
+        if not self.playwright:
+            self.playwright = await async_playwright().start()
+
+        print(f"检查用户数据目录: {self.user_data_dir}")
+        if not os.path.exists(self.user_data_dir):
+            print(f"警告：Chrome 用户数据目录 {self.user_data_dir} 可能不存在或无法访问。Playwright 可能会尝试创建它，但这通常用于新配置文件。")
+
+        launch_start = time.monotonic()
+        with metrics.span("browser_launch", headless=headless):
+            self.context = await self.playwright.chromium.launch_persistent_context(
+                self.user_data_dir,
+                headless=headless,
+                channel=self.channel
+            )
+        self.headless = headless
+        self._checked_at = time.monotonic()
+        self._idle_pages = [(p, time.monotonic()) for p in self.context.pages if not p.is_closed()]
+        print(f"持久化浏览器上下文启动成功 (耗时 {time.monotonic() - launch_start:.2f} 秒)。")
+        return self.context
+
+    async def _close_context(self) -> None:
+        if self.context:
+            try:
+                await self.context.close()
+            except Exception as e:
+                print(f"关闭浏览器上下文时出错: {e}")
+        self.context = None
+        self.headless = None
+        self._idle_pages = []
+        self._recycle_pending = False
+        self._checked_at = 0.0
+        # Pages still checked out keep their slot until their holder releases them.
+
+    async def get_context(self, headless: bool = True) -> BrowserContext:
+        async with self._lock:
+            alive = not self._recycle_pending and await self._is_context_alive()
+            if not alive and self.context and self._busy_pages:
+                # Closing now would kill other callers' in-flight pages: keep serving the context and
+                # relaunch once the last leased page comes back (release_page).
+                if not self._recycle_pending:
+                    print("浏览器上下文健康检查失败，但仍有页面在使用中，待其释放后再重建。")
+                self._recycle_pending = True
+                return self.context
+            if alive:
+                if self.headless == headless or self._busy_pages:
+                    if self.headless != headless:
+                        print(f"浏览器上下文仍有页面在使用中，沿用当前模式 (headless={self.headless})。")
+                    return self.context
+                print(f"请求的 headless={headless} 与当前上下文不同，重新启动浏览器。")
+            elif self.context:
+                print("现有上下文无法使用，将关闭并创建新的持久化上下文。")
+            await self._close_context()
+            try:
+                return await self._launch(headless)
+            except Exception as e_launch:
+                print(f"启动持久化浏览器上下文失败: {e_launch}")
+                await self._close_context()
+                raise
+
+    async def acquire_page(self, headless: bool = True) -> Page:
+        await self._slots.acquire()
+        try:
+            context = await self.get_context(headless)
+            self._ensure_reaper()
+            page = None
+            while self._idle_pages:
+                candidate, _ = self._idle_pages.pop()
+                if not candidate.is_closed():
+                    page = candidate
+                    break
+            if page is None:
+                page = await context.new_page()
+            self._busy_pages.add(page)
+            self._last_used = time.monotonic()
+            return page
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release_page(self, page: Page) -> None:
+        self._last_used = time.monotonic()
+        if page not in self._busy_pages:
+            return # already released
+        self._busy_pages.discard(page)
+        if not page.is_closed() and self.context and page.context == self.context and not self._recycle_pending:
+            self._idle_pages.append((page, time.monotonic()))
+        self._slots.release()
+        if self._recycle_pending and not self._busy_pages:
+            async with self._lock:
+                if self._recycle_pending and not self._busy_pages:
+                    print("使用中的页面已全部释放，关闭失效的浏览器上下文。")
+                    await self._close_context()
+
+    @asynccontextmanager
+    async def page(self, headless: bool = True):
+        page = await self.acquire_page(headless)
+        try:
+            yield page
+        finally:
+            await self.release_page(page)
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reap_idle())
+
+    async def _reap_idle(self) -> None:
+        interval = max(1.0, min(self.page_idle_timeout, self.idle_timeout) / 2)
+        while self.context:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            async with self._lock:
+                if not self.context:
+                    break
+                if not self._busy_pages and now - self._last_used >= self.idle_timeout:
+                    print(f"浏览器已空闲 {self.idle_timeout:.0f} 秒，关闭持久化上下文。")
+                    await self._close_context()
+                    break
+                # Keep one warm tab so the persistent context never ends up page-less.
+                open_count = len(self._busy_pages) + len(self._idle_pages)
+                keep: List[Tuple[Page, float]] = []
+                for page, released_at in self._idle_pages:
+                    if page.is_closed():
+                        open_count -= 1
+                        continue
+                    if now - released_at >= self.page_idle_timeout and open_count > 1:
+                        try:
+                            await page.close()
+                        except Exception:
+                            pass
+                        open_count -= 1
+                    else:
+                        keep.append((page, released_at))
+                self._idle_pages = keep
+
+    async def reset(self) -> None:
+        """Drop the current context; the next acquire relaunches Chrome. With pages still leased, the context
+        is closed once the last of them comes back (see release_page)."""
+        async with self._lock:
+            if self.context and self._busy_pages:
+                print("浏览器上下文仍有页面在使用中，待其释放后再重建。")
+                self._recycle_pending = True
+                return
+            await self._close_context()
+
+    def stats(self) -> Dict[str, object]:
+        metrics.set_gauge("browser_busy_pages", len(self._busy_pages))
+        metrics.set_gauge("browser_idle_pages", len(self._idle_pages))
+        return {
+            "alive": self.context is not None,
+            "headless": self.headless,
+            "max_pages": self.max_pages,
+            "busy_pages": len(self._busy_pages),
+            "idle_pages": len(self._idle_pages),
+            "idle_seconds": round(time.monotonic() - self._last_used, 1),
+        }
+
+    async def close(self) -> None:
+        if self._reaper_task and not self._reaper_task.done():
+            self._reaper_task.cancel()
+            try:
+                await self._reaper_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._reaper_task = None
+        async with self._lock:
+            await self._close_context()
+        if self.playwright:
+            try:
+                await self.playwright.stop()
+                print("Playwright已停止。")
+            except Exception as e:
+                print(f"停止Playwright时出错: {e}")
+            self.playwright = None
@@ -0,0 +1,217 @@
+# Batched DOM extraction: every field of a page is read in a single page.evaluate round trip,
+# driven by one selector table. When the site markup changes, edit SELECTORS and bump SELECTOR_VERSION.
+# The *_from_state functions read the serialized window.__INITIAL_STATE__ instead and need no rendering;
+# they return None when the blob is missing or has an unexpected shape so callers can fall back to the DOM.
+import os
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import Page
+
+from note_cache import note_id_from_url
+
+# REDNOTE_BASE_URL points the scraper at another origin, e.g. the offline fixture site in benchmarks/.
+BASE_URL = os.getenv("REDNOTE_BASE_URL", "https://www.xiaohongshu.com").rstrip("/")
+
+SELECTOR_VERSION = "2025.05.1"
+
+SELECTORS: Dict[str, Any] = {
+    # detail page
+    "note_ready": "div.note-content",
+    "title": "div#detail-title.title",
+    "content": "div#detail-desc span",
+    "video_player": "div.media-container.video-player-media",
+    "images": "div.slide-container img.poster-image, div.swiper-slide img",
+    "video_meta": ['meta[name="og:video"]', 'meta[property="og:video"]'],
+    "play_button": "xg-start.xgplayer-start div.xgplayer-icon-play",
+    "comments_root": "div.comments-el",
+    "comment_text": "span.note-text span",
+    # session
+    "profile_entry": "span.channel:has-text('我')",
+    "login_prompt": ".login-reason",
+    # search result page
+    "search_input": "input#search-input",
+    "search_button": "div.search-icon",
+    "image_filter": "div#image.channel",
+    "note_item": "section.note-item",
+    "note_link": ["a[href^='/search_result/']", "a.cover.mask.ld"],
+}
+
+_NOTE_SCRIPT = """
+(sel) => {
+    const text = (el) => el ? el.innerText.trim() : null;
+    const isVideo = document.querySelectorAll(sel.video_player).length > 0;
+    const imageUrls = [];
+    if (!isVideo) {
+        for (const img of document.querySelectorAll(sel.images)) {
+            const src = img.getAttribute('src');
+            if (src && src.startsWith('http')) imageUrls.push(src);
+        }
+    }
+    let videoUrl = null;
+    if (isVideo) {
+        for (const s of sel.video_meta) {
+            const meta = document.querySelector(s);
+            if (meta) { videoUrl = meta.getAttribute('content'); break; }
+        }
+    }
+    const comments = [];
+    const root = document.querySelector(sel.comments_root);
+    if (root) {
+        for (const el of root.querySelectorAll(sel.comment_text)) {
+            const t = el.innerText;
+            if (t) comments.push(t.trim());
+        }
+    }
+    return {
+        title: text(document.querySelector(sel.title)),
+        document_title: document.title,
+        content: text(document.querySelector(sel.content)),
+        is_video: isVideo,
+        image_urls: imageUrls,
+        video_url: videoUrl,
+        comments: comments,
+    };
+}
+"""
+
+_NOTE_LINKS_SCRIPT = """
+([sel, limit]) => {
+    const hrefs = [];
+    const items = document.querySelectorAll(sel.note_item);
+    for (let i = 0; i < items.length && i < limit; i++) {
+        let link = null;
+        for (const s of sel.note_link) {
+            link = items[i].querySelector(s);
+            if (link) break;
+        }
+        const href = link ? link.getAttribute('href') : null;
+        if (href) hrefs.push(href);
+    }
+    return hrefs;
+}
+"""
+
+
+# Vue refs in the state blob serialize as {"_rawValue": ...} / {"_value": ...}; unwrap them in the page.
+_STATE_SCRIPT = """
+(path) => {
+    const unwrap = (v) => (v && typeof v === 'object' && ('_rawValue' in v || '_value' in v)) ? (v._rawValue ?? v._value) : v;
+    let node = window.__INITIAL_STATE__;
+    for (const key of path) {
+        node = unwrap(node);
+        if (node === undefined || node === null) return null;
+        node = node[key];
+    }
+    node = unwrap(node);
+    return node === undefined ? null : JSON.parse(JSON.stringify(node));
+}
+"""
+
+VIDEO_STREAM_CODECS = ["h264", "h265", "av1"]
+
+
+def absolute_url(href: str) -> str:
+    return href if href.startswith("http") else f"{BASE_URL}{href}"
+
+
+async def extract_note(page: Page, note_url: str) -> Dict[str, Any]:
+    raw = await page.evaluate(_NOTE_SCRIPT, SELECTORS)
+    if raw["is_video"] and not raw["video_url"]:
+        # The og:video meta is normally server-rendered; only start the player when it is missing.
+        try:
+            await page.locator(SELECTORS["play_button"]).click(timeout=5000)
+            raw = await page.evaluate(_NOTE_SCRIPT, SELECTORS)
+        except Exception as e_play:
+            print(f"点击播放按钮失败 {note_url}: {e_play}")
+
+    title = raw["title"] or (raw["document_title"] or "").replace(" - 小红书", "").strip()
+    video_url = raw["video_url"].replace('&amp;', '&') if raw["video_url"] else None # HTML中 &amp; 需要替换回 &
+    if raw["is_video"]:
+        print(f"该笔记：video + text only.")
+        if video_url:
+            print(f"link:{video_url}")
+        else:
+            print("未能通过 meta 标签找到视频链接。")
+    else:
+        print(f"该笔记：image + text only.")
+
+    return {"url": note_url, "title": title, "content": raw["content"] or "N/A", "image_urls": raw["image_urls"],
+            "video_url": video_url, "comments": raw["comments"]}
+
+
+async def extract_note_links(page: Page, limit: Optional[int] = None) -> List[str]:
+    hrefs = await page.evaluate(_NOTE_LINKS_SCRIPT, [SELECTORS, limit if limit is not None else 1000000])
+    return [absolute_url(href) for href in hrefs]
+
+
+def _pick_image_url(image: Dict[str, Any]) -> Optional[str]:
+    for info in image.get("infoList") or []:
+        if info.get("imageScene") == "WB_DFT" and info.get("url"):
+            return info["url"]
+    return image.get("urlDefault") or image.get("url")
+
+
+def _pick_video_url(video: Dict[str, Any]) -> Optional[str]:
+    stream = ((video.get("media") or {}).get("stream")) or {}
+    for codec in VIDEO_STREAM_CODECS:
+        for variant in stream.get(codec) or []:
+            url = variant.get("masterUrl") or next(iter(variant.get("backupUrls") or []), None)
+            if url:
+                return url
+    return None
+
+
+def parse_note_state(note_url: str, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    note = entry.get("note") or {}
+    if not note.get("noteId") and not note.get("title") and not note.get("desc"):
+        return None
+    is_video = note.get("type") == "video"
+    image_urls = [] if is_video else [u for u in (_pick_image_url(img) for img in note.get("imageList") or []) if u and u.startswith("http")]
+    video_url = _pick_video_url(note.get("video") or {}) if is_video else None
+    comments_block = entry.get("comments") or {}
+    comment_list = comments_block.get("list") if isinstance(comments_block, dict) else comments_block
+    comments = [c["content"].strip() for c in comment_list or [] if isinstance(c, dict) and c.get("content")]
+    interact = note.get("interactInfo") or {}
+    return {
+        "url": note_url,
+        "title": (note.get("title") or "").strip(),
+        "content": (note.get("desc") or "").strip() or "N/A",
+        "image_urls": image_urls,
+        "video_url": video_url,
+        "comments": comments,
+        "author": (note.get("user") or {}).get("nickname"),
+        "counts": {key: interact.get(key) for key in ("likedCount", "collectedCount", "commentCount", "shareCount") if key in interact},
+    }
+
+
+async def extract_note_from_state(page: Page, note_url: str) -> Optional[Dict[str, Any]]:
+    try:
+        detail_map = await page.evaluate(_STATE_SCRIPT, ["note", "noteDetailMap"])
+        if not isinstance(detail_map, dict) or not detail_map:
+            return None
+        entry = detail_map.get(note_id_from_url(note_url))
+        if entry is None and len(detail_map) == 1:
+            entry = next(iter(detail_map.values()))
+        detail = parse_note_state(note_url, entry if isinstance(entry, dict) else {})
+    except Exception as e:
+        print(f"解析页面状态失败 {note_url}: {e}")
+        return None
+    if detail:
+        print(f"该笔记 (页面状态)：{'video' if detail['video_url'] else 'image'} + text, 图片 {len(detail['image_urls'])} 张, 评论 {len(detail['comments'])} 条。")
+    return detail
+
+
+async def extract_note_links_from_state(page: Page, limit: Optional[int] = None) -> List[str]:
+    try:
+        feeds = await page.evaluate(_STATE_SCRIPT, ["search", "feeds"])
+    except Exception as e:
+        print(f"解析搜索页状态失败: {e}")
+        return []
+    urls = []
+    for feed in feeds or []:
+        if limit is not None and len(urls) >= limit:
+            break
+        if not isinstance(feed, dict) or not feed.get("id") or feed.get("modelType", "note") != "note":
+            continue
+        urls.append(absolute_url(f"/search_result/{feed['id']}?xsec_token={feed.get('xsecToken', '')}&xsec_source="))
+    return urls
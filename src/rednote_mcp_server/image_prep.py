@@ -0,0 +1,69 @@
+# Pillow-only image helpers for OCR: perceptual hashing, blank detection and preprocessing.
+from typing import Any, Dict, List
+
+from PIL import Image, ImageOps, ImageStat
+
+HASH_SIZE = 16 # 16x16 comparisons -> 256-bit dHash; 8x8 cannot tell text cards with the same layout apart
+BLANK_STDDEV = 6.0 # grayscale standard deviation below which an image carries no readable text
+MIN_SIDE = 32 # icons/spacers smaller than this are never worth OCR
+
+
+def dhash(image: Image.Image) -> int:
+    # Difference hash: brightness gradient between neighbouring pixels of a 17x16 thumbnail.
+    # Re-encoding, rescaling and small crops/watermarks flip only a few bits.
+    small = ImageOps.autocontrast(image.convert("L")).resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def fingerprint(image: Image.Image) -> Dict[str, Any]:
+    gray = image.convert("L")
+    stddev = ImageStat.Stat(gray).stddev[0]
+    return {
+        "dhash": dhash(gray),
+        "blank": stddev < BLANK_STDDEV or min(image.size) < MIN_SIDE,
+        "width": image.width,
+        "height": image.height,
+    }
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    total = sum(histogram)
+    weighted_total = sum(i * count for i, count in enumerate(histogram))
+    background = background_sum = 0
+    best_threshold, best_variance = 127, -1.0
+    for threshold, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        background_sum += threshold * count
+        mean_background = background_sum / background
+        mean_foreground = (weighted_total - background_sum) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = threshold, variance
+    return best_threshold
+
+
+def preprocess(image: Image.Image, max_side: int = 1600, binarize: bool = True) -> Image.Image:
+    """Grayscale, downscale so the longest side is at most `max_side`, then Otsu-binarize."""
+    image = ImageOps.exif_transpose(image).convert("L")
+    scale = max_side / max(image.size) if max_side else 1.0
+    if scale < 1.0:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.Resampling.LANCZOS)
+    if binarize:
+        image = ImageOps.autocontrast(image)
+        threshold = _otsu_threshold(image.histogram())
+        image = image.point(lambda value: 255 if value > threshold else 0)
+        if ImageStat.Stat(image).mean[0] < 128:
+            image = ImageOps.invert(image) # light text on a dark card: tesseract wants dark on light
+    return image
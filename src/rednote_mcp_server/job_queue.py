@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import itertools
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    def __init__(self, kind: str, params: Dict[str, Any], priority: int, heavy: bool,
+                 run: Callable[["Job"], Awaitable[Any]]):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.priority = priority
+        self.heavy = heavy
+        self.run = run
+        self.state = QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {"completed": 0, "total": None}
+        self.partial: List[Tuple[int, Any]] = [] # (index, item) finished so far, for results of a running, failed or cancelled job
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.sort_key: Tuple[int, int] = (-priority, 0) # set on submit: higher priority first, then FIFO
+
+    def status(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "priority": self.priority,
+            "heavy": self.heavy,
+            "params": self.params,
+            "progress": dict(self.progress),
+            "queued_seconds": round((self.started_at or self.finished_at or now) - self.submitted_at, 1),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 1) if self.started_at else None,
+            "error": self.error,
+        }
+
+
+class JobScheduler:
+    """In-process queue for long-running searches that outlive the tool call that submitted them.
+
+    Jobs start in priority order (higher first, FIFO within a priority), at most `max_running` at a time.
+    Heavy jobs (video ASR) may take at most `max_heavy` of those slots, and a queued heavy job that cannot
+    start does not hold back the cheaper jobs behind it. Finished jobs and their results are kept for
+    `result_ttl` seconds.
+    """
+
+    def __init__(self, max_running: int = 3, max_heavy: int = 1, result_ttl: float = 3600, max_jobs: int = 1000):
+        self.max_running = max(1, max_running)
+        self.max_heavy = max(1, min(max_heavy, self.max_running))
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, Job] = {}
+        self._queue: List[Tuple[Tuple[int, int], Job]] = [] # (sort_key, job); cancelled jobs are skipped lazily
+        self._seq = itertools.count()
+        self._running: Dict[str, Job] = {}
+
+    def submit(self, kind: str, params: Dict[str, Any], run: Callable[[Job], Awaitable[Any]],
+               priority: int = 0, heavy: bool = False) -> Job:
+        self._prune()
+        if len(self.jobs) >= self.max_jobs:
+            raise RuntimeError(f"任务数已达上限 {self.max_jobs}，请等待已有任务完成或过期后再提交")
+        job = Job(kind, params, priority, heavy, run)
+        self.jobs[job.id] = job
+        job.sort_key = (-priority, next(self._seq))
+        heapq.heappush(self._queue, (job.sort_key, job))
+        metrics.inc("jobs_total", kind=kind, state=QUEUED)
+        print(f"任务 {job.id} 已提交 ({kind}, 优先级 {priority}{', 重任务' if heavy else ''})")
+        self._dispatch()
+        return job
+
+    def _can_start(self, job: Job) -> bool:
+        heavy_running = sum(1 for running in self._running.values() if running.heavy)
+        return not job.heavy or heavy_running < self.max_heavy
+
+    def _dispatch(self) -> None:
+        skipped = []
+        while self._queue and len(self._running) < self.max_running:
+            entry = heapq.heappop(self._queue)
+            job = entry[1]
+            if job.state != QUEUED:
+                continue
+            if not self._can_start(job):
+                skipped.append(entry) # heavy slots are full; lighter jobs further back may still start
+                continue
+            job.state = RUNNING
+            job.started_at = time.time()
+            metrics.record("job_queue_wait", job.started_at - job.submitted_at, kind=job.kind, heavy=job.heavy)
+            self._running[job.id] = job
+            job.task = asyncio.create_task(self._run(job))
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        self._update_gauges()
+
+    async def _run(self, job: Job) -> None:
+        try:
+            with metrics.span("job", kind=job.kind, heavy=job.heavy):
+                job.result = await job.run(job)
+            job.state = DONE
+        except asyncio.CancelledError:
+            job.state = CANCELLED
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+            print(f"任务 {job.id} 失败: {e}")
+        finally:
+            job.finished_at = time.time()
+            if job.state == DONE and job.result is not None:
+                job.partial = [] # the result holds them now; failed/cancelled jobs keep theirs until the TTL
+            self._running.pop(job.id, None)
+            metrics.inc("jobs_total", kind=job.kind, state=job.state)
+            print(f"任务 {job.id} 结束: {job.state}，耗时 {job.finished_at - job.started_at:.1f} 秒")
+            self._dispatch()
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return False
+        if job.state == QUEUED:
+            job.state = CANCELLED
+            job.finished_at = time.time()
+            metrics.inc("jobs_total", kind=job.kind, state=CANCELLED)
+            self._update_gauges()
+        else:
+            job.task.cancel()
+        return True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self.jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        if job.state != QUEUED:
+            return None
+        return sum(1 for key, other in self._queue if other.state == QUEUED and key < job.sort_key)
+
+    def _prune(self) -> None:
+        if self.result_ttl <= 0:
+            return
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("jobs_running", len(self._running))
+        metrics.set_gauge("jobs_queued", sum(1 for job in self.jobs.values() if job.state == QUEUED))
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        states: Dict[str, int] = {}
+        for job in self.jobs.values():
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "max_running": self.max_running,
+            "max_heavy": self.max_heavy,
+            "result_ttl": self.result_ttl,
+            "running_heavy": sum(1 for job in self._running.values() if job.heavy),
+            "jobs": states,
+        }
+
+    async def close(self) -> None:
+        for job in list(self.jobs.values()):
+            if job.state == QUEUED:
+                self.cancel(job.id)
+        tasks = [job.task for job in self._running.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,54 @@
+# Bookkeeping for the heavy OCR/ASR dependencies, which are imported on first use rather than at startup:
+# which of them are resident, what importing them cost, and how long the server took to come up.
+import importlib
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+HEAVY_MODULES = ("torch", "whisper", "faster_whisper", "ctranslate2", "numpy", "PIL", "pytesseract", "requests", "moviepy")
+MEDIA_MODULES = ("numpy", "PIL.Image", "pytesseract") # what OCR and audio decoding need
+ASR_MODULES = {"whisper": ("torch", "whisper"), "faster-whisper": ("faster_whisper",)}
+
+_import_seconds: Dict[str, float] = {}
+_startup: Dict[str, Any] = {}
+
+
+def resident_heavy_modules() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def timed_import(names: Iterable[str]) -> Dict[str, Optional[float]]:
+    """Imports each module and returns the seconds it took (0 if already loaded, None if unavailable)."""
+    timings: Dict[str, Optional[float]] = {}
+    for name in names:
+        if name in sys.modules:
+            timings[name] = 0.0
+            continue
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"预热导入 {name} 失败: {e}")
+            timings[name] = None
+            continue
+        timings[name] = _import_seconds[name] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def record_startup(started: float, **stages: float) -> Dict[str, Any]:
+    # `started` is a time.perf_counter() taken as early as possible in the server module.
+    _startup.update({
+        "startup_seconds": round(time.perf_counter() - started, 3),
+        **{f"{stage}_seconds": round(seconds, 3) for stage, seconds in stages.items()},
+        "heavy_modules_at_startup": resident_heavy_modules(),
+    })
+    return dict(_startup)
+
+
+def report() -> Dict[str, Any]:
+    return {**_startup, "heavy_modules_now": resident_heavy_modules(), "warm_up_imports": dict(_import_seconds)}
+
+
+def record_warm_up(seconds: float, workers: List[Dict[str, Any]]) -> None:
+    _startup["warm_up_seconds"] = round(seconds, 3)
+    _startup["worker_warm_up"] = workers
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+# The MCP app: tools, the shared BrowserHandler and the request/job queues, all built on import.
+# Only server.run() imports it, so processes that merely load server.py stay light (see there).
+import time
+_import_started = time.perf_counter() # startup report: everything below counts as server startup
+
+import asyncio
+from pathlib import Path
+import sys
+from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, HttpUrl
+
+# Ensure src directory is in Python path
+# current_dir = Path(__file__).parent
+# sys.path.append(str(current_dir / 'src'))
+
+from mcp.server.fastmcp import FastMCP, Context
+# from fastmcp import ToolContext
+from pydantic import BaseModel, Field, HttpUrl
+
+from browser_handler import BrowserHandler
+import asr_backends
+import lazy_imports
+from metrics import metrics
+from page_waits import parse_deadlines
+from profile_pool import parse_profiles
+from job_queue import JobScheduler, DONE
+from request_gate import RequestGate
+# from models import SearchNoteParams, LoginParams # Removed GetNoteContentParams
+
+import os
+import json
+from contextlib import asynccontextmanager
+
+
+
+# stdio (default): one client per server process. streamable-http / sse: one long-running process
+# shared by many clients over the network, with one warm browser, worker pool and set of models.
+transport = os.getenv("REDNOTE_TRANSPORT", "stdio")
+
+
+@asynccontextmanager
+async def handler_lifespan():
+    # Browser pool stays warm for the whole server run and is shut down cleanly on exit.
+    # REDNOTE_ASR_PRELOAD=tiny,base starts the media workers in the background and loads those models into them.
+    warm_up_task = asyncio.create_task(warm_up()) if warmup_mode != "none" or asr_preload else None
+    try:
+        yield
+    finally:
+        if warm_up_task and not warm_up_task.done():
+            warm_up_task.cancel()
+        await job_scheduler.close()
+        await browser_handler.close()
+
+
+async def warm_up():
+    # Off the startup path: the server answers immediately while the media stack loads in the background.
+    started = time.perf_counter()
+    imports = await browser_handler.media.run_io(lazy_imports.timed_import, lazy_imports.MEDIA_MODULES)
+    workers = await browser_handler.media.warm_up() if warmup_mode == "workers" or asr_preload else []
+    lazy_imports.record_warm_up(time.perf_counter() - started, workers)
+    print(f"预热完成: 耗时 {time.perf_counter() - started:.2f} 秒, 主进程导入 {imports}, 预热 {len(workers)} 个媒体工作进程")
+
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    # FastMCP enters this once per client session. Over stdio that is the whole process; over HTTP
+    # every session would close the shared browser on disconnect, so there the web app owns it (see serve()).
+    if transport != "stdio":
+        yield
+        return
+    async with handler_lifespan():
+        yield
+
+
+# 初始化mcp服务
+mcp = FastMCP("hello-mcp-server", lifespan=server_lifespan)
+
+user_data_dir_to_use = os.getenv("DEFAULT_USER_DATA_DIR") 
+if user_data_dir_to_use is None:
+    user_data_dir_to_use = "C:\\Users\\myles\\AppData\\Local\\Google\\Chrome\\User Data\\Default"
+
+asr_preload = [name.strip() for name in os.getenv("REDNOTE_ASR_PRELOAD", "").split(",") if name.strip()]
+# OCR/ASR libraries (torch, whisper, pytesseract, Pillow, numpy) are imported on first use, so a server that
+# never OCRs or transcribes never loads them. REDNOTE_WARMUP=imports loads them in the background right
+# after startup; =workers also starts the media worker processes and imports the ASR engine there.
+warmup_mode = os.getenv("REDNOTE_WARMUP", "none").strip().lower() or "none"
+_handler_started = time.perf_counter()
+
+browser_handler = BrowserHandler(
+    user_data_dir=user_data_dir_to_use,
+    max_pages=int(os.getenv("REDNOTE_MAX_PAGES", "5")), # result-list tab + detail tabs
+    idle_timeout=float(os.getenv("REDNOTE_BROWSER_IDLE_TIMEOUT", "600")),
+    media_workers=int(os.getenv("REDNOTE_MEDIA_WORKERS", "0")) or None,
+    io_workers=int(os.getenv("REDNOTE_IO_WORKERS", "8")),
+    preload_asr_models=asr_preload,
+    note_cache_ttl=float(os.getenv("REDNOTE_NOTE_CACHE_TTL", str(24 * 3600))), # 0 disables the note cache
+    note_cache_max_mb=float(os.getenv("REDNOTE_NOTE_CACHE_MAX_MB", "100")),
+    note_cache_file=os.getenv("REDNOTE_NOTE_CACHE_FILE") or None, # default: <user cache dir>/rednote_mcp/notes.sqlite3
+    search_cache_size=int(os.getenv("REDNOTE_SEARCH_CACHE_SIZE", "256")),
+    search_cache_ttl=float(os.getenv("REDNOTE_SEARCH_CACHE_TTL", "300")), # 0 disables the search cache
+    search_cache_stale=float(os.getenv("REDNOTE_SEARCH_CACHE_STALE", "1800")), # 0 disables stale-while-revalidate
+    search_cache_file=os.getenv("REDNOTE_SEARCH_CACHE_FILE") or None, # optional on-disk copy of the search cache
+    extraction_mode=os.getenv("REDNOTE_EXTRACTION_MODE", "state"), # "state" or "dom"
+    block_resources=os.getenv("REDNOTE_BLOCK_RESOURCES", "1") != "0",
+    browser_channel=os.getenv("REDNOTE_BROWSER_CHANNEL", "chrome") or None, # empty: Playwright's bundled Chromium
+    navigation_rate=float(os.getenv("REDNOTE_NAV_RATE", "0")), # page navigations per second across all calls, 0 = unlimited
+    navigation_burst=int(os.getenv("REDNOTE_NAV_BURST", "1")),
+    asr_streaming=os.getenv("REDNOTE_ASR_STREAMING", "1") != "0", # 0: download the whole video before ASR
+    asr_max_seconds=float(os.getenv("REDNOTE_ASR_MAX_SECONDS", "0")) or None, # transcribe at most this much audio per video
+    asr_backend=os.getenv("REDNOTE_ASR_BACKEND") or None, # whisper (default) or faster-whisper (int8, optional install)
+    asr_language=os.getenv("REDNOTE_ASR_LANGUAGE", "zh"),
+    asr_batch_size=int(os.getenv("REDNOTE_ASR_BATCH_SIZE", "1")), # >1 batches 30 s segments across videos
+    asr_batch_wait=float(os.getenv("REDNOTE_ASR_BATCH_WAIT", "0.5")),
+    ocr_max_side=int(os.getenv("REDNOTE_OCR_MAX_SIDE", "1600")), # images are downscaled to this longest side before OCR, 0 = never
+    ocr_binarize=os.getenv("REDNOTE_OCR_BINARIZE", "1") != "0",
+    ocr_hash_distance=int(os.getenv("REDNOTE_OCR_HASH_DISTANCE", "4")), # dHash bits two images may differ by and share OCR text
+    ocr_cache_size=int(os.getenv("REDNOTE_OCR_CACHE_SIZE", "4096")), # 0 disables the perceptual-hash cache
+    session_recheck_interval=float(os.getenv("REDNOTE_SESSION_RECHECK", str(12 * 3600))), # re-verify login at least this often
+    session_invalid_ttl=float(os.getenv("REDNOTE_SESSION_INVALID_TTL", "1800")), # searches fail fast this long after a logged-out check
+    # Several logged-in accounts to spread navigations over: JSON list (or file) of user-data dirs / {"user_data_dir", ...}.
+    # Unset: the single DEFAULT_USER_DATA_DIR account.
+    profiles=parse_profiles(os.getenv("REDNOTE_PROFILES", "")),
+    profile_rate=float(os.getenv("REDNOTE_PROFILE_RATE", "0")), # navigations per second per account, 0 = unlimited
+    profile_burst=int(os.getenv("REDNOTE_PROFILE_BURST", "1")),
+    profile_budget=int(os.getenv("REDNOTE_PROFILE_BUDGET", "0")), # navigations per account per budget window, 0 = unlimited
+    profile_budget_window=float(os.getenv("REDNOTE_PROFILE_BUDGET_WINDOW", "3600")),
+    profile_cooldown=float(os.getenv("REDNOTE_PROFILE_COOLDOWN", "60")), # pause of the last account after a captcha
+    profile_evict_seconds=float(os.getenv("REDNOTE_PROFILE_EVICT_SECONDS", "1800")), # out of rotation after a block
+    adaptive_concurrency=os.getenv("REDNOTE_ADAPTIVE", "1") != "0", # 0: fixed concurrency, no pacing from the controller
+    adaptive_max_concurrency=int(os.getenv("REDNOTE_ADAPTIVE_MAX_CONCURRENCY", "0")) or None, # 0: every tab of every account
+    adaptive_initial=int(os.getenv("REDNOTE_ADAPTIVE_INITIAL", "2")), # concurrent navigations to start from
+    adaptive_max_interval=float(os.getenv("REDNOTE_ADAPTIVE_MAX_INTERVAL", "10")), # longest spacing of navigation starts
+    adaptive_target_latency=float(os.getenv("REDNOTE_ADAPTIVE_TARGET_LATENCY", "10")), # slower navigations count as overload
+    nav_retries=int(os.getenv("REDNOTE_NAV_RETRIES", "2")),
+    retry_backoff=float(os.getenv("REDNOTE_RETRY_BACKOFF", "1")), # seconds; doubled per attempt, fully jittered
+    wait_deadlines=parse_deadlines(os.getenv("REDNOTE_WAIT_DEADLINES", "")), # e.g. "manual_login=120,result_list=20"
+)
+
+startup = lazy_imports.record_startup(_import_started, imports=_handler_started - _import_started,
+                                      handler=time.perf_counter() - _handler_started)
+print(f"服务初始化耗时 {startup['startup_seconds']:.2f} 秒, 已加载的重型依赖: {startup['heavy_modules_at_startup'] or '无'}")
+
+# Searches from all clients share the handler; beyond these limits calls are queued, then rejected.
+request_gate = RequestGate(
+    max_concurrent=int(os.getenv("REDNOTE_MAX_CONCURRENT_REQUESTS", "4")),
+    max_queued=int(os.getenv("REDNOTE_MAX_QUEUED_REQUESTS", "16")),
+    queue_timeout=float(os.getenv("REDNOTE_QUEUE_TIMEOUT", "120")), # 0 waits for a slot indefinitely
+)
+# Jobs from submit_search run detached from the client's tool call. Video ASR jobs are "heavy": they may use
+# at most REDNOTE_JOB_MAX_HEAVY of the running slots, so text/OCR jobs never queue behind a row of them.
+job_scheduler = JobScheduler(
+    max_running=int(os.getenv("REDNOTE_JOB_MAX_RUNNING", "3")),
+    max_heavy=int(os.getenv("REDNOTE_JOB_MAX_HEAVY", "1")),
+    result_ttl=float(os.getenv("REDNOTE_JOB_RESULT_TTL", "3600")), # seconds finished jobs and their results are kept
+)
+# Clients asking for different headless modes would make the shared browser relaunch between calls.
+forced_headless = {"1": True, "0": False}.get(os.getenv("REDNOTE_HEADLESS", ""))
+
+
+@mcp.tool(
+    name="search_note",
+    description="Search for notes on Xiaohongshu based on keywords."
+)
+async def search_note_tool(keywords: str = Field(description="keywords"), 
+                           limit: int = Field(default=10, description="number of results in return"), 
+                           headless: bool = Field(default=False, description="whether to run browser in headless mode, False: use GUI browser, True: not use GUI browser"), 
+                           image_ocr: bool = Field(default=False, description="read image by ocr"),
+                           video_asr: bool = Field(default=False, description="video to text by asr"),
+                           concurrency: int = Field(default=4, description="number of note detail pages fetched in parallel (capped by the browser pool size)"),
+                           note_timeout: float = Field(default=90.0, description="seconds allowed for loading and reading one note detail page"),
+                           asr_model: Optional[str] = Field(default=None, description="whisper model size for video asr: tiny, base, small, medium, large (default: server setting)"),
+                           scroll_budget: float = Field(default=30.0, description="seconds allowed for scrolling the result feed to collect `limit` notes"),
+                           stream_partial: bool = Field(default=False, description="also send every finished note as a log notification while the search is still running"),
+                           ctx: Context = None)-> Dict[str, Any]:
+    """Searches for notes based on keywords."""
+    if forced_headless is not None:
+        headless = forced_headless
+    async with request_gate.slot("search_note") as queued_seconds:
+        if ctx is not None and queued_seconds >= 1:
+            await ctx.info(f"queued for {queued_seconds:.1f} seconds behind other requests")
+        # Notes arrive in completion order; progress is reported per note and the final
+        # {"results": [...]} keeps the result-list order, same as before.
+        finished = []
+        completed = 0
+        async for event in browser_handler.search_notes_stream(
+            keywords=keywords,
+            limit=limit,
+            headless=headless,
+            image_ocr=image_ocr,
+            video_asr=video_asr,
+            concurrency=concurrency,
+            note_timeout=note_timeout,
+            asr_model=asr_model,
+            scroll_budget=scroll_budget
+        ):
+            completed += 1
+            if event["note"] is not None:
+                finished.append((event["index"], event["note"]))
+            if ctx is not None:
+                title = event["note"]["title"] if event["note"] else f"failed: {event['error']}"
+                await ctx.report_progress(completed, event["total"], message=title)
+                if stream_partial and event["note"] is not None:
+                    await ctx.info(json.dumps({"index": event["index"], "total": event["total"], "note": event["note"]}, ensure_ascii=False))
+        results = [note for _, note in sorted(finished, key=lambda item: item[0])]
+        # The browser stays warm in browser_handler.pool between calls; it is closed by the server/app lifespan.
+        return {"results": results}
+
+
+@mcp.tool(
+    name="search_note_batch",
+    description="Search Xiaohongshu for several keywords at once. Notes listed under more than one keyword are fetched only once; results are grouped per keyword."
+)
+async def search_note_batch_tool(keywords_list: List[str] = Field(description="list of keywords, one search each"),
+                                 limit: int = Field(default=10, description="number of results per keyword"),
+                                 headless: bool = Field(default=False, description="whether to run browser in headless mode, False: use GUI browser, True: not use GUI browser"),
+                                 image_ocr: bool = Field(default=False, description="read image by ocr"),
+                                 video_asr: bool = Field(default=False, description="video to text by asr"),
+                                 concurrency: int = Field(default=4, description="note detail pages fetched in parallel across all keywords"),
+                                 keyword_concurrency: int = Field(default=2, description="result lists searched and scrolled in parallel"),
+                                 note_timeout: float = Field(default=90.0, description="seconds allowed for loading and reading one note detail page"),
+                                 asr_model: Optional[str] = Field(default=None, description="whisper model size for video asr: tiny, base, small, medium, large (default: server setting)"),
+                                 scroll_budget: float = Field(default=30.0, description="seconds allowed for scrolling each result feed"),
+                                 ctx: Context = None) -> Dict[str, Any]:
+    """Searches for notes for every keyword in the list, sharing tabs and note fetches."""
+    if forced_headless is not None:
+        headless = forced_headless
+
+    async def report(result: Dict[str, Any], finished: int, total: int) -> None:
+        if ctx is not None:
+            await ctx.report_progress(finished, total, message=f"{result['keywords']}: {len(result['notes'])} notes")
+
+    async with request_gate.slot("search_note_batch"):
+        return await browser_handler.search_notes_batch(
+            keywords_list,
+            limit=limit,
+            headless=headless,
+            image_ocr=image_ocr,
+            video_asr=video_asr,
+            concurrency=concurrency,
+            keyword_concurrency=keyword_concurrency,
+            note_timeout=note_timeout,
+            asr_model=asr_model,
+            scroll_budget=scroll_budget,
+            on_keyword=report,
+        )
+
+
+@mcp.tool(
+    name="submit_search",
+    description="Start a search_note run as a background job and return its job_id right away. Use it for searches with OCR/ASR that may outlast the tool-call timeout; poll get_job_status and fetch get_job_result."
+)
+async def submit_search_tool(keywords: str = Field(description="keywords"),
+                             limit: int = Field(default=10, description="number of results in return"),
+                             headless: bool = Field(default=True, description="whether to run browser in headless mode, False: use GUI browser, True: not use GUI browser"),
+                             image_ocr: bool = Field(default=False, description="read image by ocr"),
+                             video_asr: bool = Field(default=False, description="video to text by asr (makes this a heavy job)"),
+                             concurrency: int = Field(default=4, description="number of note detail pages fetched in parallel (capped by the browser pool size)"),
+                             note_timeout: float = Field(default=90.0, description="seconds allowed for loading and reading one note detail page"),
+                             asr_model: Optional[str] = Field(default=None, description="whisper model size for video asr: tiny, base, small, medium, large (default: server setting)"),
+                             scroll_budget: float = Field(default=30.0, description="seconds allowed for scrolling the result feed to collect `limit` notes"),
+                             priority: int = Field(default=0, description="jobs with a higher priority start first")) -> Dict[str, Any]:
+    """Queues a search job and returns its id."""
+    if forced_headless is not None:
+        headless = forced_headless
+    params = {"keywords": keywords, "limit": limit, "image_ocr": image_ocr, "video_asr": video_asr, "asr_model": asr_model}
+
+    async def run_search(job):
+        errors = []
+        async for event in browser_handler.search_notes_stream(
+            keywords=keywords,
+            limit=limit,
+            headless=headless,
+            image_ocr=image_ocr,
+            video_asr=video_asr,
+            concurrency=concurrency,
+            note_timeout=note_timeout,
+            asr_model=asr_model,
+            scroll_budget=scroll_budget
+        ):
+            job.progress["completed"] += 1
+            job.progress["total"] = event["total"]
+            if event["note"] is not None:
+                job.partial.append((event["index"], event["note"]))
+            else:
+                errors.append({"index": event["index"], "error": event["error"]})
+        return {"results": [note for _, note in sorted(job.partial, key=lambda item: item[0])], "errors": errors}
+
+    job = job_scheduler.submit("search_note", params, run_search, priority=priority, heavy=video_asr)
+    return {**job.status(), "queue_position": job_scheduler.queue_position(job)}
+
+
+def _get_job(job_id: str):
+    job = job_scheduler.get(job_id)
+    if job is None:
+        raise ValueError(f"任务 {job_id} 不存在或结果已过期")
+    return job
+
+
+@mcp.tool(
+    name="get_job_status",
+    description="State (queued, running, done, failed, cancelled), progress and queue position of a submitted job."
+)
+async def get_job_status_tool(job_id: str = Field(description="job_id returned by submit_search")) -> Dict[str, Any]:
+    """Reports the state and progress of a job."""
+    job = _get_job(job_id)
+    return {**job.status(), "queue_position": job_scheduler.queue_position(job)}
+
+
+@mcp.tool(
+    name="get_job_result",
+    description="Result of a submitted job: {\"results\": [...], \"errors\": [...]} once it is done; while it is running, or after it failed or was cancelled, the notes finished so far."
+)
+async def get_job_result_tool(job_id: str = Field(description="job_id returned by submit_search")) -> Dict[str, Any]:
+    """Returns the notes of a job, complete or partial."""
+    job = _get_job(job_id)
+    if job.state == DONE:
+        return {"job_id": job.id, "state": job.state, **job.result}
+    return {"job_id": job.id, "state": job.state, "error": job.error, "progress": dict(job.progress),
+            "partial_results": [note for _, note in sorted(job.partial, key=lambda item: item[0])]}
+
+
+@mcp.tool(
+    name="cancel_job",
+    description="Cancel a queued or running job. Notes it already fetched stay in the note cache."
+)
+async def cancel_job_tool(job_id: str = Field(description="job_id returned by submit_search")) -> Dict[str, Any]:
+    """Cancels a job."""
+    job = _get_job(job_id)
+    cancelled = job_scheduler.cancel(job_id)
+    if cancelled and job.task is not None:
+        await asyncio.wait({job.task}, timeout=5) # let a running search unwind and hand its tabs back
+    return {"job_id": job.id, "cancelled": cancelled, "state": job.state}
+
+
+@mcp.tool(
+    name="get_asr_models",
+    description="Show the ASR engine and which models are resident, with their load time and memory use."
+)
+async def get_asr_models_tool() -> Dict[str, Any]:
+    """Reports the ASR engine and resident models of one media worker process."""
+    stats = await browser_handler.media.run_cpu(asr_backends.backend_stats)
+    if browser_handler.asr_batcher is not None:
+        stats["batcher"] = browser_handler.asr_batcher.stats()
+    return stats
+
+
+@mcp.tool(
+    name="get_metrics",
+    description="Per-stage timings (browser launch, login check, navigation, extraction, downloads, OCR/ASR) plus cache, blocking and browser pool counters."
+)
+async def get_metrics_tool(format: str = Field(default="json", description="json, or prometheus for the text exposition format"),
+                           recent: int = Field(default=20, description="number of most recent spans included in the json output")) -> Any:
+    """Reports the pipeline metrics collected since the server started."""
+    profile_stats = browser_handler.profiles.stats() # also refreshes the pool gauges
+    if format == "prometheus":
+        return metrics.prometheus_text()
+    return {
+        **metrics.snapshot(recent=recent),
+        "browser_pool": profile_stats["profiles"][0]["browser"],
+        "profiles": profile_stats,
+        "adaptive": browser_handler.adaptive.stats(),
+        "requests": request_gate.stats(),
+        "jobs": job_scheduler.stats(),
+        "request_blocking": browser_handler.request_blocker.stats(),
+        "startup": lazy_imports.report(),
+        "session": browser_handler.session.stats(),
+        "ocr": browser_handler.ocr.stats(),
+        "note_cache": browser_handler.note_cache.stats(),
+        "search_cache": browser_handler.search_cache.stats(),
+    }
+
+
+def serve():
+    if transport == "stdio":
+        # server_lifespan closes the browser pool when the transport shuts down.
+        mcp.run(transport="stdio")
+        return
+    if transport == "streamable-http":
+        app = mcp.streamable_http_app() # endpoint: /mcp
+    elif transport == "sse":
+        app = mcp.sse_app() # endpoints: /sse and /messages/
+    else:
+        raise ValueError(f"未知的 REDNOTE_TRANSPORT: {transport}，可选: stdio, streamable-http, sse")
+    import uvicorn # only the network transports need it
+
+    # The handler lives as long as the web app, not a client session: it is warmed up once at startup
+    # and closed at shutdown, around the app's own lifespan (the streamable HTTP session manager).
+    session_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def app_lifespan(app):
+        async with handler_lifespan(), session_lifespan(app):
+            yield
+
+    app.router.lifespan_context = app_lifespan
+    host = os.getenv("REDNOTE_HOST", "127.0.0.1")
+    port = int(os.getenv("REDNOTE_PORT", "8000"))
+    print(f"MCP 服务以 {transport} 模式监听 http://{host}:{port}")
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        # Open connections beyond this get HTTP 503 before reaching the request queue; 0 = no limit.
+        limit_concurrency=int(os.getenv("REDNOTE_HTTP_MAX_CONNECTIONS", "0")) or None,
+        log_level=os.getenv("REDNOTE_HTTP_LOG_LEVEL", "info"),
+    )
+
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import tempfile
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Referer": "https://www.xiaohongshu.com/",
+}
+
+
+class MediaDownloader:
+    """Shared async HTTP client for note media: keep-alive connections are reused across images,
+    notes and calls, and each CDN host gets its own concurrency cap."""
+
+    def __init__(self, max_connections: int = 32, per_host_limit: int = 6, timeout: float = 10.0,
+                 chunk_size: int = 64 * 1024):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=60.0),
+            )
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return slot
+
+    async def fetch_bytes(self, url: str, timeout: Optional[float] = None) -> bytes:
+        """Downloads a small payload (an image) straight into memory."""
+        async with self._host_slot(url):
+            response = await self._get_client().get(url, timeout=timeout or self.timeout)
+            response.raise_for_status()
+            return response.content
+
+    async def stream_to_tempfile(self, url: str, suffix: str = ".mp4", timeout: Optional[float] = None) -> str:
+        """Streams a large payload (a video) into a unique temp file; the caller removes it when done."""
+        fd, path = tempfile.mkstemp(prefix="rednote_", suffix=suffix)
+        try:
+            # Wrapped right away so the descriptor is closed on every path, including HTTP/connect errors.
+            with os.fdopen(fd, "wb") as f:
+                async with self._host_slot(url):
+                    async with self._get_client().stream("GET", url, timeout=timeout or self.timeout) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(self.chunk_size):
+                            f.write(chunk)
+        except BaseException:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        return path
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import asr_backends
+import media_worker
+from metrics import metrics
+
+
+class MediaExecutor:
+    """Runs OCR/ASR in worker processes and downloads in threads, so the event loop keeps serving
+    other tool calls and browser navigation while media is processed."""
+
+    def __init__(self, cpu_workers: Optional[int] = None, io_workers: int = 8, preload_models: Iterable[str] = (),
+                 asr_backend: Optional[str] = None):
+        self.cpu_workers = cpu_workers or min(2, os.cpu_count() or 1)
+        self.io_workers = io_workers
+        self.preload_models = [name for name in preload_models if name]
+        self.asr_backend = asr_backend
+        self._cpu_pool: Optional[ProcessPoolExecutor] = None
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+
+    def _get_cpu_pool(self) -> Executor:
+        if self._cpu_pool is None:
+            # spawn instead of fork: the parent holds Playwright/asyncio threads that must not be forked.
+            self._cpu_pool = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=asr_backends.preload_models if self.preload_models else None,
+                initargs=(self.preload_models, self.asr_backend) if self.preload_models else (),
+            )
+        return self._cpu_pool
+
+    def _get_io_pool(self) -> Executor:
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="media-io")
+        return self._io_pool
+
+    async def run_cpu(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        pool = self._get_cpu_pool()
+        try:
+            return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+        except BrokenProcessPool as e:
+            # A worker died (OOM-killed while loading a model, a tesseract crash); the pool refuses every later
+            # job, so replace it and run this one again, once.
+            self._drop_cpu_pool(pool, e)
+            return await loop.run_in_executor(self._get_cpu_pool(), partial(fn, *args, **kwargs))
+
+    def _drop_cpu_pool(self, pool: ProcessPoolExecutor, error: BaseException) -> None:
+        if self._cpu_pool is not pool: # a concurrent job already replaced it
+            return
+        print(f"媒体工作进程池已损坏 ({error})，正在重建")
+        metrics.inc("media_pool_restarts_total")
+        self._cpu_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run_io(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_io_pool(), partial(fn, *args, **kwargs))
+
+    async def warm_up(self) -> List[Dict[str, Any]]:
+        # Starts every worker process and imports the media stack there, so neither process start,
+        # imports nor model preloading land on the first real job. Returns the import times per worker.
+        return await asyncio.gather(*(self.run_cpu(media_worker.warm_up, self.asr_backend) for _ in range(self.cpu_workers)))
+
+    def shutdown(self) -> None:
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self._cpu_pool = None
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=False, cancel_futures=True)
+            self._io_pool = None
@@ -0,0 +1,94 @@
+# Functions executed inside MediaExecutor pools. They must stay module-level so the
+# process pool can pickle them by reference.
+# numpy, Pillow and pytesseract are imported inside the functions: the server process imports this
+# module only to reference the functions, and should not pay for the media stack until it is used.
+import os
+import time
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import asr_backends
+import audio_stream
+import lazy_imports
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def image_fingerprint(data: bytes) -> Dict[str, Any]:
+    # Cheap enough for the I/O threads: decode + 17x16 thumbnail + pixel statistics.
+    from PIL import Image
+    import image_prep
+
+    with Image.open(BytesIO(data)) as image:
+        return image_prep.fingerprint(image)
+
+
+def ocr_image_bytes(data: bytes, lang: str = "chi_sim+eng", max_side: Optional[int] = None, binarize: bool = False) -> str:
+    # Decoded straight from memory, no temp file per image.
+    import pytesseract
+    from PIL import Image
+    import image_prep
+
+    with Image.open(BytesIO(data)) as image:
+        if max_side or binarize:
+            image = image_prep.preprocess(image, max_side=max_side or 0, binarize=binarize)
+        # Parallelism comes from the worker pool, so each tesseract run stays on one core.
+        # Only tesseract's environment is touched; torch in this process has read its settings already.
+        previous = os.environ.get("OMP_THREAD_LIMIT")
+        os.environ["OMP_THREAD_LIMIT"] = "1"
+        try:
+            return pytesseract.image_to_string(image, lang=lang)
+        finally:
+            if previous is None:
+                os.environ.pop("OMP_THREAD_LIMIT", None)
+            else:
+                os.environ["OMP_THREAD_LIMIT"] = previous
+
+
+def _job_result(texts: List[str], audio_seconds: float, started: float) -> Dict[str, Any]:
+    seconds = time.perf_counter() - started
+    return {"text": "".join(texts), "audio_seconds": round(audio_seconds, 2), "seconds": round(seconds, 3),
+            "chunks": len(texts), "rtf": round(seconds / audio_seconds, 3) if audio_seconds else None}
+
+
+def transcribe_file(path: str, model_name: Optional[str] = None, language: str = "zh", max_seconds: Optional[float] = None,
+                    backend: Optional[str] = None) -> Dict[str, Any]:
+    # The model stays resident in this worker process after the first call.
+    import numpy as np
+
+    engine = asr_backends.get_backend(backend)
+    engine.load(model_name)
+    started = time.perf_counter()
+    chunks = list(audio_stream.stream_pcm_chunks(path, max_seconds=max_seconds))
+    audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+    text = engine.transcribe(audio, model_name, language=language) if len(audio) else ""
+    return _job_result([text], len(audio) / audio_stream.SAMPLE_RATE, started)
+
+
+def transcribe_url(url: str, model_name: Optional[str] = None, language: str = "zh", max_seconds: Optional[float] = None,
+                   headers: Optional[Dict[str, str]] = None, backend: Optional[str] = None) -> Dict[str, Any]:
+    # Audio track only, streamed through ffmpeg and transcribed one 30 s window at a time.
+    engine = asr_backends.get_backend(backend)
+    engine.load(model_name)
+    started = time.perf_counter()
+    texts = []
+    audio_seconds = 0.0
+    for chunk in audio_stream.stream_pcm_chunks(url, headers=headers, max_seconds=max_seconds):
+        audio_seconds += len(chunk) / audio_stream.SAMPLE_RATE
+        # The end of the previous window is the prompt, so sentences cut at a chunk border stay coherent.
+        prompt = texts[-1][-200:] if texts else None
+        texts.append(engine.transcribe(chunk, model_name, language=language, initial_prompt=prompt))
+    return _job_result(texts, audio_seconds, started)
+
+
+def transcribe_segments(segments: List["np.ndarray"], model_name: Optional[str] = None, language: str = "zh",
+                        backend: Optional[str] = None) -> List[str]:
+    # Segments from several videos (see ASRBatcher) decoded as one batch.
+    return asr_backends.get_backend(backend).transcribe_batch(segments, model_name, language=language)
+
+
+def warm_up(backend: Optional[str] = None) -> Dict[str, Any]:
+    # Imports the media stack and the ASR engine library ahead of the first job (REDNOTE_WARMUP).
+    modules = lazy_imports.MEDIA_MODULES + lazy_imports.ASR_MODULES.get(backend or asr_backends.DEFAULT_ASR_BACKEND, ())
+    return {"pid": os.getpid(), "imports": lazy_imports.timed_import(modules)}
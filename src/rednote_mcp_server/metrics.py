@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the duration histogram buckets; +Inf is implicit.
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Span:
+    """One timed stage of the scrape pipeline. Set `outcome` or call add_bytes() while it is open."""
+
+    def __init__(self, stage: str, attrs: Dict[str, Any]):
+        self.stage = stage
+        self.attrs = attrs
+        self.outcome = "ok"
+        self.bytes = 0
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+
+    def add_bytes(self, count: int) -> None:
+        self.bytes += count
+
+
+class _StageStats:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.outcomes: Dict[str, int] = {}
+
+    def observe(self, span: Span) -> None:
+        index = next((i for i, bound in enumerate(DURATION_BUCKETS) if span.duration <= bound), len(DURATION_BUCKETS))
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.total_seconds += span.duration
+        self.max_seconds = max(self.max_seconds, span.duration)
+        self.bytes += span.bytes
+        self.outcomes[span.outcome] = self.outcomes.get(span.outcome, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bucket bound containing the q-th observation; coarse but cheap.
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return DURATION_BUCKETS[i] if i < len(DURATION_BUCKETS) else self.max_seconds
+        return self.max_seconds
+
+
+class MetricsRegistry:
+    def __init__(self, recent_spans: int = 200):
+        self._stages: Dict[str, _StageStats] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=recent_spans)
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        span = Span(stage, attrs)
+        try:
+            yield span
+        except (asyncio.TimeoutError, TimeoutError):
+            span.outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            span.outcome = "cancelled"
+            raise
+        except Exception:
+            span.outcome = "error"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span._start
+            self.observe(span)
+
+    def reset(self, recent_spans: Optional[int] = None) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self._gauges.clear()
+            self._recent = deque(maxlen=recent_spans or self._recent.maxlen)
+            self.started_at = time.time()
+
+    def record(self, stage: str, seconds: float, outcome: str = "ok", byte_count: int = 0, **attrs) -> None:
+        """For stages that are awkward to wrap in span(): report an already measured duration."""
+        span = Span(stage, attrs)
+        span.duration = seconds
+        span.outcome = outcome
+        span.bytes = byte_count
+        self.observe(span)
+
+    def observe(self, span: Span) -> None:
+        with self._lock:
+            stats = self._stages.get(span.stage)
+            if stats is None:
+                stats = self._stages[span.stage] = _StageStats()
+            stats.observe(span)
+            self._recent.append({"stage": span.stage, "seconds": round(span.duration, 4), "outcome": span.outcome,
+                                 "bytes": span.bytes, "at": span.started_at, **span.attrs})
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self, recent: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": stats.count,
+                    "total_seconds": round(stats.total_seconds, 3),
+                    "mean_seconds": round(stats.total_seconds / stats.count, 4) if stats.count else None,
+                    "p50_seconds": stats.quantile(0.5),
+                    "p95_seconds": stats.quantile(0.95),
+                    "max_seconds": round(stats.max_seconds, 4),
+                    "bytes": stats.bytes,
+                    "outcomes": dict(stats.outcomes),
+                }
+                for stage, stats in sorted(self._stages.items())
+            }
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self._counters.items())]
+            return {
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "stages": stages,
+                "counters": counters,
+                "gauges": dict(self._gauges),
+                "recent_spans": list(self._recent)[-recent:] if recent else [],
+            }
+
+    def prometheus_text(self, prefix: str = "rednote") -> str:
+        lines: List[str] = []
+        with self._lock:
+            lines.append(f"# TYPE {prefix}_stage_duration_seconds histogram")
+            for stage, stats in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats.count}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {stats.total_seconds:.6f}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {stats.count}')
+            lines.append(f"# TYPE {prefix}_stage_outcomes_total counter")
+            for stage, stats in sorted(self._stages.items()):
+                for outcome, count in sorted(stats.outcomes.items()):
+                    lines.append(f'{prefix}_stage_outcomes_total{{stage="{stage}",outcome="{outcome}"}} {count}')
+            lines.append(f"# TYPE {prefix}_stage_bytes_total counter")
+            for stage, stats in sorted(self._stages.items()):
+                lines.append(f'{prefix}_stage_bytes_total{{stage="{stage}"}} {stats.bytes}')
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}_{name} counter")
+                    typed.add(name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by every module of the server.
+metrics = MetricsRegistry()
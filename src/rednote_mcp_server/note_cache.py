@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from metrics import metrics
+
+
+def default_cache_path() -> Path:
+    # Per-user cache directory, outside the source/installed package tree.
+    base = os.getenv("XDG_CACHE_HOME") or os.getenv("LOCALAPPDATA") or Path.home() / ".cache"
+    return Path(base) / "rednote_mcp" / "notes.sqlite3"
+
+
+def note_id_from_url(note_url: str) -> str:
+    # /search_result/<id>?xsec_token=... and /explore/<id> both end with the note id.
+    return urlsplit(note_url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+class NoteCache:
+    """SQLite store of extracted notes keyed by note id.
+
+    Each row keeps the DOM extraction (title, content, media links, comments) plus the OCR/ASR
+    derivatives computed so far, so a repeat search can skip the detail page and the media work.
+    """
+
+    def __init__(self, db_path: Path, ttl_seconds: float = 24 * 3600, max_bytes: int = 100 * 1024 * 1024):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = ttl_seconds > 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                " note_id TEXT PRIMARY KEY,"
+                " detail TEXT NOT NULL,"
+                " derivatives TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS notes_accessed_at ON notes (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _get(self, note_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT detail, derivatives, updated_at FROM notes WHERE note_id = ?", (note_id,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[2] > self.ttl_seconds:
+                conn.execute("DELETE FROM notes WHERE note_id = ?", (note_id,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE notes SET accessed_at = ? WHERE note_id = ?", (now, note_id))
+            conn.commit()
+            return {"detail": json.loads(row[0]), "derivatives": json.loads(row[1])}
+
+    def _put(self, note_id: str, detail: Dict[str, Any], derivatives: Dict[str, Any]) -> None:
+        detail_json = json.dumps(detail, ensure_ascii=False)
+        derivatives_json = json.dumps(derivatives, ensure_ascii=False)
+        size = len(detail_json.encode("utf-8")) + len(derivatives_json.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO notes (note_id, detail, derivatives, size, updated_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (note_id, detail_json, derivatives_json, size, now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM notes WHERE updated_at < ?", (now - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM notes").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently read notes go first until the store fits again.
+        for note_id, size in conn.execute("SELECT note_id, size FROM notes ORDER BY accessed_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM notes WHERE note_id = ?", (note_id,))
+            total -= size
+
+    async def get(self, note_url: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        try:
+            entry = await asyncio.to_thread(self._get, note_id_from_url(note_url))
+        except Exception as e:
+            print(f"读取笔记缓存失败: {e}")
+            return None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        metrics.inc("note_cache_lookups_total", result="miss" if entry is None else "hit")
+        return entry
+
+    async def put(self, note_url: str, detail: Dict[str, Any], derivatives: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._put, note_id_from_url(note_url), detail, derivatives)
+        except Exception as e:
+            print(f"写入笔记缓存失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "path": str(self.db_path)}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import media_worker
+from media_executor import MediaExecutor
+from metrics import metrics
+
+# image_prep.HASH_SIZE = 16 gives a 256-bit dHash (image_prep itself needs Pillow, so it is not imported here).
+_BANDS = 16 # the 256-bit hash split into 16-bit bands; two hashes within 15 bits share at least one band
+_BAND_BITS = 16
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class OCREngine:
+    """OCR with a perceptual-hash cache in front of the tesseract worker pool.
+
+    Each image is fingerprinted (dHash + blank check) in an I/O thread first. Near-blank images are
+    skipped, images within `hash_distance` bits of one seen before reuse its text, and the rest are
+    downscaled/binarized and recognized in the media worker processes, several at a time.
+    """
+
+    def __init__(self, media: MediaExecutor, lang: str = "chi_sim+eng", max_side: int = 1600, binarize: bool = True,
+                 hash_distance: int = 4, cache_size: int = 4096):
+        self.media = media
+        self.lang = lang
+        self.max_side = max_side
+        self.binarize = binarize
+        self.hash_distance = min(hash_distance, _BANDS - 1)
+        self.cache_size = cache_size
+        self._texts: "OrderedDict[int, str]" = OrderedDict()
+        self._bands: List[Dict[int, set]] = [{} for _ in range(_BANDS)]
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.counts = {"ocr": 0, "cache_hit": 0, "blank": 0, "error": 0}
+        self.ocr_seconds = 0.0
+        self.chars = 0
+
+    def _band_keys(self, value: int):
+        return [(band, (value >> (_BAND_BITS * band)) & ((1 << _BAND_BITS) - 1)) for band in range(_BANDS)]
+
+    def _lookup(self, value: int) -> Optional[Tuple[int, str]]:
+        if value in self._texts:
+            self._texts.move_to_end(value)
+            return value, self._texts[value]
+        candidates = set()
+        for band, key in self._band_keys(value):
+            candidates |= self._bands[band].get(key, set())
+        for candidate in candidates:
+            if _hamming(candidate, value) <= self.hash_distance:
+                self._texts.move_to_end(candidate)
+                return candidate, self._texts[candidate]
+        return None
+
+    def _store(self, value: int, text: str) -> None:
+        if self.cache_size <= 0:
+            return
+        self._texts[value] = text
+        self._texts.move_to_end(value)
+        for band, key in self._band_keys(value):
+            self._bands[band].setdefault(key, set()).add(value)
+        while len(self._texts) > self.cache_size:
+            old, _ = self._texts.popitem(last=False)
+            for band, key in self._band_keys(old):
+                bucket = self._bands[band].get(key)
+                if bucket is not None:
+                    bucket.discard(old)
+                    if not bucket:
+                        del self._bands[band][key]
+
+    async def recognize(self, image_bytes: bytes, source: str = "") -> Optional[str]:
+        """Returns the text of one image, "" for a near-blank image, or None when OCR failed."""
+        started = time.perf_counter()
+        try:
+            info = await self.media.run_io(media_worker.image_fingerprint, image_bytes)
+        except Exception as e:
+            print(f"无法解码图片 {source}: {e}")
+            return self._done("error", started, None, source)
+        if info["blank"]:
+            return self._done("blank", started, "", source)
+
+        value = info["dhash"]
+        cached = self._lookup(value)
+        if cached is not None:
+            return self._done("cache_hit", started, cached[1], source)
+        pending = self._inflight.get(value)
+        if pending is not None: # the same image is being recognized for another note right now
+            try:
+                return self._done("cache_hit", started, await asyncio.shield(pending), source)
+            except Exception:
+                return self._done("error", started, None, source)
+            except asyncio.CancelledError:
+                if pending.cancelled(): # the other call was cancelled, not this one
+                    return self._done("error", started, None, source)
+                raise
+
+        future = self._inflight[value] = asyncio.get_running_loop().create_future()
+        try:
+            text = await self.media.run_cpu(media_worker.ocr_image_bytes, image_bytes, lang=self.lang,
+                                            max_side=self.max_side, binarize=self.binarize)
+            future.set_result(text)
+            self._store(value, text)
+            self.ocr_seconds += time.perf_counter() - started
+            return self._done("ocr", started, text, source, byte_count=len(image_bytes))
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # marks it retrieved; waiters get it through shield()
+            print(f"OCR 失败 {source}: {e}")
+            return self._done("error", started, None, source)
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(value, None)
+
+    def _done(self, result: str, started: float, text: Optional[str], source: str, byte_count: int = 0) -> Optional[str]:
+        seconds = time.perf_counter() - started
+        chars = len(text.strip()) if text else 0
+        self.counts[result] += 1
+        self.chars += chars
+        metrics.record("ocr", seconds, outcome=result, byte_count=byte_count, chars=chars)
+        metrics.inc("ocr_images_total", result=result)
+        metrics.inc("ocr_chars_total", chars)
+        if result != "error":
+            print(f"OCR {result}: {seconds:.2f} 秒, {chars} 字 {source}")
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        recognized = self.counts["ocr"]
+        return {
+            "images": dict(self.counts),
+            "cached_hashes": len(self._texts),
+            "ocr_seconds": round(self.ocr_seconds, 3),
+            "mean_ocr_seconds": round(self.ocr_seconds / recognized, 3) if recognized else None,
+            "chars": self.chars,
+            "chars_per_image": round(self.chars / sum(self.counts.values()), 1) if sum(self.counts.values()) else None,
+        }
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, Optional, Union
+
+from playwright.async_api import Page, Response
+
+from metrics import metrics
+
+# Seconds each named wait may take before the caller carries on without its condition.
+DEFAULT_DEADLINES: Dict[str, float] = {
+    "login_state": 10.0, # explore page shows either the profile entry or the login prompt
+    "manual_login": 60.0, # user scans the QR code / types credentials
+    "search_input": 30.0,
+    "search_submit": 10.0, # result page URL or the search API answer after clicking search
+    "filter_apply": 10.0, # search API answer for the image-only channel
+    "result_list": 30.0,
+    "note_goto": 60.0, # upper bound; the adaptive controller shortens it to a few times the usual latency
+    "note_ready": 15.0, # note body in the DOM (DOM extraction mode or state fallback)
+}
+
+# Site API call worth waiting on, by substring of the request URL.
+SEARCH_API = "/api/sns/web/v1/search/notes"
+
+
+def parse_deadlines(spec: str) -> Dict[str, float]:
+    # "manual_login=120,result_list=20" -> {"manual_login": 120.0, "result_list": 20.0}
+    deadlines = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            deadlines[name.strip()] = float(value)
+    return deadlines
+
+
+class PageWaiter:
+    """Waits until the first of several page events happens instead of sleeping for a fixed time.
+
+    A wait resolves on whichever comes first: a selector attaching, the URL changing/matching, or a
+    response from a given API. Each wait is recorded as a "wait_<name>" span noting what resolved it.
+    """
+
+    def __init__(self, deadlines: Optional[Dict[str, float]] = None):
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        self.deadlines.update(deadlines or {})
+
+    def deadline(self, name: str) -> float:
+        return self.deadlines.get(name, 10.0)
+
+    async def wait_for_any(self, page: Page, name: str, selectors: Iterable[str] = (),
+                           url: Optional[Union[str, Callable[[str], bool]]] = None,
+                           url_changed_from: Optional[str] = None,
+                           response: Optional[str] = None,
+                           timeout: Optional[float] = None) -> Optional[str]:
+        """Returns what resolved the wait ("selector:<css>", "url" or "response"), or None when the deadline passed.
+
+        To catch a response triggered by an action, start the wait as a task before the action and await it after.
+        """
+        timeout = self.deadline(name) if timeout is None else timeout
+        timeout_ms = max(1.0, timeout * 1000)
+        waiters: Dict[asyncio.Task, str] = {}
+        for selector in selectors:
+            waiters[asyncio.create_task(page.wait_for_selector(selector, state="attached", timeout=timeout_ms))] = f"selector:{selector}"
+        if url is not None or url_changed_from is not None:
+            def url_matches(current: str) -> bool:
+                if url_changed_from is not None and current == url_changed_from:
+                    return False
+                if url is None:
+                    return True
+                return url(current) if callable(url) else url in current
+            waiters[asyncio.create_task(page.wait_for_url(url_matches, wait_until="commit", timeout=timeout_ms))] = "url"
+        if response is not None:
+            def response_matches(resp: Response) -> bool:
+                return response in resp.url
+            waiters[asyncio.create_task(page.wait_for_event("response", response_matches, timeout=timeout_ms))] = "response"
+        if not waiters:
+            return None
+
+        started = time.perf_counter()
+        resolved = None
+        pending = set(waiters)
+        try:
+            while pending and resolved is None:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, timeout - (time.perf_counter() - started)),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        resolved = waiters[task]
+                        break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            metrics.record(f"wait_{name}", time.perf_counter() - started, outcome="ok" if resolved else "timeout",
+                           resolved_by=resolved or "deadline")
+        return resolved
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from metrics import metrics
+from rate_limiter import RateLimiter
+from session_manager import SessionManager
+
+if TYPE_CHECKING:
+    from browser_pool import BrowserPool # only for annotations; importing it pulls in Playwright
+
+ACTIVE, EVICTED = "active", "evicted"
+
+
+class ProfilesExhaustedError(RuntimeError):
+    """No account became usable within ProfilePool.max_wait."""
+
+
+def parse_profiles(spec: str) -> List[Dict[str, Any]]:
+    """REDNOTE_PROFILES: a JSON list, or the path of a JSON file holding one.
+
+    Each entry is a user-data dir, or {"user_data_dir", "storage_state", "name", "rate", "burst", "budget"};
+    storage_state defaults to playwright_state.json inside the user-data dir.
+    """
+    spec = spec.strip()
+    if not spec:
+        return []
+    if not spec.startswith("["):
+        with open(spec, "r", encoding="utf-8") as f:
+            spec = f.read()
+    entries = []
+    for index, entry in enumerate(json.loads(spec)):
+        if isinstance(entry, str):
+            entry = {"user_data_dir": entry}
+        entry = dict(entry)
+        entry.setdefault("name", f"profile{index}")
+        entry.setdefault("storage_state", str(Path(entry["user_data_dir"]) / "playwright_state.json"))
+        entries.append(entry)
+    return entries
+
+
+class Profile:
+    """One account: its Chrome profile (browser pool), saved session and request budget."""
+
+    def __init__(self, name: str, user_data_dir, storage_state_file: Path, pool: BrowserPool, session: SessionManager,
+                 rate: float = 0.0, burst: int = 1, budget: int = 0, budget_window: float = 3600.0):
+        self.name = name
+        self.user_data_dir = user_data_dir
+        self.storage_state_file = Path(storage_state_file)
+        self.pool = pool
+        self.session = session
+        self.limiter = RateLimiter(rate, burst=burst) # per-account pacing, on top of the global nav_limiter
+        self.budget = budget # navigations allowed per `budget_window` seconds; 0 = unlimited
+        self.budget_window = budget_window
+        self._recent = deque() # timestamps of navigations inside the current window
+        self.in_use = 0
+        self.state = ACTIVE
+        self.reason: Optional[str] = None # why the account was last evicted or cooled down
+        self.cooldown_until = 0.0
+        self.retry_at = 0.0 # when an evicted account is tried again
+        self.navigations = 0
+        self.blocks = 0
+
+    def budget_left(self, now: float) -> Optional[int]:
+        if self.budget <= 0:
+            return None
+        while self._recent and self._recent[0] <= now - self.budget_window:
+            self._recent.popleft()
+        return self.budget - len(self._recent)
+
+    def available_at(self, now: float) -> float:
+        at = max(now, self.cooldown_until)
+        if self.state == EVICTED:
+            at = max(at, self.retry_at)
+        left = self.budget_left(now)
+        if left is not None and left <= 0:
+            at = max(at, self._recent[0] + self.budget_window)
+        return at
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "reason": self.reason,
+            "in_use": self.in_use,
+            "navigations": self.navigations,
+            "blocks": self.blocks,
+            "budget_left": self.budget_left(now),
+            "available_in_seconds": round(max(0.0, self.available_at(now) - now), 1),
+            "session": self.session.state,
+            "browser": self.pool.stats(),
+        }
+
+
+class ProfilePool:
+    """Spreads page navigations over several accounts, each with its own Chrome profile and session.
+
+    Every navigation goes to the least busy account that is in rotation, has budget left and is not
+    cooling down. An account that hits a login wall or captcha is evicted for `evict_seconds` (then its
+    login is probed again before use), except the last one in rotation: after a captcha it cools down
+    for `cooldown_seconds`, after a login wall it stays in use and gets probed (or logged in) again.
+    When every account is exhausted, callers wait up to `max_wait` seconds for one.
+    """
+
+    def __init__(self, profiles: List[Profile], cooldown_seconds: float = 60.0, evict_seconds: float = 1800.0,
+                 max_wait: float = 30.0):
+        if not profiles:
+            raise ValueError("至少需要配置一个浏览器账号")
+        self.profiles = profiles
+        self.primary = profiles[0] # the profile manual login and the legacy single-page helpers use
+        self.cooldown_seconds = cooldown_seconds
+        self.evict_seconds = evict_seconds
+        self.max_wait = max_wait
+
+    def _usable(self, profile: Profile, now: float) -> bool:
+        if profile.available_at(now) > now:
+            return False
+        if profile.state == EVICTED:
+            profile.state = ACTIVE
+            print(f"账号 {profile.name} 重新加入轮换，使用前将重新检查登录状态。")
+        return True
+
+    async def acquire(self) -> Profile:
+        """Reserves an account for one navigation; pair with release()."""
+        waited = 0.0
+        while True:
+            now = time.time()
+            candidates = [profile for profile in self.profiles if self._usable(profile, now)]
+            if candidates:
+                profile = min(candidates, key=lambda p: (p.in_use / p.pool.max_pages, -(p.budget_left(now) or 0)))
+                profile.in_use += 1
+                if profile.budget > 0:
+                    profile._recent.append(now)
+                profile.navigations += 1
+                metrics.inc("profile_navigations_total", profile=profile.name)
+                if waited:
+                    metrics.record("profile_wait", waited)
+                try:
+                    await profile.limiter.wait()
+                except BaseException:
+                    profile.in_use -= 1
+                    raise
+                return profile
+            delay = min(profile.available_at(now) for profile in self.profiles) - now
+            if waited + delay > self.max_wait:
+                metrics.inc("profile_exhausted_total")
+                raise ProfilesExhaustedError(f"所有账号都在冷却或额度已用完，约 {delay:.0f} 秒后恢复，请稍后重试")
+            print(f"所有账号暂不可用，等待 {delay:.1f} 秒")
+            await asyncio.sleep(max(0.05, delay))
+            waited += max(0.05, delay)
+
+    def release(self, profile: Profile) -> None:
+        profile.in_use -= 1
+
+    def others_in_rotation(self, profile: Profile) -> bool:
+        return any(other is not profile and other.state == ACTIVE for other in self.profiles)
+
+    def report_block(self, profile: Profile, reason: str) -> None:
+        """A request of `profile` ran into a login wall ("login") or a captcha ("captcha")."""
+        now = time.time()
+        profile.blocks += 1
+        profile.reason = reason
+        profile.session.mark_invalid(reason)
+        metrics.inc("profile_blocks_total", profile=profile.name, reason=reason)
+        if profile.state == EVICTED:
+            return
+        if self.others_in_rotation(profile):
+            profile.state = EVICTED
+            profile.retry_at = now + self.evict_seconds
+            metrics.inc("profile_evictions_total", profile=profile.name, reason=reason)
+            print(f"账号 {profile.name} 遇到{'验证码' if reason == 'captcha' else '登录墙'}，移出轮换 {self.evict_seconds:.0f} 秒。")
+        elif reason == "captcha":
+            profile.cooldown_until = now + self.cooldown_seconds
+            print(f"唯一可用的账号 {profile.name} 遇到验证码，冷却 {self.cooldown_seconds:.0f} 秒。")
+        else:
+            # The last account stays usable: its next request runs the login probe (manual login in a GUI browser).
+            print(f"唯一可用的账号 {profile.name} 登录已失效，下次请求前将重新检查登录。")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        profiles = [profile.stats(now) for profile in self.profiles]
+        # Pool gauges are per process, so they report the totals over all accounts.
+        metrics.set_gauge("browser_busy_pages", sum(p["browser"]["busy_pages"] for p in profiles))
+        metrics.set_gauge("browser_idle_pages", sum(p["browser"]["idle_pages"] for p in profiles))
+        metrics.set_gauge("profiles_in_rotation", sum(1 for p in profiles if p["state"] == ACTIVE))
+        return {"in_rotation": sum(1 for p in profiles if p["state"] == ACTIVE), "profiles": profiles}
+
+    async def close(self) -> None:
+        await asyncio.gather(*(profile.pool.close() for profile in self.profiles), return_exceptions=True)
@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+from metrics import metrics
+
+
+class RateLimiter:
+    """Token bucket shared by every page navigation: at most `rate` per second, bursts up to `burst`.
+
+    A rate of 0 (the default) disables limiting.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            delay = (1 - self._tokens) / self.rate
+            metrics.record("rate_limit_wait", delay)
+            await asyncio.sleep(delay)
+            self._tokens = 0.0
+            self._updated = time.monotonic()
@@ -0,0 +1,147 @@
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from playwright.async_api import CDPSession, Page
+
+from metrics import metrics
+
+# Trackers and telemetry endpoints that never carry note data.
+ANALYTICS_HOSTS = (
+    "apm-fe.xiaohongshu.com",
+    "t2.xiaohongshu.com",
+    "t2-test.xiaohongshu.com",
+    "lng.xiaohongshu.com",
+    "spltest.xiaohongshu.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hm.baidu.com",
+)
+
+# Chrome blocks by URL pattern, not resource type: note images and videos come from dedicated CDN hosts
+# (often without a file extension), everything else is matched by extension.
+def _extensions(*extensions: str) -> Tuple[str, ...]:
+    # The extension ends the path: "x.png" or "x.png?w=..", not ".png" somewhere inside a URL.
+    return tuple(pattern for ext in extensions for pattern in (f"*.{ext}", f"*.{ext}?*"))
+
+
+BLOCK_PATTERNS = {
+    "image": ("*://sns-webpic*.xhscdn.com/*", "*://sns-img*.xhscdn.com/*", "*://ci.xiaohongshu.com/*")
+             + _extensions("jpg", "jpeg", "png", "webp", "gif", "avif"),
+    "media": ("*://sns-video*.xhscdn.com/*",) + _extensions("mp4", "m3u8", "m4s", "mov"),
+    "font": _extensions("woff", "woff2", "ttf", "otf"),
+    "analytics": tuple(f"*://*{host}/*" for host in ANALYTICS_HOSTS),
+}
+# Resource types Chrome reports for a blocked request, by blocking category.
+RESOURCE_TYPES = {"Image": "image", "Media": "media", "Font": "font"}
+
+
+class BlockingPolicy:
+    def __init__(self, block_images: bool = True, block_media: bool = True, block_fonts: bool = True,
+                 block_analytics: bool = True):
+        self.block_images = block_images
+        self.block_media = block_media
+        self.block_fonts = block_fonts
+        self.block_analytics = block_analytics
+
+    @classmethod
+    def for_features(cls, image_ocr: bool = False, video_asr: bool = False) -> "BlockingPolicy":
+        # OCR/ASR fetch media through MediaDownloader, but keep the browser's own loads when a
+        # feature may need the player or lazy images to populate the page.
+        return cls(block_images=not image_ocr, block_media=not video_asr)
+
+    def key(self) -> tuple:
+        return (self.block_images, self.block_media, self.block_fonts, self.block_analytics)
+
+    def is_noop(self) -> bool:
+        return not any(self.key())
+
+    def patterns(self) -> List[str]:
+        enabled = {"image": self.block_images, "media": self.block_media, "font": self.block_fonts,
+                   "analytics": self.block_analytics}
+        return [pattern for category, on in enabled.items() if on for pattern in BLOCK_PATTERNS[category]]
+
+
+def blocked_category(url: str, resource_type: Optional[str]) -> str:
+    host = urlsplit(url).hostname or ""
+    if any(host == h or host.endswith("." + h) for h in ANALYTICS_HOSTS):
+        return "analytics"
+    return RESOURCE_TYPES.get(resource_type or "", "other")
+
+
+class RequestBlocker:
+    """Blocks requests the current call does not need through Chrome's own Network.setBlockedURLs.
+
+    Unlike a Playwright route, this leaves the HTTP cache on, so pooled pages keep reusing the site's
+    JS/CSS bundles between navigations. Pages come from the shared pool, so the policy is (re)applied
+    whenever a page is borrowed. The same CDP session measures what the pages really transferred
+    (encoded bytes), how many responses came from cache, and what was blocked.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._sessions: Dict[Page, Tuple[CDPSession, BlockingPolicy]] = {}
+        self._requests: Dict[str, Tuple[str, Optional[str]]] = {} # requestId -> (url, resource type), in flight
+        self.blocked_requests: Dict[str, int] = {}
+        self.transferred_bytes = 0
+        self.responses = 0
+        self.cache_hits = 0
+
+    async def apply(self, page: Page, policy: BlockingPolicy) -> None:
+        if not self.enabled:
+            return
+        current = self._sessions.get(page)
+        if current is not None and current[1].key() == policy.key():
+            return
+        if current is None:
+            if policy.is_noop():
+                return
+            session = await page.context.new_cdp_session(page)
+            self._watch(session)
+            await session.send("Network.enable")
+            page.once("close", lambda _: self._sessions.pop(page, None))
+        else:
+            session = current[0]
+        await session.send("Network.setBlockedURLs", {"urls": policy.patterns()})
+        self._sessions[page] = (session, policy)
+
+    def _watch(self, session: CDPSession) -> None:
+        def on_request(event: Dict[str, Any]) -> None:
+            if len(self._requests) > 10000: # events lost with a closed page; only needed to label blocked requests
+                self._requests.clear()
+            self._requests[event["requestId"]] = (event["request"]["url"], event.get("type"))
+
+        def on_finished(event: Dict[str, Any]) -> None:
+            self._requests.pop(event["requestId"], None)
+            size = int(event.get("encodedDataLength") or 0)
+            self.responses += 1
+            self.transferred_bytes += size
+            metrics.inc("browser_transfer_bytes_total", size)
+
+        def on_cached(event: Dict[str, Any]) -> None:
+            self.cache_hits += 1
+            metrics.inc("browser_cache_hits_total")
+
+        def on_failed(event: Dict[str, Any]) -> None:
+            url, resource_type = self._requests.pop(event["requestId"], ("", None))
+            if event.get("blockedReason") != "inspector": # "inspector" = matched setBlockedURLs
+                return
+            reason = blocked_category(url, event.get("type") or resource_type)
+            self.blocked_requests[reason] = self.blocked_requests.get(reason, 0) + 1
+            metrics.inc("blocked_requests_total", reason=reason)
+
+        session.on("Network.requestWillBeSent", on_request)
+        session.on("Network.loadingFinished", on_finished)
+        session.on("Network.requestServedFromCache", on_cached)
+        session.on("Network.loadingFailed", on_failed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "blocked_requests": dict(self.blocked_requests),
+            "blocked_total": sum(self.blocked_requests.values()),
+            # Measured on the pages with blocking active, not estimated.
+            "transferred_bytes": self.transferred_bytes,
+            "responses": self.responses,
+            "cache_hits": self.cache_hits,
+        }
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from metrics import metrics
+
+
+class ServerBusyError(RuntimeError):
+    """Raised instead of queueing a tool call the server cannot take on right now."""
+
+
+class RequestGate:
+    """Admission control for the heavy tool calls of a server shared by many clients.
+
+    At most `max_concurrent` calls run at once; up to `max_queued` more wait in FIFO order for a slot.
+    Beyond that, or after waiting `queue_timeout` seconds, a call is rejected with ServerBusyError so
+    clients back off instead of piling work onto one browser.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 16, queue_timeout: float = 120.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+        self.counts = {"admitted": 0, "rejected": 0, "timed_out": 0}
+
+    def _update_gauges(self) -> None:
+        metrics.set_gauge("requests_in_flight", self.in_flight)
+        metrics.set_gauge("requests_queued", self.queued)
+
+    def _reject(self, tool: str, outcome: str, message: str) -> None:
+        self.counts[outcome] += 1
+        metrics.inc("requests_total", tool=tool, outcome=outcome)
+        print(message)
+        raise ServerBusyError(message)
+
+    @asynccontextmanager
+    async def slot(self, tool: str):
+        if self._slots.locked() and self.queued >= self.max_queued:
+            self._reject(tool, "rejected", f"服务繁忙：{self.in_flight} 个请求执行中，{self.queued} 个排队中，请稍后重试 ({tool})")
+        self.queued += 1
+        self._update_gauges()
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self._reject(tool, "timed_out", f"排队超过 {self.queue_timeout:.0f} 秒仍未获得执行槽位，请稍后重试 ({tool})")
+        finally:
+            self.queued -= 1
+            self._update_gauges()
+        waited = time.perf_counter() - queued_at
+        metrics.record("request_queue_wait", waited, tool=tool)
+        self.counts["admitted"] += 1
+        metrics.inc("requests_total", tool=tool, outcome="admitted")
+        self.in_flight += 1
+        self._update_gauges()
+        try:
+            yield waited
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            self._update_gauges()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            **self.counts,
+        }
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from metrics import metrics
+
+
+def normalize_keywords(keywords: str) -> str:
+    return re.sub(r"\s+", " ", keywords.strip().lower())
+
+
+def unique_keywords(keywords_list: List[str]) -> List[str]:
+    # One search per normalized keyword, under the first spelling it was asked with; blanks dropped.
+    unique: Dict[str, str] = {}
+    for keywords in keywords_list:
+        if keywords.strip():
+            unique.setdefault(normalize_keywords(keywords), keywords.strip())
+    return list(unique.values())
+
+
+def search_cache_key(keywords: str, channel: str) -> str:
+    return f"{normalize_keywords(keywords)}|{channel}"
+
+
+class SearchCache:
+    """LRU cache of search result URL lists keyed by normalized keywords + result filter.
+
+    Entries younger than `ttl_seconds` are served as is. Entries up to `stale_seconds` older than
+    that are still served immediately while a background task refreshes them (stale-while-revalidate).
+    With `disk_path`, changes are written to that file in a thread, at most once per `save_delay` seconds.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300, stale_seconds: float = 1800,
+                 disk_path: Optional[Path] = None, save_delay: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.disk_path = Path(disk_path) if disk_path else None
+        self.save_delay = save_delay
+        self.enabled = max_entries > 0 and ttl_seconds > 0
+        # key -> {"urls": [...], "requested": limit used for the fetch, "complete": the feed ran out before
+        # `requested` was reached, "fetched_at": epoch seconds}
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._save_task: Optional[asyncio.Task] = None # pending debounced write
+        self._save_lock = asyncio.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.disk_path or not self.disk_path.exists():
+            return
+        try:
+            with open(self.disk_path, "r", encoding="utf-8") as f:
+                for key, entry in json.load(f).items():
+                    self._entries[key] = entry
+            self._evict()
+        except Exception as e:
+            print(f"读取搜索缓存文件 {self.disk_path} 失败: {e}")
+
+    def _write(self, entries: Dict[str, Dict]) -> None:
+        try:
+            self.disk_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.disk_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            tmp_path.replace(self.disk_path)
+        except Exception as e:
+            print(f"写入搜索缓存文件 {self.disk_path} 失败: {e}")
+
+    def _save(self) -> None:
+        if not self.disk_path:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(dict(self._entries)) # no event loop to keep free
+            return
+        if self._save_task is None:
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        # Puts within `save_delay` share one write. Entries are replaced, never mutated, so a shallow copy
+        # is a consistent snapshot for the thread to serialize.
+        await asyncio.sleep(self.save_delay)
+        self._save_task = None # later puts schedule the next write
+        async with self._save_lock:
+            await asyncio.to_thread(self._write, dict(self._entries))
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _covers(self, entry: Dict, limit: int) -> bool:
+        # A short list answers a larger limit only when the feed itself ran dry; one cut short by the scroll
+        # or time budget does not (entries written without the flag count as cut short).
+        return len(entry["urls"]) >= limit or entry.get("complete", False)
+
+    def put(self, key: str, urls: List[str], requested: int, complete: bool = False) -> None:
+        self._entries[key] = {"urls": list(urls), "requested": requested, "complete": complete, "fetched_at": time.time()}
+        self._entries.move_to_end(key)
+        self._evict()
+        self._save()
+
+    async def _fetch_and_store(self, key: str, limit: int,
+                               fetch: Callable[[int], Awaitable[Tuple[List[str], bool]]]) -> List[str]:
+        task = self._inflight.get(key)
+        if task is None:
+            async def run():
+                try:
+                    urls, complete = await fetch(limit)
+                    if urls: # an empty list is more likely a blocked/failed search than a real answer
+                        self.put(key, urls, limit, complete)
+                    return urls
+                finally:
+                    self._inflight.pop(key, None)
+            task = self._inflight[key] = asyncio.create_task(run())
+        return await asyncio.shield(task)
+
+    def lookup(self, keywords: str, channel: str, limit: int,
+               refresh: Callable[[int], Awaitable[Tuple[List[str], bool]]]) -> Optional[List[str]]:
+        """Returns cached URLs covering `limit`, or None on a miss. A stale hit schedules `refresh`,
+        which returns (urls, complete) for a given limit."""
+        if not self.enabled:
+            return None
+        key = search_cache_key(keywords, channel)
+        entry = self._entries.get(key)
+        if entry and self._covers(entry, limit):
+            age = time.time() - entry["fetched_at"]
+            if age <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("search_cache_lookups_total", result="hit")
+                print(f"搜索结果缓存命中: {key}")
+                return entry["urls"][:limit]
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                metrics.inc("search_cache_lookups_total", result="stale")
+                print(f"搜索结果缓存已过期 {age:.0f} 秒，先返回旧结果并在后台刷新: {key}")
+                if key not in self._inflight:
+                    task = asyncio.create_task(self._refresh(key, max(limit, entry["requested"]), refresh))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                return entry["urls"][:limit]
+        self.misses += 1
+        metrics.inc("search_cache_lookups_total", result="miss")
+        return None
+
+    def store(self, keywords: str, channel: str, urls: List[str], requested: int, complete: bool = False) -> None:
+        if self.enabled and urls: # an empty list is more likely a blocked/failed search than a real answer
+            self.put(search_cache_key(keywords, channel), urls, requested, complete)
+
+    async def _refresh(self, key: str, limit: int, fetch: Callable[[int], Awaitable[Tuple[List[str], bool]]]) -> None:
+        try:
+            await self._fetch_and_store(key, limit, fetch)
+        except Exception as e:
+            print(f"后台刷新搜索缓存 {key} 失败: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        return {"enabled": self.enabled, "entries": len(self._entries), "hits": self.hits,
+                "stale_hits": self.stale_hits, "misses": self.misses}
+
+    async def close(self) -> None:
+        for task in list(self._background) + list(self._inflight.values()):
+            task.cancel()
+        await asyncio.gather(*self._background, *self._inflight.values(), return_exceptions=True)
+        self._background.clear()
+        self._inflight.clear()
+        pending, self._save_task = self._save_task, None
+        if pending is not None: # flush the pending write now instead of after the delay
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        async with self._save_lock: # also waits for a write already in progress
+            if pending is not None:
+                await asyncio.to_thread(self._write, dict(self._entries))
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from metrics import metrics
+
+LOGIN_COOKIE = "web_session" # set by xiaohongshu.com once logged in
+EXPIRY_MARGIN = 300 # seconds; a cookie about to expire counts as expired
+
+
+LOGIN_PATHS = ("login", "website-login", "passport", "signin") # first path segment of a login wall
+CAPTCHA_SEGMENTS = ("captcha", "verify") # any path segment of a verification page
+
+
+def _host_and_segments(url: str) -> Tuple[str, List[str]]:
+    # Only the host and path say where a page is; the query carries search keywords, which may be anything.
+    parts = urlsplit(url.lower())
+    return parts.hostname or "", [segment for segment in parts.path.split("/") if segment]
+
+
+def is_login_url(url: str) -> bool:
+    host, segments = _host_and_segments(url)
+    return host.startswith(("passport.", "login.")) or bool(segments and segments[0] in LOGIN_PATHS)
+
+
+def blocked_reason(url: str) -> Optional[str]:
+    # "captcha" for the verification page (website-login/captcha), "login" for any other login redirect.
+    _, segments = _host_and_segments(url)
+    if any(segment in CAPTCHA_SEGMENTS for segment in segments):
+        return "captcha"
+    return "login" if is_login_url(url) else None
+
+
+class SessionManager:
+    """Remembers whether the browser profile is logged in, so calls do not have to visit a page to find out.
+
+    Login is known valid until the earlier of the `web_session` cookie expiry in the saved storage state
+    and `recheck_interval` seconds after it was last verified. A login redirect seen by any request marks
+    it invalid, which is remembered for `invalid_ttl` seconds or until a login saves new cookies. Only when
+    neither applies (unknown) is the explore-page probe run, once for all concurrent callers.
+    """
+
+    def __init__(self, storage_state_file: Path, recheck_interval: float = 12 * 3600, invalid_ttl: float = 1800):
+        self.storage_state_file = Path(storage_state_file)
+        self.recheck_interval = recheck_interval
+        self.invalid_ttl = invalid_ttl
+        self.state = "unknown" # "valid", "invalid" or "unknown"
+        self.source: Optional[str] = None # what established the current state: probe, cookies, search, redirect
+        self.verified_at = 0.0
+        self.invalidated_at = 0.0 # cookies saved before this moment are known not to work
+        self.cookie_expires: Optional[float] = None
+        self._cookie_mtime: Optional[float] = None
+        self._probe_lock = asyncio.Lock()
+        self.probes = 0
+
+    def _read_cookie_expiry(self) -> Optional[float]:
+        # Re-read only when the storage state file changed; session cookies (expires -1) have no expiry.
+        try:
+            mtime = self.storage_state_file.stat().st_mtime
+        except OSError:
+            self._cookie_mtime, self.cookie_expires = None, None
+            return None
+        if mtime != self._cookie_mtime:
+            self._cookie_mtime = mtime
+            self.cookie_expires = None
+            try:
+                with open(self.storage_state_file, "r", encoding="utf-8") as f:
+                    cookies = json.load(f).get("cookies", [])
+                expiries = [cookie.get("expires", -1) for cookie in cookies if cookie.get("name") == LOGIN_COOKIE]
+                if expiries:
+                    expires = max(expiries)
+                    self.cookie_expires = expires if expires > 0 else mtime + self.recheck_interval
+            except Exception as e:
+                print(f"读取会话文件 {self.storage_state_file} 失败: {e}")
+        return self.cookie_expires
+
+    def valid_until(self) -> Optional[float]:
+        if self.state != "valid":
+            return None
+        until = self.verified_at + self.recheck_interval
+        if self.cookie_expires is not None:
+            until = min(until, self.cookie_expires - EXPIRY_MARGIN)
+        return until
+
+    def validity(self) -> Optional[bool]:
+        """True/False when the login state is known, None when it has to be probed."""
+        now = time.time()
+        if self.state == "valid" and now < self.valid_until():
+            return True
+        # A saved login cookie that has not expired yet is good enough, unless it predates the last invalidation.
+        expires = self._read_cookie_expiry()
+        if expires is not None and expires - EXPIRY_MARGIN > now and self._cookie_mtime > self.invalidated_at:
+            self._set("valid", "cookies", verified_at=min(now, self._cookie_mtime))
+            if now < self.valid_until():
+                return True
+        elif self.state == "invalid" and now - self.verified_at < self.invalid_ttl:
+            return False
+        self.state = "unknown"
+        return None
+
+    def _set(self, state: str, source: str, verified_at: Optional[float] = None) -> None:
+        if state != self.state or source != self.source:
+            print(f"登录状态: {state} (来源: {source})")
+        self.state = state
+        self.source = source
+        self.verified_at = time.time() if verified_at is None else verified_at
+        metrics.set_gauge("session_valid", 1 if state == "valid" else 0)
+
+    def mark_valid(self, source: str) -> None:
+        self._read_cookie_expiry()
+        self._set("valid", source)
+
+    def mark_invalid(self, source: str) -> None:
+        self._set("invalid", source)
+        self.invalidated_at = self.verified_at
+
+    async def ensure(self, probe: Callable[[], Awaitable[bool]], retry_invalid: bool = False) -> bool:
+        """Returns the login state, running `probe` only when it is unknown. With retry_invalid, a known
+        invalid state is probed again too (a visible browser, where the probe can wait for a manual login)."""
+        known = self.validity()
+        if known or (known is False and not retry_invalid):
+            metrics.inc("session_checks_total", result="valid" if known else "invalid")
+            return known
+        asked_at = time.time()
+        async with self._probe_lock:
+            known = self.validity() # another caller may have probed while this one waited
+            if known or (known is False and (not retry_invalid or self.verified_at >= asked_at)):
+                metrics.inc("session_checks_total", result="valid" if known else "invalid")
+                return known
+            metrics.inc("session_checks_total", result="probe")
+            self.probes += 1
+            try:
+                logged_in = await probe()
+            except Exception as e:
+                print(f"登录状态检查失败: {e}")
+                return False
+            if logged_in:
+                self.mark_valid("probe")
+            else:
+                self.mark_invalid("probe")
+            return logged_in
+
+    def stats(self) -> Dict[str, Any]:
+        until = self.valid_until()
+        return {
+            "state": self.state,
+            "source": self.source,
+            "verified_seconds_ago": round(time.time() - self.verified_at, 1) if self.verified_at else None,
+            "valid_for_seconds": round(until - time.time(), 1) if until else None,
+            "cookie_expires": self.cookie_expires,
+            "probes": self.probes,
+        }
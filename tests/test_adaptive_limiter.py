@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from adaptive_limiter import AdaptiveLimiter, PageBlockedError, classify
+
+
+async def navigate(limiter, error=None):
+    async with limiter.slot():
+        await asyncio.sleep(0)
+        if error is not None:
+            raise error
+
+
+def test_successes_raise_the_limit_additively_up_to_the_cap():
+    async def scenario():
+        limiter = AdaptiveLimiter(4, initial_limit=1)
+        for _ in range(20):
+            await navigate(limiter)
+        return int(limiter.limit)
+    assert asyncio.run(scenario()) == 4
+
+
+def test_block_halves_the_limit_and_starts_pacing():
+    async def scenario():
+        limiter = AdaptiveLimiter(8)
+        with pytest.raises(PageBlockedError):
+            await navigate(limiter, PageBlockedError("captcha page", "captcha"))
+        return limiter.stats()
+    stats = asyncio.run(scenario())
+    assert stats["concurrency_limit"] == 4
+    assert stats["interval_seconds"] >= 1.0
+    assert stats["recent_outcomes"] == {"blocked": 1}
+
+
+def test_errors_within_the_cooldown_count_once():
+    async def scenario():
+        limiter = AdaptiveLimiter(8, decrease_cooldown=60)
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await navigate(limiter, RuntimeError("net::ERR"))
+        return int(limiter.limit)
+    assert asyncio.run(scenario()) == 6
+
+
+def test_limit_caps_concurrent_slots():
+    async def scenario():
+        limiter = AdaptiveLimiter(8, initial_limit=2)
+        peak = 0
+
+        async def hold():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+        await asyncio.gather(*(hold() for _ in range(2)))
+        return peak
+    assert asyncio.run(scenario()) == 2
+
+
+def test_released_navigation_frees_its_slot_and_ignores_later_errors():
+    async def scenario():
+        limiter = AdaptiveLimiter(4, initial_limit=1)
+        order = []
+
+        async def harvest():
+            async with limiter.slot() as navigation:
+                await navigation.release()
+                order.append("released")
+                await asyncio.sleep(0.02)
+                raise RuntimeError("scroll failed")
+
+        async def note():
+            await asyncio.sleep(0.01)
+            async with limiter.slot():
+                order.append("note")
+        await asyncio.gather(harvest(), note(), return_exceptions=True)
+        return order, limiter.stats()
+    order, stats = asyncio.run(scenario())
+    assert order == ["released", "note"]
+    assert stats["recent_outcomes"] == {"ok": 2} and stats["in_flight"] == 0
+
+
+def test_disabled_controller_keeps_the_maximum():
+    async def scenario():
+        limiter = AdaptiveLimiter(5, initial_limit=1, enabled=False)
+        with pytest.raises(PageBlockedError):
+            await navigate(limiter, PageBlockedError("login page", "login"))
+        return int(limiter.limit), limiter.interval
+    assert asyncio.run(scenario()) == (5, 0.0)
+
+
+def test_classify_and_backoff_bounds():
+    assert classify(PageBlockedError("x", "login")) == "blocked"
+    assert classify(asyncio.TimeoutError()) == "timeout"
+    assert classify(ValueError()) == "error"
+    limiter = AdaptiveLimiter(2)
+    assert all(0 <= limiter.backoff(attempt, base=1.0, cap=5.0) <= 5.0 for attempt in range(10))
@@ -0,0 +1,50 @@
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageDraw, ImageFilter
+
+import image_prep
+
+
+def text_card(lines, size=(600, 800), invert=False):
+    background, ink = (30, 250) if invert else (250, 30)
+    card = Image.new("L", size, background)
+    draw = ImageDraw.Draw(card)
+    for i, width in enumerate(lines):
+        draw.rectangle((40, 60 + i * 70, 40 + width, 100 + i * 70), fill=ink)
+    return card
+
+
+def photo_card(lines, size=(600, 800)):
+    # Shaded background with soft edges, like a photographed text card rather than flat synthetic pixels.
+    card = Image.linear_gradient("L").resize(size)
+    draw = ImageDraw.Draw(card)
+    for i, width in enumerate(lines):
+        draw.rectangle((40, 60 + i * 70, 40 + width, 100 + i * 70), fill=20)
+    return card.filter(ImageFilter.GaussianBlur(3))
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def test_dhash_survives_rescaling_but_tells_layouts_apart():
+    card = photo_card([500, 300, 450, 200, 520])
+    rescaled = card.resize((300, 400))
+    other = photo_card([200, 520, 150, 480, 300])
+    assert image_prep.dhash(card).bit_length() <= image_prep.HASH_SIZE ** 2
+    assert distance(image_prep.dhash(card), image_prep.dhash(rescaled)) <= 4
+    assert distance(image_prep.dhash(card), image_prep.dhash(other)) > 15
+
+
+def test_flat_and_tiny_images_count_as_blank():
+    assert image_prep.fingerprint(Image.new("RGB", (600, 800), (255, 255, 255)))["blank"]
+    assert image_prep.fingerprint(text_card([10], size=(20, 200)))["blank"]
+    assert not image_prep.fingerprint(text_card([500, 300]))["blank"]
+
+
+def test_preprocess_downscales_binarizes_and_keeps_dark_text_on_light():
+    result = image_prep.preprocess(text_card([500, 300], size=(1200, 1600), invert=True), max_side=800)
+    assert max(result.size) == 800
+    assert set(result.histogram()[1:255]) == {0} # only pure black and white pixels
+    assert result.getpixel((5, 5)) == 255 # the dark card background became the light side
@@ -0,0 +1,95 @@
+import asyncio
+
+from job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def blocker(gate, started, result=None, error=None):
+    async def job_run(job):
+        started.append(job.params["name"])
+        job.partial.append((0, job.params["name"]))
+        await gate.wait()
+        if error:
+            raise error
+        return result
+    return job_run
+
+
+def test_higher_priority_starts_first_fifo_within_priority():
+    async def scenario():
+        scheduler = JobScheduler(max_running=1)
+        gate = asyncio.Event()
+        started = []
+        scheduler.submit("t", {"name": "first"}, blocker(gate, started))
+        scheduler.submit("t", {"name": "low"}, blocker(gate, started), priority=0)
+        scheduler.submit("t", {"name": "high-a"}, blocker(gate, started), priority=5)
+        scheduler.submit("t", {"name": "high-b"}, blocker(gate, started), priority=5)
+        await asyncio.sleep(0)
+        gate.set()
+        while any(job.state != DONE for job in scheduler.jobs.values()):
+            await asyncio.sleep(0.01)
+        return started
+    assert run(scenario()) == ["first", "high-a", "high-b", "low"]
+
+
+def test_heavy_cap_lets_light_jobs_pass_a_waiting_heavy_job():
+    async def scenario():
+        scheduler = JobScheduler(max_running=3, max_heavy=1)
+        gate = asyncio.Event()
+        started = []
+        heavy1 = scheduler.submit("t", {"name": "heavy1"}, blocker(gate, started), heavy=True)
+        heavy2 = scheduler.submit("t", {"name": "heavy2"}, blocker(gate, started), heavy=True, priority=1)
+        light = scheduler.submit("t", {"name": "light"}, blocker(gate, started))
+        await asyncio.sleep(0)
+        states = (heavy1.state, heavy2.state, light.state, scheduler.queue_position(heavy2))
+        gate.set()
+        await scheduler.close()
+        return states
+    assert run(scenario()) == (RUNNING, QUEUED, RUNNING, 0)
+
+
+def test_partial_results_survive_failure_and_cancel_but_not_success():
+    async def scenario():
+        scheduler = JobScheduler(max_running=3)
+        gate = asyncio.Event()
+        ok = scheduler.submit("t", {"name": "ok"}, blocker(gate, [], result={"results": []}))
+        failed = scheduler.submit("t", {"name": "failed"}, blocker(gate, [], error=RuntimeError("boom")))
+        cancelled = scheduler.submit("t", {"name": "cancelled"}, blocker(asyncio.Event(), []))
+        await asyncio.sleep(0)
+        scheduler.cancel(cancelled.id)
+        gate.set()
+        await asyncio.gather(ok.task, failed.task, cancelled.task, return_exceptions=True)
+        return ok, failed, cancelled
+    ok, failed, cancelled = run(scenario())
+    assert (ok.state, ok.partial) == (DONE, [])
+    assert (failed.state, failed.error, failed.partial) == (FAILED, "boom", [(0, "failed")])
+    assert (cancelled.state, cancelled.partial) == (CANCELLED, [(0, "cancelled")])
+
+
+def test_finished_jobs_expire_after_the_result_ttl():
+    async def scenario():
+        scheduler = JobScheduler(result_ttl=60)
+        job = scheduler.submit("t", {}, lambda job: asyncio.sleep(0, result={"results": []}))
+        await job.task
+        kept = scheduler.get(job.id) is job
+        job.finished_at -= 61
+        return kept, scheduler.get(job.id)
+    assert run(scenario()) == (True, None)
+
+
+def test_cancelling_a_queued_job_never_starts_it():
+    async def scenario():
+        scheduler = JobScheduler(max_running=1)
+        gate = asyncio.Event()
+        started = []
+        running = scheduler.submit("t", {"name": "running"}, blocker(gate, started))
+        queued = scheduler.submit("t", {"name": "queued"}, blocker(gate, started))
+        assert scheduler.cancel(queued.id)
+        gate.set()
+        await running.task
+        await asyncio.sleep(0.01)
+        return started, queued.state
+    assert run(scenario()) == (["running"], CANCELLED)
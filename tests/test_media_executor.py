@@ -0,0 +1,24 @@
+import asyncio
+import os
+
+from media_executor import MediaExecutor
+
+
+def crash_once(marker):
+    # The first call kills its worker process, as an OOM kill would; later calls succeed.
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "ok"
+
+
+def test_broken_worker_pool_is_rebuilt_and_the_job_retried(tmp_path):
+    async def scenario():
+        media = MediaExecutor(cpu_workers=1)
+        try:
+            broken = media._get_cpu_pool()
+            result = await media.run_cpu(crash_once, str(tmp_path / "crashed"))
+            return result, media._cpu_pool is not broken, await media.run_cpu(crash_once, str(tmp_path / "crashed"))
+        finally:
+            media.shutdown()
+    assert asyncio.run(scenario()) == ("ok", True, "ok")
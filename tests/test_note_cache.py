@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from note_cache import NoteCache, default_cache_path, note_id_from_url
+
+
+def url(note_id):
+    return f"https://www.xiaohongshu.com/search_result/{note_id}?xsec_token=abc"
+
+
+def detail(text):
+    return {"title": "t", "content": text, "image_urls": [], "video_url": None, "comments": []}
+
+
+def test_note_id_ignores_the_path_prefix_and_token():
+    assert note_id_from_url(url("abc123")) == note_id_from_url("https://www.xiaohongshu.com/explore/abc123") == "abc123"
+
+
+def test_default_path_is_outside_the_package(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert default_cache_path() == tmp_path / "rednote_mcp" / "notes.sqlite3"
+
+
+def test_round_trip_keeps_derivatives(tmp_path):
+    async def scenario():
+        cache = NoteCache(tmp_path / "notes.sqlite3")
+        await cache.put(url("n1"), detail("hello"), {"ocr": ["text"]})
+        entry = await cache.get("https://www.xiaohongshu.com/explore/n1")
+        cache.close()
+        return entry, cache.hits
+    entry, hits = asyncio.run(scenario())
+    assert entry == {"detail": detail("hello"), "derivatives": {"ocr": ["text"]}} and hits == 1
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    async def scenario():
+        cache = NoteCache(tmp_path / "notes.sqlite3", ttl_seconds=60)
+        await cache.put(url("n1"), detail("hello"), {})
+        cache._connect().execute("UPDATE notes SET updated_at = ?", (time.time() - 61,))
+        entry = await cache.get(url("n1"))
+        rows = cache._connect().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        cache.close()
+        return entry, rows, cache.misses
+    assert asyncio.run(scenario()) == (None, 0, 1)
+
+
+def test_size_limit_evicts_the_least_recently_read_notes(tmp_path):
+    async def scenario():
+        cache = NoteCache(tmp_path / "notes.sqlite3", max_bytes=10_000)
+        for note_id in ("old", "read", "new"):
+            await cache.put(url(note_id), detail("x" * 3000), {})
+        conn = cache._connect()
+        conn.execute("UPDATE notes SET accessed_at = ? WHERE note_id = 'old'", (time.time() - 100,))
+        conn.execute("UPDATE notes SET accessed_at = ? WHERE note_id IN ('read', 'new')", (time.time() - 50,))
+        await cache.get(url("read")) # reading refreshes accessed_at
+        await cache.put(url("newest"), detail("x" * 3000), {}) # pushes the store over the limit
+        kept = {row[0] for row in conn.execute("SELECT note_id FROM notes")}
+        total = conn.execute("SELECT SUM(size) FROM notes").fetchone()[0]
+        cache.close()
+        return kept, total
+    kept, total = asyncio.run(scenario())
+    assert kept == {"read", "new", "newest"} and total <= 10_000
+
+
+def test_disabled_cache_never_touches_disk(tmp_path):
+    async def scenario():
+        cache = NoteCache(tmp_path / "sub" / "notes.sqlite3", ttl_seconds=0)
+        await cache.put(url("n1"), detail("hello"), {})
+        return await cache.get(url("n1"))
+    assert asyncio.run(scenario()) is None
+    assert not (tmp_path / "sub").exists()
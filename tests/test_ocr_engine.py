@@ -0,0 +1,101 @@
+import asyncio
+
+import media_worker
+from ocr_engine import OCREngine
+
+
+class FakeMedia:
+    """Stands in for MediaExecutor: image bytes are looked up in a table of fingerprints and texts."""
+
+    def __init__(self, images):
+        self.images = images # bytes -> (fingerprint, text or exception)
+        self.ocr_calls = []
+
+    async def run_io(self, fn, data):
+        assert fn is media_worker.image_fingerprint
+        return self.images[data][0]
+
+    async def run_cpu(self, fn, data, **kwargs):
+        assert fn is media_worker.ocr_image_bytes
+        self.ocr_calls.append(data)
+        await asyncio.sleep(0.01)
+        result = self.images[data][1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def image(dhash, text="text", blank=False):
+    return {"dhash": dhash, "blank": blank, "width": 800, "height": 600}, text
+
+
+BASE = (1 << 255) | 0x1234_5678_9ABC_DEF0
+
+
+def recognize_all(engine, *images):
+    async def scenario():
+        return [await engine.recognize(data) for data in images]
+    return asyncio.run(scenario())
+
+
+def test_one_bit_different_hash_reuses_the_text():
+    media = FakeMedia({b"a": image(BASE, "hello"), b"b": image(BASE ^ 1, "other")})
+    engine = OCREngine(media, hash_distance=4)
+    assert recognize_all(engine, b"a", b"b") == ["hello", "hello"]
+    assert media.ocr_calls == [b"a"] and engine.counts["cache_hit"] == 1
+
+
+def test_hashes_beyond_the_distance_are_recognized_separately():
+    far = BASE ^ 0b11111 # 5 bits apart, all within one band
+    spread = BASE ^ sum(1 << (16 * band) for band in range(16)) # one bit in every band: no shared band
+    media = FakeMedia({b"a": image(BASE, "a"), b"far": image(far, "far"), b"spread": image(spread, "spread")})
+    engine = OCREngine(media, hash_distance=4)
+    assert recognize_all(engine, b"a", b"far", b"spread") == ["a", "far", "spread"]
+    assert len(media.ocr_calls) == 3
+
+
+def test_distance_is_capped_so_band_lookup_stays_exact():
+    assert OCREngine(FakeMedia({}), hash_distance=40).hash_distance == 15
+
+
+def test_lru_bound_evicts_the_oldest_hash_and_its_band_entries():
+    one, two, three = 0, (1 << 256) - 1, int("5" * 64, 16) # pairwise far apart, no shared band
+    engine = OCREngine(FakeMedia({}), cache_size=2)
+    engine._store(one, "one")
+    engine._store(two, "two")
+    assert engine._lookup(one) == (one, "one") # now the most recently used
+    engine._store(three, "three")
+    assert list(engine._texts) == [one, three]
+    assert engine._lookup(two) is None
+    assert all(two not in bucket for bands in engine._bands for bucket in bands.values())
+
+
+def test_zero_cache_size_disables_the_cache():
+    media = FakeMedia({b"a": image(BASE, "hello")})
+    engine = OCREngine(media, cache_size=0)
+    assert recognize_all(engine, b"a", b"a") == ["hello", "hello"]
+    assert len(media.ocr_calls) == 2
+
+
+def test_blank_images_are_skipped_without_ocr():
+    media = FakeMedia({b"spacer": image(0, blank=True)})
+    engine = OCREngine(media)
+    assert recognize_all(engine, b"spacer") == [""]
+    assert media.ocr_calls == [] and engine.counts["blank"] == 1
+
+
+def test_concurrent_copies_of_an_image_share_one_ocr_run():
+    media = FakeMedia({b"a": image(BASE, "hello")})
+    engine = OCREngine(media)
+
+    async def scenario():
+        return await asyncio.gather(*(engine.recognize(b"a") for _ in range(3)))
+    assert asyncio.run(scenario()) == ["hello"] * 3
+    assert media.ocr_calls == [b"a"]
+
+
+def test_failed_ocr_returns_none_and_is_not_cached():
+    media = FakeMedia({b"a": image(BASE, RuntimeError("tesseract crashed"))})
+    engine = OCREngine(media)
+    assert recognize_all(engine, b"a", b"a") == [None, None]
+    assert len(media.ocr_calls) == 2 and engine.counts["error"] == 2
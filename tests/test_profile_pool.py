@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from profile_pool import ACTIVE, EVICTED, Profile, ProfilePool, ProfilesExhaustedError, parse_profiles
+from session_manager import SessionManager
+
+
+class FakeBrowserPool:
+    max_pages = 2
+
+    def stats(self):
+        return {"busy_pages": 0, "idle_pages": 0}
+
+    async def close(self):
+        pass
+
+
+def make_pool(tmp_path, count=2, budget=0, **kwargs):
+    profiles = [Profile(f"p{i}", tmp_path / f"p{i}", tmp_path / f"p{i}.json", FakeBrowserPool(),
+                        SessionManager(tmp_path / f"p{i}.json"), budget=budget) for i in range(count)]
+    return ProfilePool(profiles, **kwargs)
+
+
+async def take(pool):
+    profile = await pool.acquire()
+    pool.release(profile)
+    return profile.name
+
+
+def test_navigations_rotate_over_accounts(tmp_path):
+    pool = make_pool(tmp_path)
+
+    async def scenario():
+        first = await pool.acquire()
+        second = await pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        return first.name, second.name
+    assert asyncio.run(scenario()) == ("p0", "p1")
+
+
+def test_exhausted_budgets_raise_instead_of_waiting_past_max_wait(tmp_path):
+    pool = make_pool(tmp_path, budget=1, max_wait=1)
+
+    async def scenario():
+        names = [await take(pool), await take(pool)]
+        with pytest.raises(ProfilesExhaustedError):
+            await pool.acquire()
+        return names
+    assert sorted(asyncio.run(scenario())) == ["p0", "p1"]
+
+
+def test_block_evicts_an_account_while_others_remain(tmp_path):
+    pool = make_pool(tmp_path, evict_seconds=1800)
+    blocked, other = pool.profiles
+    pool.report_block(blocked, "captcha")
+    assert blocked.state == EVICTED and blocked.session.state == "invalid"
+    assert asyncio.run(take(pool)) == "p1"
+    # The last account in rotation only cools down after a captcha.
+    pool.report_block(other, "captcha")
+    assert other.state == ACTIVE and other.cooldown_until > 0
+
+
+def test_evicted_account_rejoins_after_the_eviction_period(tmp_path):
+    pool = make_pool(tmp_path, evict_seconds=0)
+    pool.report_block(pool.profiles[0], "login")
+    assert pool.profiles[0].state == EVICTED
+    assert asyncio.run(take(pool)) == "p0"
+    assert pool.profiles[0].state == ACTIVE
+
+
+def test_last_account_stays_usable_after_a_login_wall(tmp_path):
+    pool = make_pool(tmp_path, count=1)
+    pool.report_block(pool.primary, "login")
+    assert pool.primary.state == ACTIVE
+    assert asyncio.run(take(pool)) == "p0"
+
+
+def test_parse_profiles_accepts_dirs_and_objects(tmp_path):
+    entries = parse_profiles(f'["{tmp_path / "a"}", {{"user_data_dir": "{tmp_path / "b"}", "name": "b", "budget": 5}}]')
+    assert [entry["name"] for entry in entries] == ["profile0", "b"]
+    assert entries[0]["storage_state"] == str(tmp_path / "a" / "playwright_state.json")
+    assert entries[1]["budget"] == 5
+    assert parse_profiles("") == []
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from search_cache import SearchCache, search_cache_key, unique_keywords
+
+
+async def no_refresh(limit):
+    raise AssertionError("unexpected refresh")
+
+
+def test_short_list_cut_short_by_the_scroll_budget_does_not_cover_a_larger_limit():
+    cache = SearchCache()
+    cache.store("Coffee", "image", ["u1", "u2"], requested=10, complete=False)
+    assert cache.lookup("coffee", "image", 10, no_refresh) is None
+    assert cache.lookup("coffee", "image", 2, no_refresh) == ["u1", "u2"]
+
+
+def test_short_list_from_an_exhausted_feed_covers_any_limit():
+    cache = SearchCache()
+    cache.store("coffee", "image", ["u1", "u2"], requested=10, complete=True)
+    assert cache.lookup("coffee", "image", 50, no_refresh) == ["u1", "u2"]
+
+
+def test_entries_without_the_complete_flag_count_as_incomplete():
+    cache = SearchCache()
+    cache._entries[search_cache_key("coffee", "image")] = {"urls": ["u1"], "requested": 10, "fetched_at": time.time()}
+    assert cache.lookup("coffee", "image", 5, no_refresh) is None
+
+
+def test_keys_are_normalized_and_channels_kept_apart():
+    cache = SearchCache()
+    cache.store("  Iced   Coffee ", "image", ["u1"], requested=1)
+    assert cache.lookup("iced coffee", "image", 1, no_refresh) == ["u1"]
+    assert cache.lookup("iced coffee", "all", 1, no_refresh) is None
+
+
+def test_empty_results_are_not_cached():
+    cache = SearchCache()
+    cache.store("coffee", "image", [], requested=10, complete=True)
+    assert cache.lookup("coffee", "image", 1, no_refresh) is None
+
+
+def test_stale_hit_is_served_and_refreshed_in_the_background():
+    async def scenario():
+        cache = SearchCache(ttl_seconds=10, stale_seconds=100)
+        cache.store("coffee", "image", ["old"], requested=1)
+        cache._entries[search_cache_key("coffee", "image")]["fetched_at"] -= 20
+        refreshed = []
+
+        async def refresh(limit):
+            refreshed.append(limit)
+            return ["new"], False
+
+        served = cache.lookup("coffee", "image", 1, refresh)
+        await asyncio.gather(*cache._background)
+        return served, refreshed, cache.lookup("coffee", "image", 1, no_refresh), cache.stats()
+    served, refreshed, after, stats = asyncio.run(scenario())
+    assert served == ["old"] and refreshed == [1] and after == ["new"]
+    assert stats["stale_hits"] == 1 and stats["hits"] == 1
+
+
+def test_entries_past_the_stale_window_are_misses():
+    cache = SearchCache(ttl_seconds=10, stale_seconds=100)
+    cache.store("coffee", "image", ["old"], requested=1)
+    cache._entries[search_cache_key("coffee", "image")]["fetched_at"] -= 200
+    assert cache.lookup("coffee", "image", 1, no_refresh) is None
+
+
+def test_disk_writes_are_debounced_and_flushed_on_close(tmp_path):
+    path = tmp_path / "search_cache.json"
+
+    async def scenario():
+        cache = SearchCache(disk_path=path, save_delay=60)
+        cache.store("coffee", "image", ["u1"], requested=1)
+        cache.store("tea", "image", ["u2"], requested=1)
+        await asyncio.sleep(0)
+        written_before_close = path.exists()
+        await cache.close()
+        return written_before_close
+    assert asyncio.run(scenario()) is False
+    reloaded = SearchCache(disk_path=path)
+    assert reloaded.lookup("coffee", "image", 1, no_refresh) == ["u1"]
+    assert reloaded.lookup("tea", "image", 1, no_refresh) == ["u2"]
+
+
+def test_disk_write_happens_after_the_delay(tmp_path):
+    path = tmp_path / "search_cache.json"
+
+    async def scenario():
+        cache = SearchCache(disk_path=path, save_delay=0.01)
+        cache.store("coffee", "image", ["u1"], requested=1)
+        await asyncio.sleep(0.2)
+        return path.exists()
+    assert asyncio.run(scenario()) is True
+
+
+def test_batch_keywords_are_deduplicated_under_their_first_spelling():
+    assert unique_keywords(["Iced Coffee", " ", "iced  coffee", "tea "]) == ["Iced Coffee", "tea"]
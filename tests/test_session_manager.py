@@ -0,0 +1,93 @@
+import asyncio
+import json
+import time
+
+from session_manager import LOGIN_COOKIE, SessionManager, blocked_reason, is_login_url
+
+
+def write_state(path, expires):
+    path.write_text(json.dumps({"cookies": [{"name": LOGIN_COOKIE, "value": "x", "expires": expires}]}), encoding="utf-8")
+
+
+def test_block_detection_ignores_the_query_string():
+    assert blocked_reason("https://www.xiaohongshu.com/search_result?keyword=passport%20photo") is None
+    assert blocked_reason("https://www.xiaohongshu.com/search_result?keyword=captcha") is None
+    assert blocked_reason("https://www.xiaohongshu.com/website-login/captcha?redirectPath=x") == "captcha"
+    assert blocked_reason("https://www.xiaohongshu.com/login?redirect=/explore") == "login"
+    assert is_login_url("https://passport.xiaohongshu.com/")
+    assert not is_login_url("https://www.xiaohongshu.com/explore/abc")
+
+
+def test_unexpired_login_cookie_skips_the_probe(tmp_path):
+    state = tmp_path / "state.json"
+    write_state(state, time.time() + 3600)
+    session = SessionManager(state)
+
+    async def probe():
+        raise AssertionError("probe should not run")
+    assert asyncio.run(session.ensure(probe)) is True
+    assert session.source == "cookies"
+
+
+def test_probe_runs_once_for_concurrent_callers(tmp_path):
+    session = SessionManager(tmp_path / "missing.json")
+    calls = []
+
+    async def probe():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return True
+
+    async def scenario():
+        return await asyncio.gather(*(session.ensure(probe) for _ in range(5)))
+    assert asyncio.run(scenario()) == [True] * 5
+    assert len(calls) == 1
+
+
+def test_invalid_state_is_remembered_for_its_ttl_then_reprobed(tmp_path):
+    session = SessionManager(tmp_path / "missing.json", invalid_ttl=60)
+    session.mark_invalid("captcha")
+    assert session.validity() is False
+    session.verified_at -= 61
+    assert session.validity() is None
+
+
+def test_cookies_saved_before_an_invalidation_are_not_trusted(tmp_path):
+    state = tmp_path / "state.json"
+    write_state(state, time.time() + 3600)
+    session = SessionManager(state, invalid_ttl=0)
+    session.mark_invalid("redirect")
+    assert session.validity() is None
+
+
+def test_valid_state_expires_after_the_recheck_interval(tmp_path):
+    session = SessionManager(tmp_path / "missing.json", recheck_interval=100)
+    session.mark_valid("search")
+    assert session.validity() is True
+    session.verified_at -= 101
+    assert session.validity() is None
+
+
+def test_known_invalid_state_is_reprobed_only_when_asked(tmp_path):
+    session = SessionManager(tmp_path / "missing.json")
+    session.mark_invalid("probe")
+    calls = []
+
+    async def probe():
+        calls.append(1)
+        return True
+    assert asyncio.run(session.ensure(probe)) is False
+    assert calls == []
+    assert asyncio.run(session.ensure(probe, retry_invalid=True)) is True
+    assert calls == [1]
+
+
+def test_cookies_saved_after_an_invalidation_end_it(tmp_path):
+    state = tmp_path / "state.json"
+    session = SessionManager(state)
+    session.mark_invalid("probe")
+    session.invalidated_at -= 10 # the login below happened after the failed check
+    session.verified_at -= 10
+    write_state(state, time.time() + 3600)
+    assert session.validity() is True
+    assert session.source == "cookies"